@@ -272,7 +272,7 @@ class DocumentProcessingAPI:
                         dedup_service = DocumentDeduplicationService()
                         
                         logger.info(f"🔍 调用原有查重服务进行分析...")
-                        duplicate_results = await dedup_service.analyze_documents(processed_documents)
+                        duplicate_results = await dedup_service.analyze_documents(processed_documents, method=method)
                         logger.info(f"📊 原有查重服务返回 {len(duplicate_results)} 个结果")
                         
                     finally:
@@ -103,7 +103,7 @@ async def analyze_documents_simple(request: Request):
         ]
         
         # 执行分析
-        duplicate_results = await deduplication_service.analyze_documents(json_input)
+        duplicate_results = await deduplication_service.analyze_documents(json_input, method=method)
         
         # 计算统计信息
         total_comparisons = len(documents) * (len(documents) - 1) // 2
@@ -372,7 +372,11 @@ async def get_status():
         "version": "2.0.0",
         "status": "running",
         "timestamp": datetime.now().isoformat(),
-        "database": "connected"
+        "database": "connected",
+        "embedding_cache": deduplication_service.get_embedding_cache_stats(),
+        "segmentation_cache": deduplication_service.get_segmentation_cache_stats(),
+        "rerank_cache": deduplication_service.get_rerank_cache_stats(),
+        "corpus_index": deduplication_service.get_corpus_index_stats()
     }
 
 
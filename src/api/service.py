@@ -7,7 +7,7 @@ AI-Powered Semantic Document Comparison Platform
 
 import time
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain.schema.runnable import RunnableLambda, RunnableParallel
 
@@ -15,7 +15,15 @@ from ..models.api_models import DuplicateOutput
 from ..models.data_models import DocumentData
 from ..core.document_processor import DocumentProcessor
 from ..core.clustering_manager import ClusteringManager
+from ..core.corpus_index import get_corpus_index
+from ..core.parallel_similarity import get_similarity_pool
+from ..core.rerank_engine import get_rerank_cache
+from ..core.rerankers import get_reranker
 from ..detectors.llm_duplicate_detector import LLMDuplicateDetector
+from ..detectors.exact_duplicate_detector import ExactDuplicateDetector
+from ..detectors.near_duplicate_detector import NearDuplicateDetector
+from ..detectors.simhash_duplicate_detector import SimHashDuplicateDetector
+from ..core.minhash_lsh import MinHashLSH
 from ..validators.validation_manager import ValidationManager
 from ..config.config import Config
 from ..utils.unified_logger import UnifiedLogger
@@ -29,28 +37,78 @@ class DocumentDeduplicationService:
     def __init__(self):
         self.config = Config()
         self.processor = DocumentProcessor()
+        self.corpus_index = get_corpus_index(self.config, self.processor.embedding_model_name)
+        reranker = get_reranker(self.config)
         
         # 使用配置初始化聚类管理器
         self.clustering_manager = ClusteringManager(
             top_k=self.config.top_k_candidates,
             similarity_threshold=self.config.similarity_threshold,
             use_reranker=self.config.use_reranker,
-            max_candidates_for_rerank=self.config.max_rerank_candidates
+            max_candidates_for_rerank=self.config.max_rerank_candidates,
+            quantization=self.config.similarity_quantization,
+            rescore_margin=self.config.similarity_rescore_margin,
+            prefilter_dims=self.config.similarity_prefilter_dims,
+            prefilter_min_segments=self.config.similarity_prefilter_min_segments,
+            prefilter_margin=self.config.similarity_prefilter_margin,
+            ann_index_type=self.config.ann_index_type,
+            ann_min_segments=self.config.ann_min_segments,
+            ann_hnsw_m=self.config.ann_hnsw_m,
+            ann_ef_construction=self.config.ann_hnsw_ef_construction,
+            ann_ef_search=self.config.ann_hnsw_ef_search,
+            ann_nprobe=self.config.ann_ivf_nprobe,
+            ann_oversample=self.config.ann_oversample,
+            block_mb=self.config.similarity_block_mb,
+            corpus_index=self.corpus_index,
+            rerank_max_concurrency=self.config.rerank_max_concurrency,
+            rerank_skip_similarity=self.config.rerank_skip_similarity,
+            rerank_drop_similarity=self.config.rerank_drop_similarity,
+            rerank_cache=get_rerank_cache(self.config) if reranker is not None and reranker.remote else None,
+            reranker=reranker,
+            max_group_size=self.config.candidate_group_max_size,
+            similarity_pool=get_similarity_pool(self.config)
         )
         
         self.detector = LLMDuplicateDetector()
+        self.exact_detector = ExactDuplicateDetector()
+        self.near_detector = None
+        if self.config.minhash_enable:
+            self.near_detector = NearDuplicateDetector(
+                MinHashLSH(
+                    num_perm=self.config.minhash_num_perm,
+                    shingle_size=self.config.minhash_shingle_size,
+                    threshold=self.config.minhash_threshold,
+                    max_bucket_size=self.config.minhash_max_bucket_size,
+                    min_shingles=self.config.minhash_min_shingles
+                ),
+                direct_threshold=self.config.minhash_direct_threshold
+            )
+        self.simhash_detector = None
+        if self.config.simhash_enable:
+            self.simhash_detector = SimHashDuplicateDetector(
+                max_distance=self.config.simhash_max_distance,
+                shingle_size=self.config.simhash_shingle_size,
+                min_shingles=self.config.simhash_min_shingles,
+                corpus_index=self.corpus_index
+            )
         self.validator = ValidationManager()
         # 移除全局锁，支持并发处理
         self.max_workers = 4  # 可根据服务器配置调整
         
         logger.info(f"文档智能比对服务初始化完成，使用增强版聚类策略")
     
-    async def analyze_documents(self, json_input: List[Dict]) -> List[DuplicateOutput]:
-        """分析文档重复内容 - 高并发异步处理版本"""
+    async def analyze_documents(self, json_input: List[Dict], method: Optional[str] = None) -> List[DuplicateOutput]:
+        """
+        分析文档重复内容 - 高并发异步处理版本
+        
+        Args:
+            json_input: 文档页面列表
+            method: 分块方式，semantic（语义分块）或 rule（规则分块，不调用嵌入），为空时使用配置
+        """
         
         execution_id = int(time.time() * 1000)
         start_time = time.time()
-        logger.info(f"🚀 开始执行工作流 (ID: {execution_id})")
+        logger.info(f"🚀 开始执行工作流 (ID: {execution_id}), 分块方式: {self.processor.resolve_chunk_method(method)}")
         
         try:
             # 1. 处理输入数据
@@ -69,7 +127,7 @@ class DocumentDeduplicationService:
             # 使用asyncio创建并发任务
             logger.info(f"[{execution_id}] 🔧 创建聚类任务")
             cluster_task = asyncio.create_task(
-                self._clustering_strategy(execution_id, document_inputs)
+                self._clustering_strategy(execution_id, document_inputs, method, document_data_list)
             )
             logger.info(f"[{execution_id}] 🔧 创建直接策略任务")
             direct_task = asyncio.create_task(
@@ -112,8 +170,11 @@ class DocumentDeduplicationService:
             if unique_results:
                 logger.info(f"[{execution_id}] 🔍 开始验证检测结果...")
                 validation_start = time.time()
+                validation_documents = document_data_list + await self._run_in_executor(
+                    self._historical_documents, document_data_list, unique_results
+                )
                 validated_results = await self._run_in_executor(
-                    self.validator.validate_results, document_data_list, unique_results
+                    self.validator.validate_results, validation_documents, unique_results
                 )
                 validation_time = time.time() - validation_start
                 logger.info(f"[{execution_id}] ✅ 验证完成，耗时: {validation_time:.2f}秒，最终结果: {len(validated_results)} 对重复内容")
@@ -130,33 +191,86 @@ class DocumentDeduplicationService:
             logger.error(f"[{execution_id}] ❌ 文档分析失败，总耗时: {total_time:.2f}秒，错误: {e}")
             raise
     
-    async def _clustering_strategy(self, execution_id: int, document_inputs) -> List[DuplicateOutput]:
+    async def _clustering_strategy(self, execution_id: int, document_inputs,
+                                   method: Optional[str] = None,
+                                   document_data_list: Optional[List[DocumentData]] = None) -> List[DuplicateOutput]:
         """分割聚类查重策略 - 异步版本"""
         strategy_start = time.time()
         try:
-            # 分割文档
-            logger.info(f"[{execution_id}] 🔍 聚类策略：开始分割文档...")
-            segment_start = time.time()
-            segments = await self._run_in_executor(
-                self.processor.segment_documents, document_inputs
-            )
-            segment_time = time.time() - segment_start
-            logger.info(f"[{execution_id}] ✅ 聚类策略：已分割出 {len(segments)} 个文本片段，耗时: {segment_time:.2f}秒")
-            
-            # 生成嵌入向量
-            logger.info(f"[{execution_id}] 🧠 聚类策略：开始生成嵌入向量...")
-            embedding_start = time.time()
-            segments = await self._run_in_executor(
-                self.processor.generate_embeddings, segments
-            )
-            embedding_time = time.time() - embedding_start
-            logger.info(f"[{execution_id}] ✅ 聚类策略：已生成 {len(segments)} 个嵌入向量，耗时: {embedding_time:.2f}秒")
+            total_chars = sum(len(doc_input.content) for doc_input in document_inputs)
+            streaming_min_chars = self.config.streaming_segmentation_min_chars
+            
+            if streaming_min_chars > 0 and total_chars >= streaming_min_chars:
+                # 超大输入：流式分割并嵌入，不持有整篇文档的合并文本与完整片段列表
+                logger.info(f"[{execution_id}] 🌊 聚类策略：输入共 {total_chars} 字符，使用流式分割与嵌入...")
+                embedding_start = time.time()
+                segment_store = await self._run_in_executor(
+                    self.processor.build_segment_store_streaming, document_inputs, method
+                )
+                embedding_time = time.time() - embedding_start
+                logger.info(f"[{execution_id}] ✅ 聚类策略：流式生成 {len(segment_store)} 个片段、"
+                            f"{len(segment_store.embedded_rows())} 个嵌入向量，耗时: {embedding_time:.2f}秒")
+                
+                exact_results = []
+                if self.config.exact_duplicate_enable:
+                    exact_results = await self._run_in_executor(
+                        self.exact_detector.detect, list(segment_store)
+                    )
+                    logger.info(f"[{execution_id}] 🔁 聚类策略：精确匹配发现 {len(exact_results)} 对完全相同的片段")
+            else:
+                # 分割文档
+                logger.info(f"[{execution_id}] 🔍 聚类策略：开始分割文档...")
+                segment_start = time.time()
+                segments = await self._run_in_executor(
+                    self.processor.segment_documents, document_inputs, method
+                )
+                segment_time = time.time() - segment_start
+                logger.info(f"[{execution_id}] ✅ 聚类策略：已分割出 {len(segments)} 个文本片段，耗时: {segment_time:.2f}秒")
+                
+                # 精确重复短路：跨文档完全相同的片段直接输出，后续聚类会跳过这些片段对
+                exact_results = []
+                if self.config.exact_duplicate_enable:
+                    exact_results = await self._run_in_executor(
+                        self.exact_detector.detect, segments
+                    )
+                    logger.info(f"[{execution_id}] 🔁 聚类策略：精确匹配发现 {len(exact_results)} 对完全相同的片段")
+                
+                # 生成嵌入向量
+                logger.info(f"[{execution_id}] 🧠 聚类策略：开始生成嵌入向量...")
+                embedding_start = time.time()
+                segment_store = await self._run_in_executor(
+                    self.processor.build_segment_store, segments
+                )
+                embedding_time = time.time() - embedding_start
+                logger.info(f"[{execution_id}] ✅ 聚类策略：已生成 {len(segment_store.embedded_rows())} 个嵌入向量，耗时: {embedding_time:.2f}秒")
+            
+            # 指纹逐字复制：请求内与历史语料中汉明距离很小的片段直接输出（在本次文档收录进历史语料之前查找）
+            simhash_results = []
+            if self.simhash_detector is not None:
+                simhash_results = await self._run_in_executor(
+                    self.simhash_detector.detect, list(segment_store)
+                )
+                logger.info(f"[{execution_id}] 🔖 聚类策略：SimHash指纹发现 {len(simhash_results)} 对逐字复制")
+            
+            # 近似逐字复制：高置信度的直接输出，其余作为候选边与嵌入召回的候选边合并分组后交给LLM
+            near_results, near_edges = [], None
+            if self.near_detector is not None:
+                near_results, near_edges = await self._run_in_executor(
+                    self.near_detector.detect, list(segment_store)
+                )
+                logger.info(f"[{execution_id}] 🧬 聚类策略：MinHash直接输出 {len(near_results)} 对近似重复，"
+                            f"候选边 {len(near_edges[0])} 条")
+            # 已直接输出的逐字复制片段对不再交给LLM重复判断
+            reported_pairs = [((result.documentId1, result.chunkId1), (result.documentId2, result.chunkId2))
+                              for result in simhash_results + near_results]
             
-            # 聚类分析
+            # 聚类分析（后续阶段基于列式存储的行号工作）
             logger.info(f"[{execution_id}] 🎯 聚类策略：开始聚类分析...")
             cluster_start = time.time()
+            request_rows = len(segment_store)
+            # 所有来源的候选边合并为一张图，只分组一次，每组片段数都受 max_group_size 限制
             clusters = await self._run_in_executor(
-                self.clustering_manager.initial_clustering, segments
+                self.clustering_manager.initial_clustering, segment_store, near_edges, reported_pairs
             )
             multi_doc_clusters = await self._run_in_executor(
                 self.clustering_manager.filter_multi_document_clusters, clusters
@@ -168,11 +282,18 @@ class DocumentDeduplicationService:
             logger.info(f"[{execution_id}] 🤖 聚类策略：开始LLM检测...")
             llm_start = time.time()
             if multi_doc_clusters:
-                cluster_results = await self._run_in_executor(
-                    self.detector.detect_duplicates_parallel, multi_doc_clusters
+                detect_task = self._run_in_executor(self.detector.detect_duplicates_parallel, multi_doc_clusters)
+            else:
+                detect_task = asyncio.sleep(0, result=[])
+            if self.corpus_index is not None and document_data_list:
+                # 本次请求的文档在LLM检测期间并行收录进历史语料索引
+                cluster_results, _ = await asyncio.gather(
+                    detect_task,
+                    self._run_in_executor(self._add_to_corpus, document_data_list, segment_store, request_rows)
                 )
             else:
-                cluster_results = []
+                cluster_results = await detect_task
+            cluster_results = exact_results + simhash_results + near_results + cluster_results
             llm_time = time.time() - llm_start
             strategy_time = time.time() - strategy_start
             
@@ -207,6 +328,51 @@ class DocumentDeduplicationService:
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             return await loop.run_in_executor(executor, func, *args)
     
+    def get_embedding_cache_stats(self) -> Optional[Dict]:
+        """获取嵌入缓存命中统计，未启用缓存时返回None"""
+        cache = self.processor.embedding_cache
+        return cache.stats() if cache is not None else None
+    
+    def _add_to_corpus(self, document_data_list: List[DocumentData], segment_store, request_rows: int):
+        """将本次请求的文档收录进历史语料索引，失败不影响本次结果"""
+        try:
+            self.corpus_index.add_documents(document_data_list, segment_store, request_rows)
+        except Exception as e:
+            logger.error(f"历史语料索引收录失败: {e}")
+    
+    def _historical_documents(self, document_data_list: List[DocumentData],
+                              results: List[DuplicateOutput]) -> List[DocumentData]:
+        """读取结果中引用、但不在本次请求中的历史文档，供验证阶段定位原文"""
+        if self.corpus_index is None:
+            return []
+        request_ids = {doc.document_id for doc in document_data_list}
+        historical_ids = [
+            document_id for result in results
+            for document_id in (result.documentId1, result.documentId2)
+            if document_id not in request_ids
+        ]
+        if not historical_ids:
+            return []
+        try:
+            return self.corpus_index.documents(historical_ids)
+        except Exception as e:
+            logger.error(f"读取历史文档失败，相关结果将无法验证: {e}")
+            return []
+    
+    def get_corpus_index_stats(self) -> Optional[Dict]:
+        """获取历史语料索引规模，未启用时返回None"""
+        return self.corpus_index.stats() if self.corpus_index is not None else None
+    
+    def get_rerank_cache_stats(self) -> Optional[Dict]:
+        """获取重排得分缓存命中统计，未启用reranker或缓存时返回None"""
+        engine = self.clustering_manager.rerank_engine
+        return engine.cache.stats() if engine is not None and engine.cache is not None else None
+    
+    def get_segmentation_cache_stats(self) -> Optional[Dict]:
+        """获取分割结果缓存命中统计，未启用缓存时返回None"""
+        cache = self.processor.segmentation_cache
+        return cache.stats() if cache is not None else None
+    
     def _deduplicate_results(self, results: List[DuplicateOutput]) -> List[DuplicateOutput]:
         """去除重复的检测结果"""
         if not results:
@@ -25,16 +25,133 @@ class Config:
         os.environ["LLM_MODEL_NAME"] = os.getenv("LLM_MODEL_NAME", "qwen-turbo")
         os.environ["EMBEDDING_MODEL_NAME"] = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-v4")
         
+        # 嵌入提供方：openai（远程OpenAI兼容接口）或 hashing（本地字符n-gram哈希向量化）
+        os.environ["EMBEDDING_PROVIDER"] = os.getenv("EMBEDDING_PROVIDER", "openai")
+        
+        # 异步嵌入引擎配置
+        os.environ["EMBEDDING_MAX_CONCURRENCY"] = os.getenv("EMBEDDING_MAX_CONCURRENCY", "8")
+        os.environ["EMBEDDING_BATCH_SIZE"] = os.getenv("EMBEDDING_BATCH_SIZE", "10")
+        os.environ["EMBEDDING_BATCH_MAX_TOKENS"] = os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "8192")
+        os.environ["EMBEDDING_TIMEOUT"] = os.getenv("EMBEDDING_TIMEOUT", "60")
+        os.environ["EMBEDDING_MAX_RETRIES"] = os.getenv("EMBEDDING_MAX_RETRIES", "3")
+        os.environ["EMBEDDING_RETRY_BASE_DELAY"] = os.getenv("EMBEDDING_RETRY_BASE_DELAY", "0.5")
+        os.environ["EMBEDDING_RETRY_MAX_DELAY"] = os.getenv("EMBEDDING_RETRY_MAX_DELAY", "8")
+        
+        # 跨请求嵌入微批合并配置
+        os.environ["EMBEDDING_COALESCE_ENABLE"] = os.getenv("EMBEDDING_COALESCE_ENABLE", "true")
+        os.environ["EMBEDDING_COALESCE_MAX_TEXTS"] = os.getenv("EMBEDDING_COALESCE_MAX_TEXTS", "64")
+        os.environ["EMBEDDING_COALESCE_MAX_WAIT_MS"] = os.getenv("EMBEDDING_COALESCE_MAX_WAIT_MS", "20")
+        
+        # 默认分块方式：semantic（语义分块，需要嵌入）或 rule（规则分块，按句子滑动窗口，不调用嵌入）
+        os.environ["CHUNK_METHOD"] = os.getenv("CHUNK_METHOD", "semantic")
+        os.environ["RULE_CHUNK_MAX_CHARS"] = os.getenv("RULE_CHUNK_MAX_CHARS", "300")
+        os.environ["RULE_CHUNK_OVERLAP_SENTENCES"] = os.getenv("RULE_CHUNK_OVERLAP_SENTENCES", "1")
+        
+        # 文档分割结果缓存（按文档内容与分块配置寻址，磁盘持久化，多进程共享），保存片段区间与片段向量
+        os.environ["SEGMENT_CACHE_ENABLE"] = os.getenv("SEGMENT_CACHE_ENABLE", "true")
+        os.environ["SEGMENT_CACHE_PATH"] = os.getenv("SEGMENT_CACHE_PATH", "cache/segment_cache.db")
+        os.environ["SEGMENT_CACHE_MAX_ENTRIES"] = os.getenv("SEGMENT_CACHE_MAX_ENTRIES", "50000")
+        os.environ["SEGMENT_CACHE_MAX_MB"] = os.getenv("SEGMENT_CACHE_MAX_MB", "1024")
+        
+        # 流式分割：输入总字符数达到阈值时按页窗口边分块边嵌入（0表示关闭）
+        os.environ["STREAMING_SEGMENTATION_MIN_CHARS"] = os.getenv("STREAMING_SEGMENTATION_MIN_CHARS", "2000000")
+        os.environ["STREAMING_WINDOW_CHARS"] = os.getenv("STREAMING_WINDOW_CHARS", "20000")
+        os.environ["STREAMING_EMBED_BATCH_SIZE"] = os.getenv("STREAMING_EMBED_BATCH_SIZE", "256")
+        
+        # 文档分割并发线程数（各文档独立分块，1表示串行）
+        os.environ["SEGMENTATION_MAX_WORKERS"] = os.getenv("SEGMENTATION_MAX_WORKERS", "8")
+        
+        # 片段向量模式：exact对片段文本重新嵌入（各聚类阈值均以此标定），
+        # pooled复用语义分块时的句子向量按长度加权平均，省去片段嵌入调用，但向量与片段文本嵌入不同，需重新标定阈值
+        os.environ["CHUNK_EMBEDDING_MODE"] = os.getenv("CHUNK_EMBEDDING_MODE", "exact")
+        
+        # 嵌入缓存配置（磁盘持久化，多进程共享）
+        os.environ["EMBEDDING_CACHE_ENABLE"] = os.getenv("EMBEDDING_CACHE_ENABLE", "true")
+        os.environ["EMBEDDING_CACHE_PATH"] = os.getenv("EMBEDDING_CACHE_PATH", "cache/embedding_cache.db")
+        os.environ["EMBEDDING_CACHE_MAX_ENTRIES"] = os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000")
+        os.environ["EMBEDDING_CACHE_MAX_MB"] = os.getenv("EMBEDDING_CACHE_MAX_MB", "2048")
+        # 缓存向量存储格式：none/float16/int8。float16与int8为有损压缩，命中缓存时后续的“全精度”重打分
+        # 实际基于还原后的近似向量，默认以float32无损存储
+        os.environ["EMBEDDING_CACHE_QUANTIZATION"] = os.getenv("EMBEDDING_CACHE_QUANTIZATION", "none")
+        
         # 聚类配置
         os.environ["CLUSTERING_STRATEGY"] = os.getenv("CLUSTERING_STRATEGY", "enhanced")  # "legacy" 或 "enhanced"
         os.environ["SIMILARITY_THRESHOLD"] = os.getenv("SIMILARITY_THRESHOLD", "0.6")
         os.environ["TOP_K_CANDIDATES"] = os.getenv("TOP_K_CANDIDATES", "8")
         os.environ["USE_RERANKER"] = os.getenv("USE_RERANKER", "true")
         os.environ["MAX_RERANK_CANDIDATES"] = os.getenv("MAX_RERANK_CANDIDATES", "4")
+        # 候选边组成的相似图按连通分量分组，超大分量沿最强的边切分，每组（单次LLM检测）最多的片段数
+        os.environ["CANDIDATE_GROUP_MAX_SIZE"] = os.getenv("CANDIDATE_GROUP_MAX_SIZE", "8")
+        # reranker后端：dashscope（远程gte-rerank-v2，不可用时禁用reranker）或 lexical（本地字符n-gram BM25 + 重合度）
+        os.environ["RERANKER_PROVIDER"] = os.getenv("RERANKER_PROVIDER", "dashscope")
+        os.environ["LEXICAL_RERANK_NGRAM_SIZE"] = os.getenv("LEXICAL_RERANK_NGRAM_SIZE", "2")
+        os.environ["LEXICAL_RERANK_BM25_WEIGHT"] = os.getenv("LEXICAL_RERANK_BM25_WEIGHT", "0.5")
+        # 词法得分的尺度与gte-rerank不同：改写过的段落只有0.1左右，不能沿用0.3的保留阈值
+        os.environ["LEXICAL_RERANK_THRESHOLD"] = os.getenv("LEXICAL_RERANK_THRESHOLD", "0.05")
+        # 重排：各聚类的reranker调用并发执行，得分按文本哈希缓存；
+        # 余弦相似度达到SKIP_SIMILARITY的候选直接保留、低于DROP_SIMILARITY的直接丢弃，均不调用reranker；
+        # DROP_SIMILARITY默认等于SIMILARITY_THRESHOLD，即召回的候选都交给reranker判断
+        os.environ["RERANK_MAX_CONCURRENCY"] = os.getenv("RERANK_MAX_CONCURRENCY", "8")
+        os.environ["RERANK_SKIP_SIMILARITY"] = os.getenv("RERANK_SKIP_SIMILARITY", "0.95")
+        os.environ["RERANK_DROP_SIMILARITY"] = os.getenv("RERANK_DROP_SIMILARITY", os.environ["SIMILARITY_THRESHOLD"])
+        os.environ["RERANK_CACHE_ENABLE"] = os.getenv("RERANK_CACHE_ENABLE", "true")
+        os.environ["RERANK_CACHE_PATH"] = os.getenv("RERANK_CACHE_PATH", "cache/rerank_cache.db")
+        os.environ["RERANK_CACHE_MAX_ENTRIES"] = os.getenv("RERANK_CACHE_MAX_ENTRIES", "1000000")
+        
+        # 相似度粗排量化：none/float16/int8，量化粗排的候选以全精度重新打分。
+        # 量化矩阵按块还原为float32后计算，只降低常驻向量矩阵的内存占用，不加快计算，默认关闭
+        os.environ["SIMILARITY_QUANTIZATION"] = os.getenv("SIMILARITY_QUANTIZATION", "none")
+        os.environ["SIMILARITY_RESCORE_MARGIN"] = os.getenv("SIMILARITY_RESCORE_MARGIN", "0.02")
+        
+        # 两阶段召回：大请求先用向量前缀粗排，再以完整维度重打分；PREFILTER_DIMS为0表示关闭
+        os.environ["SIMILARITY_PREFILTER_DIMS"] = os.getenv("SIMILARITY_PREFILTER_DIMS", "256")
+        os.environ["SIMILARITY_PREFILTER_MIN_SEGMENTS"] = os.getenv("SIMILARITY_PREFILTER_MIN_SEGMENTS", "2000")
+        os.environ["SIMILARITY_PREFILTER_MARGIN"] = os.getenv("SIMILARITY_PREFILTER_MARGIN", "0.1")
+        
+        # 精确相似度按行块计算，单个行块的内存上限(MB)，含相似度块与选取top-k时的临时数组；多进程时每个进程各占一份
+        os.environ["SIMILARITY_BLOCK_MB"] = os.getenv("SIMILARITY_BLOCK_MB", "256")
+        # 多进程相似度：向量矩阵放入共享内存，由常驻进程池按行块并行计算；PROCESSES为0或1表示关闭，auto为CPU核数。
+        # 多个服务工作进程各自持有进程池，建议设为 CPU核数 / WORKERS；容器内需调大 /dev/shm（shm_size）
+        os.environ["SIMILARITY_PROCESSES"] = os.getenv("SIMILARITY_PROCESSES", "0")
+        os.environ["SIMILARITY_PARALLEL_MIN_SEGMENTS"] = os.getenv("SIMILARITY_PARALLEL_MIN_SEGMENTS", "5000")
+        
+        # ANN索引：片段数达到ANN_MIN_SEGMENTS时以FAISS索引检索近邻，以下使用精确计算；ANN_INDEX_TYPE为none表示关闭
+        os.environ["ANN_INDEX_TYPE"] = os.getenv("ANN_INDEX_TYPE", "hnsw")  # hnsw/ivf/none
+        os.environ["ANN_MIN_SEGMENTS"] = os.getenv("ANN_MIN_SEGMENTS", "10000")
+        os.environ["ANN_HNSW_M"] = os.getenv("ANN_HNSW_M", "32")
+        os.environ["ANN_HNSW_EF_CONSTRUCTION"] = os.getenv("ANN_HNSW_EF_CONSTRUCTION", "80")
+        os.environ["ANN_HNSW_EF_SEARCH"] = os.getenv("ANN_HNSW_EF_SEARCH", "128")
+        os.environ["ANN_IVF_NPROBE"] = os.getenv("ANN_IVF_NPROBE", "16")
+        os.environ["ANN_OVERSAMPLE"] = os.getenv("ANN_OVERSAMPLE", "4")
+        
+        # 历史语料索引：持久化已分析文档的片段向量，新请求额外与历史文档比对（HNSW参数与ANN索引共用）
+        os.environ["CORPUS_INDEX_ENABLE"] = os.getenv("CORPUS_INDEX_ENABLE", "false")
+        os.environ["CORPUS_INDEX_PATH"] = os.getenv("CORPUS_INDEX_PATH", "cache/corpus_index")
+        os.environ["CORPUS_INDEX_SAVE_EVERY"] = os.getenv("CORPUS_INDEX_SAVE_EVERY", "5000")
         
         # DashScope 配置（for reranker）
         os.environ["DASHSCOPE_API_KEY"] = os.getenv("DASHSCOPE_API_KEY", "")
         
+        # 精确重复短路配置：跨文档完全相同的片段直接输出，不进入嵌入聚类和LLM
+        os.environ["EXACT_DUPLICATE_ENABLE"] = os.getenv("EXACT_DUPLICATE_ENABLE", "true")
+        
+        # MinHash近似重复：字符n-gram签名分桶召回近似逐字复制的片段，估计Jaccard达到DIRECT_THRESHOLD的直接输出
+        os.environ["MINHASH_ENABLE"] = os.getenv("MINHASH_ENABLE", "true")
+        os.environ["MINHASH_NUM_PERM"] = os.getenv("MINHASH_NUM_PERM", "128")
+        os.environ["MINHASH_SHINGLE_SIZE"] = os.getenv("MINHASH_SHINGLE_SIZE", "3")
+        os.environ["MINHASH_THRESHOLD"] = os.getenv("MINHASH_THRESHOLD", "0.5")
+        os.environ["MINHASH_DIRECT_THRESHOLD"] = os.getenv("MINHASH_DIRECT_THRESHOLD", "0.85")
+        os.environ["MINHASH_MAX_BUCKET_SIZE"] = os.getenv("MINHASH_MAX_BUCKET_SIZE", "200")
+        # n-gram数少于该值的片段（标题、目录项、“联系人：”等套话）不参与MinHash检测，仍走嵌入聚类与LLM
+        os.environ["MINHASH_MIN_SHINGLES"] = os.getenv("MINHASH_MIN_SHINGLES", "30")
+        
+        # SimHash指纹：64位指纹汉明距离不超过MAX_DISTANCE的跨文档片段直接输出为逐字复制（含历史语料中的片段）
+        os.environ["SIMHASH_ENABLE"] = os.getenv("SIMHASH_ENABLE", "true")
+        os.environ["SIMHASH_MAX_DISTANCE"] = os.getenv("SIMHASH_MAX_DISTANCE", "3")
+        os.environ["SIMHASH_SHINGLE_SIZE"] = os.getenv("SIMHASH_SHINGLE_SIZE", "3")
+        # n-gram数少于该值的片段（标题、目录项、“联系人：”等套话）不参与SimHash检测
+        os.environ["SIMHASH_MIN_SHINGLES"] = os.getenv("SIMHASH_MIN_SHINGLES", "30")
+        
         # 验证管理器配置
         os.environ["VALIDATION_STRATEGY"] = os.getenv("VALIDATION_STRATEGY", "optimized")  # "legacy" 或 "optimized"
         os.environ["VALIDATION_SIMILARITY_THRESHOLD"] = os.getenv("VALIDATION_SIMILARITY_THRESHOLD", "0.5")
@@ -79,6 +196,149 @@ class Config:
     def embedding_model_name(self) -> str:
         return os.environ.get("EMBEDDING_MODEL_NAME", "text-embedding-v4")
     
+    @property
+    def embedding_provider(self) -> str:
+        """嵌入提供方: openai 或 hashing"""
+        return os.environ.get("EMBEDDING_PROVIDER", "openai").lower()
+    
+    # 异步嵌入引擎相关配置属性
+    @property
+    def embedding_max_concurrency(self) -> int:
+        """嵌入请求最大并发数"""
+        return int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "8"))
+    
+    @property
+    def embedding_batch_size(self) -> int:
+        """单个嵌入请求的最大文本数"""
+        return int(os.environ.get("EMBEDDING_BATCH_SIZE", "10"))
+    
+    @property
+    def embedding_batch_max_tokens(self) -> int:
+        """单个嵌入请求的最大估计token数"""
+        return int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", "8192"))
+    
+    @property
+    def embedding_timeout(self) -> float:
+        """嵌入请求超时时间(秒)"""
+        return float(os.environ.get("EMBEDDING_TIMEOUT", "60"))
+    
+    @property
+    def embedding_max_retries(self) -> int:
+        """嵌入请求瞬时错误的最大重试次数"""
+        return int(os.environ.get("EMBEDDING_MAX_RETRIES", "3"))
+    
+    @property
+    def embedding_retry_base_delay(self) -> float:
+        """嵌入重试退避基数(秒)"""
+        return float(os.environ.get("EMBEDDING_RETRY_BASE_DELAY", "0.5"))
+    
+    @property
+    def embedding_retry_max_delay(self) -> float:
+        """嵌入重试单次退避上限(秒)"""
+        return float(os.environ.get("EMBEDDING_RETRY_MAX_DELAY", "8"))
+    
+    @property
+    def embedding_coalesce_enable(self) -> bool:
+        """是否启用跨请求嵌入微批合并"""
+        return os.environ.get("EMBEDDING_COALESCE_ENABLE", "true").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def embedding_coalesce_max_texts(self) -> int:
+        """微批合并的文本数阈值"""
+        return int(os.environ.get("EMBEDDING_COALESCE_MAX_TEXTS", "64"))
+    
+    @property
+    def embedding_coalesce_max_wait_ms(self) -> float:
+        """微批合并的最长等待时间(毫秒)"""
+        return float(os.environ.get("EMBEDDING_COALESCE_MAX_WAIT_MS", "20"))
+    
+    @property
+    def chunk_method(self) -> str:
+        """默认分块方式"""
+        method = os.environ.get("CHUNK_METHOD", "semantic").lower()
+        return "rule" if method in ("rule", "fast") else "semantic"
+    
+    @property
+    def rule_chunk_max_chars(self) -> int:
+        """规则分块的片段最大字符数"""
+        return int(os.environ.get("RULE_CHUNK_MAX_CHARS", "300"))
+    
+    @property
+    def rule_chunk_overlap_sentences(self) -> int:
+        """规则分块相邻窗口重叠的句子数"""
+        return int(os.environ.get("RULE_CHUNK_OVERLAP_SENTENCES", "1"))
+    
+    @property
+    def segment_cache_enable(self) -> bool:
+        """是否启用文档分割结果缓存"""
+        return os.environ.get("SEGMENT_CACHE_ENABLE", "true").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def segment_cache_path(self) -> str:
+        """分割结果缓存数据库路径"""
+        return os.environ.get("SEGMENT_CACHE_PATH", "cache/segment_cache.db")
+    
+    @property
+    def segment_cache_max_entries(self) -> int:
+        """分割结果缓存最大文档数"""
+        return int(os.environ.get("SEGMENT_CACHE_MAX_ENTRIES", "50000"))
+    
+    @property
+    def segment_cache_max_mb(self) -> int:
+        """分割结果缓存最大占用空间(MB)"""
+        return int(os.environ.get("SEGMENT_CACHE_MAX_MB", "1024"))
+    
+    @property
+    def streaming_segmentation_min_chars(self) -> int:
+        """启用流式分割的输入总字符数阈值，0表示关闭"""
+        return int(os.environ.get("STREAMING_SEGMENTATION_MIN_CHARS", "2000000"))
+    
+    @property
+    def streaming_window_chars(self) -> int:
+        """流式分割每个窗口的字符数"""
+        return int(os.environ.get("STREAMING_WINDOW_CHARS", "20000"))
+    
+    @property
+    def streaming_embed_batch_size(self) -> int:
+        """流式分割每批送去嵌入的片段数"""
+        return int(os.environ.get("STREAMING_EMBED_BATCH_SIZE", "256"))
+    
+    @property
+    def segmentation_max_workers(self) -> int:
+        """文档分割并发线程数"""
+        return int(os.environ.get("SEGMENTATION_MAX_WORKERS", "8"))
+    
+    @property
+    def chunk_embedding_mode(self) -> str:
+        """片段向量模式: pooled 或 exact"""
+        return os.environ.get("CHUNK_EMBEDDING_MODE", "exact").lower()
+    
+    # 嵌入缓存相关配置属性
+    @property
+    def embedding_cache_enable(self) -> bool:
+        """是否启用嵌入缓存"""
+        return os.environ.get("EMBEDDING_CACHE_ENABLE", "true").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def embedding_cache_path(self) -> str:
+        """嵌入缓存数据库路径（相对路径基于项目根目录）"""
+        return os.environ.get("EMBEDDING_CACHE_PATH", "cache/embedding_cache.db")
+    
+    @property
+    def embedding_cache_max_entries(self) -> int:
+        """嵌入缓存最大条目数"""
+        return int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+    
+    @property
+    def embedding_cache_max_mb(self) -> int:
+        """嵌入缓存最大占用空间(MB)"""
+        return int(os.environ.get("EMBEDDING_CACHE_MAX_MB", "2048"))
+    
+    @property
+    def embedding_cache_quantization(self) -> str:
+        """嵌入缓存的向量存储格式"""
+        return os.environ.get("EMBEDDING_CACHE_QUANTIZATION", "none").lower()
+    
     @property
     def langsmith_project(self) -> str:
         return os.environ.get("LANGSMITH_PROJECT", "DocuPrism")
@@ -114,11 +374,219 @@ class Config:
         """最大rerank候选数"""
         return int(os.environ.get("MAX_RERANK_CANDIDATES", "20"))
     
+    @property
+    def candidate_group_max_size(self) -> int:
+        """候选图分组后每组的最大片段数"""
+        return int(os.environ.get("CANDIDATE_GROUP_MAX_SIZE", "8"))
+    
+    @property
+    def reranker_provider(self) -> str:
+        """reranker后端（dashscope/lexical）"""
+        return os.environ.get("RERANKER_PROVIDER", "dashscope").lower()
+    
+    @property
+    def lexical_rerank_ngram_size(self) -> int:
+        """本地词法reranker的字符n-gram长度"""
+        return int(os.environ.get("LEXICAL_RERANK_NGRAM_SIZE", "2"))
+    
+    @property
+    def lexical_rerank_bm25_weight(self) -> float:
+        """本地词法reranker中BM25得分的权重"""
+        return float(os.environ.get("LEXICAL_RERANK_BM25_WEIGHT", "0.5"))
+    
+    @property
+    def lexical_rerank_threshold(self) -> float:
+        """本地词法reranker保留候选边的最低得分"""
+        return float(os.environ.get("LEXICAL_RERANK_THRESHOLD", "0.05"))
+    
+    @property
+    def rerank_max_concurrency(self) -> int:
+        """同时进行的reranker调用数上限"""
+        return int(os.environ.get("RERANK_MAX_CONCURRENCY", "8"))
+    
+    @property
+    def rerank_skip_similarity(self) -> float:
+        """余弦相似度达到该值的候选不调用reranker"""
+        return float(os.environ.get("RERANK_SKIP_SIMILARITY", "0.95"))
+    
+    @property
+    def rerank_drop_similarity(self) -> float:
+        """余弦相似度低于该值的候选直接丢弃，不调用reranker"""
+        return float(os.environ.get("RERANK_DROP_SIMILARITY", self.similarity_threshold))
+    
+    @property
+    def rerank_cache_enable(self) -> bool:
+        """是否启用重排得分缓存"""
+        return os.environ.get("RERANK_CACHE_ENABLE", "true").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def rerank_cache_path(self) -> str:
+        """重排得分缓存数据库路径"""
+        return os.environ.get("RERANK_CACHE_PATH", "cache/rerank_cache.db")
+    
+    @property
+    def rerank_cache_max_entries(self) -> int:
+        """重排得分缓存最大条目数"""
+        return int(os.environ.get("RERANK_CACHE_MAX_ENTRIES", "1000000"))
+    
+    @property
+    def similarity_quantization(self) -> str:
+        """相似度粗排使用的量化格式"""
+        return os.environ.get("SIMILARITY_QUANTIZATION", "none").lower()
+    
+    @property
+    def similarity_rescore_margin(self) -> float:
+        """量化粗排时阈值的放宽幅度，保证量化误差不丢失候选"""
+        return float(os.environ.get("SIMILARITY_RESCORE_MARGIN", "0.02"))
+    
+    @property
+    def similarity_prefilter_dims(self) -> int:
+        """两阶段召回的粗排前缀维度"""
+        return int(os.environ.get("SIMILARITY_PREFILTER_DIMS", "256"))
+    
+    @property
+    def similarity_prefilter_min_segments(self) -> int:
+        """启用两阶段召回的最小片段数"""
+        return int(os.environ.get("SIMILARITY_PREFILTER_MIN_SEGMENTS", "2000"))
+    
+    @property
+    def similarity_prefilter_margin(self) -> float:
+        """前缀粗排时阈值的放宽幅度"""
+        return float(os.environ.get("SIMILARITY_PREFILTER_MARGIN", "0.1"))
+    
+    @property
+    def similarity_block_mb(self) -> float:
+        """精确相似度单个行块的内存上限(MB)"""
+        return float(os.environ.get("SIMILARITY_BLOCK_MB", "256"))
+    
+    @property
+    def similarity_processes(self) -> int:
+        """多进程相似度计算的进程数，auto为CPU核数"""
+        value = os.environ.get("SIMILARITY_PROCESSES", "0").lower()
+        if value == "auto":
+            return os.cpu_count() or 1
+        return int(value)
+    
+    @property
+    def similarity_parallel_min_segments(self) -> int:
+        """片段数达到该值时才使用多进程相似度计算"""
+        return int(os.environ.get("SIMILARITY_PARALLEL_MIN_SEGMENTS", "5000"))
+    
+    @property
+    def ann_index_type(self) -> str:
+        """ANN索引类型"""
+        return os.environ.get("ANN_INDEX_TYPE", "hnsw").lower()
+    
+    @property
+    def ann_min_segments(self) -> int:
+        """启用ANN索引的最小片段数"""
+        return int(os.environ.get("ANN_MIN_SEGMENTS", "10000"))
+    
+    @property
+    def ann_hnsw_m(self) -> int:
+        """HNSW每个节点的邻居数"""
+        return int(os.environ.get("ANN_HNSW_M", "32"))
+    
+    @property
+    def ann_hnsw_ef_construction(self) -> int:
+        """HNSW建图时的候选队列长度"""
+        return int(os.environ.get("ANN_HNSW_EF_CONSTRUCTION", "80"))
+    
+    @property
+    def ann_hnsw_ef_search(self) -> int:
+        """HNSW检索时的候选队列长度"""
+        return int(os.environ.get("ANN_HNSW_EF_SEARCH", "128"))
+    
+    @property
+    def ann_ivf_nprobe(self) -> int:
+        """IVF检索时访问的倒排桶数"""
+        return int(os.environ.get("ANN_IVF_NPROBE", "16"))
+    
+    @property
+    def ann_oversample(self) -> int:
+        """ANN检索数相对top_k的放大倍数"""
+        return int(os.environ.get("ANN_OVERSAMPLE", "4"))
+    
+    @property
+    def corpus_index_enable(self) -> bool:
+        """是否启用历史语料索引"""
+        return os.environ.get("CORPUS_INDEX_ENABLE", "false").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def corpus_index_path(self) -> str:
+        """历史语料索引目录"""
+        return os.environ.get("CORPUS_INDEX_PATH", "cache/corpus_index")
+    
+    @property
+    def corpus_index_save_every(self) -> int:
+        """历史语料HNSW图累计新增多少个片段后落盘"""
+        return int(os.environ.get("CORPUS_INDEX_SAVE_EVERY", "5000"))
+    
     @property
     def dashscope_api_key(self) -> str:
         """DashScope API密钥"""
         return os.environ.get("DASHSCOPE_API_KEY", "")
     
+    @property
+    def exact_duplicate_enable(self) -> bool:
+        """是否启用精确重复短路"""
+        return os.environ.get("EXACT_DUPLICATE_ENABLE", "true").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def minhash_enable(self) -> bool:
+        """是否启用MinHash近似重复检测"""
+        return os.environ.get("MINHASH_ENABLE", "true").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def minhash_num_perm(self) -> int:
+        """MinHash签名长度"""
+        return int(os.environ.get("MINHASH_NUM_PERM", "128"))
+    
+    @property
+    def minhash_shingle_size(self) -> int:
+        """MinHash字符n-gram长度"""
+        return int(os.environ.get("MINHASH_SHINGLE_SIZE", "3"))
+    
+    @property
+    def minhash_threshold(self) -> float:
+        """MinHash候选召回的估计Jaccard阈值"""
+        return float(os.environ.get("MINHASH_THRESHOLD", "0.5"))
+    
+    @property
+    def minhash_direct_threshold(self) -> float:
+        """估计Jaccard达到该值的片段对直接输出"""
+        return float(os.environ.get("MINHASH_DIRECT_THRESHOLD", "0.85"))
+    
+    @property
+    def minhash_max_bucket_size(self) -> int:
+        """MinHash单个桶的片段数上限"""
+        return int(os.environ.get("MINHASH_MAX_BUCKET_SIZE", "200"))
+    
+    @property
+    def minhash_min_shingles(self) -> int:
+        """参与MinHash检测的片段最少n-gram数"""
+        return int(os.environ.get("MINHASH_MIN_SHINGLES", "30"))
+    
+    @property
+    def simhash_enable(self) -> bool:
+        """是否启用SimHash指纹逐字复制检测"""
+        return os.environ.get("SIMHASH_ENABLE", "true").lower() in ("true", "1", "yes", "on")
+    
+    @property
+    def simhash_max_distance(self) -> int:
+        """SimHash指纹查找的最大汉明距离"""
+        return int(os.environ.get("SIMHASH_MAX_DISTANCE", "3"))
+    
+    @property
+    def simhash_shingle_size(self) -> int:
+        """SimHash字符n-gram长度"""
+        return int(os.environ.get("SIMHASH_SHINGLE_SIZE", "3"))
+    
+    @property
+    def simhash_min_shingles(self) -> int:
+        """参与SimHash检测的片段最少n-gram数"""
+        return int(os.environ.get("SIMHASH_MIN_SHINGLES", "30"))
+    
     # 验证管理器相关配置属性
     @property
     def validation_strategy(self) -> str:
@@ -5,8 +5,19 @@
 
 from .document_processor import DocumentProcessor
 from .clustering_manager import ClusteringManager
+from .rule_chunker import RuleBasedChunker
+from .semantic_chunker import SemanticChunker
+from .corpus_index import CorpusIndex
+from .rerankers import Reranker, DashScopeReranker, LexicalReranker, get_reranker
 
 __all__ = [
     'DocumentProcessor',
-    'ClusteringManager'
+    'ClusteringManager',
+    'RuleBasedChunker',
+    'SemanticChunker',
+    'CorpusIndex',
+    'Reranker',
+    'DashScopeReranker',
+    'LexicalReranker',
+    'get_reranker'
 ]
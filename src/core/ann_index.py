@@ -0,0 +1,109 @@
+"""
+近似最近邻索引
+基于FAISS在单次请求内对归一化向量构建HNSW或IVF内积索引，检索每个片段的近邻候选；
+不需要构造N×N相似度矩阵，片段数达到上万时仍能控制时间和内存
+"""
+
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# 动态导入faiss以避免依赖问题
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    logger.warning("faiss未安装，ANN检索将使用精确相似度计算")
+    FAISS_AVAILABLE = False
+
+ANN_INDEX_TYPES = ("hnsw", "ivf")
+
+
+class ANNIndex:
+    """请求级的FAISS内积索引（向量需已L2归一化，内积即余弦相似度）"""
+
+    def __init__(self, embeddings: np.ndarray, index_type: str = "hnsw", quantization: str = "none",
+                 hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 128, nprobe: int = 16):
+        """
+        构建索引
+
+        Args:
+            embeddings: 形状为 (n, d) 的归一化向量矩阵
+            index_type: hnsw 或 ivf
+            quantization: 索引内向量的存储格式，none(float32)、float16 或 int8（标量量化）
+            hnsw_m: HNSW每个节点的邻居数
+            ef_construction: HNSW建图时的候选队列长度
+            ef_search: HNSW检索时的候选队列长度（不小于检索的k）
+            nprobe: IVF检索时访问的倒排桶数
+        """
+        if not FAISS_AVAILABLE:
+            raise RuntimeError("faiss未安装，无法构建ANN索引")
+        if index_type not in ANN_INDEX_TYPES:
+            raise ValueError(f"不支持的ANN索引类型: {index_type}")
+
+        start_time = time.time()
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        count, dimensions = vectors.shape
+        self.index_type = index_type
+        self.ef_search = ef_search
+
+        scalar_type = {
+            "float16": faiss.ScalarQuantizer.QT_fp16,
+            "int8": faiss.ScalarQuantizer.QT_8bit,
+        }.get(quantization)
+
+        if index_type == "hnsw":
+            if scalar_type is None:
+                self.index = faiss.IndexHNSWFlat(dimensions, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            else:
+                self.index = faiss.IndexHNSWSQ(dimensions, scalar_type, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = ef_construction
+        else:
+            # 倒排桶数取 4√n，保证每个桶有足够的训练样本
+            nlist = max(1, min(int(4 * np.sqrt(count)), count // 39))
+            self._quantizer = faiss.IndexFlatIP(dimensions)
+            if scalar_type is None:
+                self.index = faiss.IndexIVFFlat(self._quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                self.index = faiss.IndexIVFScalarQuantizer(
+                    self._quantizer, dimensions, nlist, scalar_type, faiss.METRIC_INNER_PRODUCT
+                )
+            self.index.nprobe = min(nprobe, nlist)
+
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+        logger.info(f"🧭 ANN索引构建完成: {index_type}, {count} 个向量, 存储 {quantization}, "
+                    f"耗时 {time.time() - start_time:.2f}秒")
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索每个查询向量的前k个近邻
+
+        Returns:
+            (相似度矩阵, 行号矩阵)，形状均为 (查询数, k)，不足k个时行号为-1
+        """
+        k = max(1, min(k, len(self)))
+        if self.index_type == "hnsw":
+            self.index.hnsw.efSearch = max(self.ef_search, k)
+        return self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+
+
+def build_ann_index(embeddings: np.ndarray, index_type: str, quantization: str = "none",
+                    **kwargs) -> Optional[ANNIndex]:
+    """构建ANN索引，faiss不可用或构建失败时返回None，由调用方退回精确计算"""
+    if not FAISS_AVAILABLE:
+        return None
+    try:
+        return ANNIndex(embeddings, index_type=index_type, quantization=quantization, **kwargs)
+    except Exception as e:
+        logger.warning(f"ANN索引构建失败，使用精确相似度计算: {e}")
+        return None
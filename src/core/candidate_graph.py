@@ -0,0 +1,131 @@
+"""
+候选图分组
+将召回阶段得到的候选边 (片段, 片段, 相似度) 视为稀疏相似图，用并查集划分连通分量作为送入大模型的片段组：
+边按相似度降序合并，合并后超过组大小上限的边不合并，因此小分量保持完整，超大分量沿最强的边切分为多个组；
+切分后跨组的边按端点聚成星形小组补充，每条候选边都至少落在一个组内，单个提示词的片段数始终有上限
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+class UnionFind:
+    """带分量大小的并查集（路径减半 + 按大小合并）"""
+
+    def __init__(self, count: int):
+        self.parent = list(range(count))
+        self.size = [1] * count
+
+    def find(self, node: int) -> int:
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, a: int, b: int, max_size: int = 0) -> bool:
+        """
+        合并a与b所在的分量
+
+        Args:
+            max_size: 合并后分量大小的上限，0表示不限制
+
+        Returns:
+            两者合并后（或原本）是否在同一分量
+        """
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return True
+        if max_size and self.size[root_a] + self.size[root_b] > max_size:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return True
+
+
+def undirected_edges(left: np.ndarray, right: np.ndarray,
+                     weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """将有向候选边合并为无向边，同一对节点保留最大权重，结果按权重降序"""
+    left, right, weights = np.asarray(left), np.asarray(right), np.asarray(weights, dtype=np.float32)
+    low, high = np.minimum(left, right), np.maximum(left, right)
+    keep = low != high
+    low, high, weights = low[keep], high[keep], weights[keep]
+    order = np.lexsort((-weights, high, low))
+    low, high, weights = low[order], high[order], weights[order]
+    first = np.ones(len(low), dtype=bool)
+    first[1:] = (low[1:] != low[:-1]) | (high[1:] != high[:-1])
+    low, high, weights = low[first], high[first], weights[first]
+    order = np.argsort(-weights, kind="stable")
+    return low[order], high[order], weights[order]
+
+
+def group_candidates(left: np.ndarray, right: np.ndarray, weights: np.ndarray,
+                     max_group_size: int = 8) -> List[List[int]]:
+    """
+    将候选边划分为大小受限的节点组
+
+    Args:
+        left, right: 边的两个端点（任意整数标识，如存储行号）
+        weights: 边的相似度
+        max_group_size: 每组最多的节点数（不小于2）
+
+    Returns:
+        节点组列表，组内节点按组内加权度降序排列；组按最强边的相似度降序排列
+    """
+    max_group_size = max(2, max_group_size)
+    low, high, weights = undirected_edges(left, right, weights)
+    if len(low) == 0:
+        return []
+
+    nodes, inverse = np.unique(np.concatenate([low, high]), return_inverse=True)
+    a, b = inverse[:len(low)], inverse[len(low):]
+
+    # 按相似度降序的有界合并：分量不超过上限时与普通连通分量一致，超大分量沿最强边切分
+    union_find = UnionFind(len(nodes))
+    for node_a, node_b in zip(a.tolist(), b.tolist()):
+        union_find.union(node_a, node_b, max_group_size)
+    roots = np.asarray([union_find.find(node) for node in range(len(nodes))])
+    groups = _split_by_key(np.arange(len(nodes)), roots)
+
+    # 被切断的边：分配给剩余度较大的端点，以其为中心按相似度降序分批成组
+    leftover = roots[a] != roots[b]
+    if leftover.any():
+        cut_a, cut_b = a[leftover], b[leftover]
+        degree = np.bincount(np.concatenate([cut_a, cut_b]), minlength=len(nodes))
+        a_is_center = (degree[cut_a] > degree[cut_b]) | ((degree[cut_a] == degree[cut_b]) & (cut_a < cut_b))
+        centers = np.where(a_is_center, cut_a, cut_b)
+        spokes = np.where(a_is_center, cut_b, cut_a)
+        # 边已按相似度降序，稳定排序后每个中心的邻居仍按相似度降序
+        order = np.argsort(centers, kind="stable")
+        centers, spokes = centers[order], spokes[order]
+        starts = np.flatnonzero(np.r_[True, centers[1:] != centers[:-1]])
+        counts = np.diff(np.r_[starts, len(centers)])
+        rank = np.arange(len(centers)) - np.repeat(starts, counts)
+        # 每个中心的邻居按 max_group_size-1 个一批切分，batch按排序后的顺序单调不减
+        batch = np.repeat(np.arange(len(starts)), counts) * len(centers) + rank // (max_group_size - 1)
+        boundaries = np.flatnonzero(batch[1:] != batch[:-1]) + 1
+        for center_batch, spoke_batch in zip(np.split(centers, boundaries), np.split(spokes, boundaries)):
+            groups.append([int(center_batch[0])] + spoke_batch.tolist())
+
+    # 组内按加权度排序，组间按组内节点的最强边排序
+    strength = np.bincount(a, weights, len(nodes)) + np.bincount(b, weights, len(nodes))
+    best_edge = np.zeros(len(nodes))
+    np.maximum.at(best_edge, a, weights)
+    np.maximum.at(best_edge, b, weights)
+    ordered = []
+    for group in groups:
+        group = sorted(group, key=lambda node: (-strength[node], node))
+        ordered.append((best_edge[group].max(), nodes[group].tolist()))
+    ordered.sort(key=lambda item: -item[0])
+    return [group for _, group in ordered]
+
+
+def _split_by_key(values: np.ndarray, keys: np.ndarray) -> List[List[int]]:
+    """按键将值分组（保持组内原顺序），只返回包含至少两个值的组"""
+    order = np.argsort(keys, kind="stable")
+    values, keys = values[order], keys[order]
+    boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return [group.tolist() for group in np.split(values, boundaries) if len(group) >= 2]
@@ -1,28 +1,40 @@
 """
 增强版聚类管理器
-使用ANN近似召回 + 全量相似度矩阵fallback + Qwen reranker
+使用ANN近似召回 + 全量相似度矩阵fallback + reranker精排（远程Qwen或本地词法），
+候选边按相似图的连通分量分组
 专门优化两两查重任务的性能
 """
 
-import os
 import time
 import numpy as np
-from typing import List, Dict, Tuple, Optional
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Tuple, Optional, Union, Iterable
 
 from ..models.data_models import TextSegment
+from ..models.segment_store import SegmentStore, SegmentView
+from .ann_index import ANN_INDEX_TYPES, FAISS_AVAILABLE, build_ann_index
+from .candidate_graph import group_candidates
+from .parallel_similarity import SimilarityPool
+from .rerank_engine import RerankCache, RerankEngine
+from .rerankers import Reranker, create_reranker
+from .similarity_kernels import (
+    block_rows_for_budget, blockwise_pairs, blockwise_topk, duplicate_keys
+)
+from ..embeddings.quantization import (
+    QUANTIZATION_MODES, QuantizedMatrix, quantize, quantized_similarity, rescore_pairs, truncate_embeddings
+)
 from ..utils.unified_logger import UnifiedLogger
 
 logger = UnifiedLogger.get_logger(__name__)
 
-# 动态导入dashscope以避免依赖问题
-try:
-    import dashscope
-    from http import HTTPStatus
-    DASHSCOPE_AVAILABLE = True
-except ImportError:
-    logger.warning("dashscope未安装，将禁用reranker功能")
-    DASHSCOPE_AVAILABLE = False
+# 候选边: (查询片段行号, 候选片段行号, 相似度)
+CandidateEdges = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# 片段对: ((文档ID, 片段ID), (文档ID, 片段ID))，与输出结果中的片段标识一致
+SegmentPair = Tuple[Tuple[int, int], Tuple[int, int]]
+
+
+def _empty_edges() -> CandidateEdges:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
 
 
 class ClusteringManager:
@@ -32,7 +44,28 @@ class ClusteringManager:
                  top_k: int = 10, 
                  similarity_threshold: float = 0.7,
                  use_reranker: bool = True,
-                 max_candidates_for_rerank: int = 20):
+                 max_candidates_for_rerank: int = 20,
+                 quantization: str = "none",
+                 rescore_margin: float = 0.02,
+                 prefilter_dims: int = 0,
+                 prefilter_min_segments: int = 2000,
+                 prefilter_margin: float = 0.1,
+                 ann_index_type: str = "hnsw",
+                 ann_min_segments: int = 10000,
+                 ann_hnsw_m: int = 32,
+                 ann_ef_construction: int = 80,
+                 ann_ef_search: int = 128,
+                 ann_nprobe: int = 16,
+                 ann_oversample: int = 4,
+                 block_mb: float = 256,
+                 corpus_index=None,
+                 rerank_max_concurrency: int = 8,
+                 rerank_skip_similarity: float = 0.95,
+                 rerank_drop_similarity: Optional[float] = None,
+                 rerank_cache: Optional[RerankCache] = None,
+                 reranker: Optional[Reranker] = None,
+                 max_group_size: int = 8,
+                 similarity_pool: Optional[SimilarityPool] = None):
         """
         初始化管理器
         
@@ -41,268 +74,521 @@ class ClusteringManager:
             similarity_threshold: 相似度阈值
             use_reranker: 是否使用reranker精排
             max_candidates_for_rerank: 送入reranker的最大候选数
+            quantization: 相似度粗排的量化格式（none/float16/int8）
+            rescore_margin: 量化粗排时阈值的放宽幅度
+            prefilter_dims: 两阶段召回时粗排使用的向量前缀维度，0表示不启用
+            prefilter_min_segments: 片段数达到该值时才启用前缀粗排
+            prefilter_margin: 前缀粗排时阈值的放宽幅度
+            ann_index_type: ANN索引类型（hnsw/ivf/none），none表示始终精确计算
+            ann_min_segments: 片段数达到该值时才使用ANN索引，以下使用精确计算
+            ann_hnsw_m: HNSW每个节点的邻居数
+            ann_ef_construction: HNSW建图时的候选队列长度
+            ann_ef_search: HNSW检索时的候选队列长度
+            ann_nprobe: IVF检索时访问的倒排桶数
+            ann_oversample: ANN检索数相对top_k的放大倍数，用于抵消同文档近邻的占位
+            block_mb: 精确计算时单个相似度行块的内存上限(MB)
+            corpus_index: 历史语料索引（CorpusIndex），提供时额外召回与历史文档相似的片段
+            rerank_max_concurrency: 同时进行的reranker调用数上限
+            rerank_skip_similarity: 余弦相似度不低于该值的候选不调用reranker，直接保留
+            rerank_drop_similarity: 余弦相似度低于该值的候选不调用reranker，直接丢弃，缺省等于similarity_threshold
+            rerank_cache: 重排得分缓存，为None时不缓存
+            reranker: 重排后端，缺省时使用DashScope，不可用则禁用reranker
+            max_group_size: 候选图分组后每组（单次LLM检测）的最大片段数
+            similarity_pool: 多进程相似度进程池，提供时大请求的分块精确计算在共享内存上并行执行
         """
         self.top_k = top_k
         self.similarity_threshold = similarity_threshold
-        self.use_reranker = use_reranker and DASHSCOPE_AVAILABLE
+        self.use_reranker = use_reranker
         self.max_candidates_for_rerank = max_candidates_for_rerank
         
-        # 初始化reranker客户端
+        if quantization not in QUANTIZATION_MODES:
+            logger.warning(f"未知的量化格式 {quantization}，使用全精度相似度计算")
+            quantization = "none"
+        self.quantization = quantization
+        self.rescore_margin = rescore_margin if quantization != "none" else 0.0
+        
+        self.prefilter_dims = prefilter_dims
+        self.prefilter_min_segments = prefilter_min_segments
+        self.prefilter_margin = prefilter_margin
+        
+        if ann_index_type not in ANN_INDEX_TYPES + ("none",):
+            logger.warning(f"未知的ANN索引类型 {ann_index_type}，使用精确相似度计算")
+            ann_index_type = "none"
+        self.ann_index_type = ann_index_type
+        self.ann_min_segments = ann_min_segments
+        self.ann_index_params = {
+            "hnsw_m": ann_hnsw_m,
+            "ef_construction": ann_ef_construction,
+            "ef_search": ann_ef_search,
+            "nprobe": ann_nprobe,
+        }
+        self.ann_oversample = max(1, ann_oversample)
+        self.block_mb = block_mb
+        self.corpus_index = corpus_index
+        self.max_group_size = max(2, max_group_size)
+        self.similarity_pool = similarity_pool
+        
+        # 初始化reranker
+        self.reranker = None
+        self.rerank_engine = None
         if self.use_reranker:
-            self._init_reranker()
-    
-    def _init_reranker(self):
-        """初始化Qwen reranker"""
-        if not DASHSCOPE_AVAILABLE:
-            self.use_reranker = False
-            return
-            
-        try:
-            # 从环境变量获取API密钥
-            api_key = os.environ.get("DASHSCOPE_API_KEY")
-            if not api_key:
-                logger.warning("未找到DASHSCOPE_API_KEY，将禁用reranker功能")
-                self.use_reranker = False
-                return
-            
-            dashscope.api_key = api_key
-            logger.info("已初始化Qwen reranker")
-        except Exception as e:
-            logger.error(f"初始化reranker失败: {e}")
+            self.reranker = reranker or create_reranker()
+        if self.reranker is None:
             self.use_reranker = False
+        else:
+            self.rerank_engine = RerankEngine(
+                reranker=self.reranker,
+                max_candidates=max_candidates_for_rerank,
+                max_concurrency=rerank_max_concurrency,
+                skip_similarity=rerank_skip_similarity,
+                drop_similarity=similarity_threshold if rerank_drop_similarity is None else rerank_drop_similarity,
+                cache=rerank_cache
+            )
+    
+    @staticmethod
+    def _as_store(segments: Union[List[TextSegment], SegmentStore]) -> SegmentStore:
+        """统一转换为列式片段存储"""
+        if isinstance(segments, SegmentStore):
+            return segments
+        return SegmentStore.from_segments(segments)
+    
+    def _use_prefilter(self, embeddings: np.ndarray) -> bool:
+        """大请求且前缀维度小于完整维度时启用前缀粗排"""
+        return (0 < self.prefilter_dims < embeddings.shape[1] and
+                embeddings.shape[0] >= self.prefilter_min_segments)
     
-    def ann_similarity_search(self, segments: List[TextSegment]) -> Dict[int, List[TextSegment]]:
+    def _coarse_matrix(self, embeddings: np.ndarray, doc_ids: np.ndarray) -> Tuple[QuantizedMatrix, float, bool]:
         """
-        基于ANN的相似性搜索
-        为每个文档片段找到最相似的候选片段
+        粗排向量矩阵
+        
+        大请求先截取向量前缀并重新归一化，再按配置量化；粗排结果精度较低，
+        召回阈值相应放宽，通过的候选需以完整维度全精度重新打分
+        
+        Returns:
+            (粗排向量矩阵, 召回阈值, 是否需要全精度重打分)
         """
-        if not segments:
-            raise ValueError("文档片段列表为空")
+        coarse = embeddings
+        recall_threshold = self.similarity_threshold
+        use_prefilter = self._use_prefilter(embeddings)
+        if use_prefilter:
+            coarse = truncate_embeddings(embeddings, self.prefilter_dims)
+            recall_threshold -= self.prefilter_margin
+        
+        coarse = quantize(coarse, self.quantization)
+        if self.quantization != "none":
+            recall_threshold -= self.rescore_margin
+        
+        if use_prefilter:
+            recall = self._estimate_prefilter_recall(embeddings, coarse, doc_ids, recall_threshold)
+            logger.info(f"两阶段召回: 前 {self.prefilter_dims}/{embeddings.shape[1]} 维粗排, "
+                        f"召回阈值 {recall_threshold:.3f}, 抽样召回率 {recall:.1%}")
+        
+        needs_rescore = use_prefilter or self.quantization != "none"
+        return coarse, recall_threshold, needs_rescore
+    
+    def _estimate_prefilter_recall(self, embeddings: np.ndarray, coarse: QuantizedMatrix,
+                                   doc_ids: np.ndarray, recall_threshold: float, sample_size: int = 64) -> float:
+        """抽样若干行计算完整维度相似度，统计真实候选中被粗排召回的比例"""
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(embeddings), size=min(sample_size, len(embeddings)), replace=False)
+        
+        exact = embeddings[sample] @ embeddings.T
+        cross_doc = doc_ids[None, :] != doc_ids[sample, None]
+        relevant = (exact >= self.similarity_threshold) & cross_doc
+        recalled = relevant & (quantized_similarity(coarse.select(sample), coarse) >= recall_threshold)
         
-        # 检查嵌入向量
-        segments_with_embeddings = [seg for seg in segments if seg.embedding is not None]
-        if not segments_with_embeddings:
+        total = int(relevant.sum())
+        return float(recalled.sum()) / total if total else 1.0
+    
+    def _use_similarity_pool(self, rows: int) -> bool:
+        """配置了进程池且片段数达到阈值时，分块精确计算交给多进程执行"""
+        return self.similarity_pool is not None and self.similarity_pool.should_use(rows)
+    
+    def _use_ann_index(self, embeddings: np.ndarray) -> bool:
+        """片段数达到阈值且faiss可用时使用ANN索引"""
+        return (self.ann_index_type != "none" and FAISS_AVAILABLE and
+                embeddings.shape[0] >= self.ann_min_segments)
+    
+    def _exact_neighbors(self, embeddings: np.ndarray, doc_ids: np.ndarray,
+                         dup_keys: np.ndarray) -> Tuple[Iterable[Tuple[int, np.ndarray]], float, bool]:
+        """
+        分块精确计算每行的跨文档近邻
+        
+        Returns:
+            ((行, 按相似度降序的候选行), ...) 的迭代器, 召回阈值, 是否需要全精度重打分；
+            候选已排除同文档与完全相同的片段，需重打分时每行保留2*top_k个，否则保留top_k个
+        """
+        coarse, recall_threshold, needs_rescore = self._coarse_matrix(embeddings, doc_ids)
+        k = self.top_k * 2 if needs_rescore else self.top_k
+        block_rows = block_rows_for_budget(len(embeddings), self.block_mb)
+        indices = None
+        if self._use_similarity_pool(len(embeddings)):
+            # 当前线程的回退计算使用相同的行块，结果与进程池一致
+            block_rows = self.similarity_pool.block_rows(len(embeddings), block_rows)
+            try:
+                _, indices = self.similarity_pool.topk(coarse, doc_ids, dup_keys, k, recall_threshold, block_rows)
+            except Exception as e:
+                logger.warning(f"多进程相似度计算失败，改为当前线程计算: {e}")
+        if indices is None:
+            _, indices = blockwise_topk(coarse, doc_ids, dup_keys, k, recall_threshold, block_rows=block_rows)
+        neighbors = ((i, row[row >= 0]) for i, row in enumerate(indices))
+        return neighbors, recall_threshold, needs_rescore
+    
+    def _ann_neighbors(self, embeddings: np.ndarray, doc_ids: np.ndarray,
+                       dup_keys: np.ndarray) -> Tuple[Iterable[Tuple[int, np.ndarray]], float, bool]:
+        """
+        基于FAISS索引的近似近邻，返回格式与 _exact_neighbors 一致
+        
+        每行检索 top_k * 2 * ann_oversample 个近邻后过滤同文档、完全相同与低于阈值的结果；
+        若某行检索结果全部高于阈值但跨文档候选仍不足，说明近邻被同文档片段占满，
+        对这些行加倍检索数重新检索
+        """
+        index = build_ann_index(embeddings, self.ann_index_type, self.quantization, **self.ann_index_params)
+        if index is None:
+            return self._exact_neighbors(embeddings, doc_ids, dup_keys)
+        
+        recall_threshold = self.similarity_threshold - self.rescore_margin
+        needs_rescore = self.quantization != "none"
+        pool_size = self.top_k * 2
+        
+        neighbors: List[np.ndarray] = [np.empty(0, dtype=np.int64)] * len(embeddings)
+        pending = np.arange(len(embeddings))
+        k = pool_size * self.ann_oversample
+        while len(pending) > 0:
+            scores, labels = index.search(embeddings[pending], k)
+            neighbor_rows = np.maximum(labels, 0)
+            query_keys = dup_keys[pending, None]
+            valid = ((labels >= 0) & (scores >= recall_threshold) &
+                     (doc_ids[neighbor_rows] != doc_ids[pending, None]) &
+                     ~((dup_keys[neighbor_rows] == query_keys) & (query_keys >= 0)))
+            saturated = []
+            for row, i in enumerate(pending):
+                neighbors[i] = labels[row][valid[row]]
+                if (len(neighbors[i]) < pool_size and labels[row][-1] >= 0 and
+                        scores[row][-1] >= recall_threshold and k < len(embeddings)):
+                    saturated.append(i)
+            pending = np.asarray(saturated, dtype=np.int64)
+            if len(pending) > 0:
+                k *= 2
+                logger.debug(f"{len(pending)} 个片段的近邻被同文档片段占满，扩大检索数至 {k}")
+        
+        logger.info(f"ANN索引检索完成: {self.ann_index_type}, 召回阈值 {recall_threshold:.3f}")
+        return enumerate(neighbors), recall_threshold, needs_rescore
+    
+    def _candidate_edges(self, store: SegmentStore) -> CandidateEdges:
+        """
+        请求内的ANN/精确近邻召回，返回候选边 (查询行, 候选行, 相似度)，行号为存储行号
+        
+        每个片段最多保留top_k个跨文档候选；粗排结果需重打分时相似度为全精度值
+        """
+        rows = store.embedded_rows()
+        if len(rows) == 0:
             raise ValueError("文档片段必须包含嵌入向量")
         
-        logger.info(f"开始ANN相似性搜索，处理 {len(segments_with_embeddings)} 个片段")
+        # 嵌入矩阵直接取自存储，归一化后内积即余弦相似度
+        embeddings = store.normalized_embeddings(rows)
+        doc_ids = store.doc_ids[rows]
+        dup_keys = duplicate_keys([store.content_hashes[row] for row in rows])
+        if self._use_ann_index(embeddings):
+            neighbors, recall_threshold, needs_rescore = self._ann_neighbors(embeddings, doc_ids, dup_keys)
+        else:
+            neighbors, recall_threshold, needs_rescore = self._exact_neighbors(embeddings, doc_ids, dup_keys)
+        
+        # 候选已按粗排相似度降序排列，且不含同文档及已由精确匹配阶段处理的片段；
+        # 粗排只保留前2*top_k个候选，统一以完整维度全精度打分后再按原阈值过滤
+        query_parts, candidate_parts = [], []
+        for i, ordered_indices in neighbors:
+            pool = ordered_indices[:self.top_k * 2] if needs_rescore else ordered_indices[:self.top_k]
+            if len(pool):
+                query_parts.append(np.full(len(pool), i, dtype=np.int64))
+                candidate_parts.append(np.asarray(pool, dtype=np.int64))
+        if not query_parts:
+            return _empty_edges()
+        
+        left, right = np.concatenate(query_parts), np.concatenate(candidate_parts)
+        similarities = rescore_pairs(embeddings, left, right)
+        keep = similarities >= self.similarity_threshold
+        left, right, similarities = left[keep], right[keep], similarities[keep]
+        if needs_rescore:
+            logger.info(f"粗排后全精度重打分 {len(keep)} 个候选对")
+            # 重打分后每个查询按全精度相似度重新截取top_k
+            order = np.lexsort((-similarities, left))
+            left, right, similarities = left[order], right[order], similarities[order]
+            starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+            rank = np.arange(len(left)) - np.repeat(starts, np.diff(np.r_[starts, len(left)]))
+            top = rank < self.top_k
+            left, right, similarities = left[top], right[top], similarities[top]
+        return rows[left], rows[right], similarities.astype(np.float32)
+    
+    def _clusters_from_edges(self, store: SegmentStore, edges: CandidateEdges,
+                             extra_edges: Optional[CandidateEdges] = None,
+                             reported_pairs: Optional[Iterable[SegmentPair]] = None) -> Dict[int, List[SegmentView]]:
+        """
+        将候选边视为稀疏相似图，按连通分量划分为大小受限的片段组
+        
+        其他召回来源（如MinHash）的候选边并入同一张图一起分组，使组大小上限对所有来源都成立；
+        已由逐字复制阶段直接输出的片段对不再作为候选边
+        """
+        if extra_edges is not None and len(extra_edges[0]):
+            edges = tuple(np.concatenate([current, np.asarray(extra, dtype=current.dtype)])
+                          for current, extra in zip(edges, extra_edges))
+        if reported_pairs:
+            edges = self._drop_reported(store, edges, reported_pairs)
+        groups = group_candidates(*edges, max_group_size=self.max_group_size)
+        return {cluster_id: store.views(group) for cluster_id, group in enumerate(groups, start=1)}
+    
+    @staticmethod
+    def _drop_reported(store: SegmentStore, edges: CandidateEdges,
+                       reported_pairs: Iterable[SegmentPair]) -> CandidateEdges:
+        """去掉两端为已输出片段对的候选边（不区分方向）"""
+        reported = {frozenset(pair) for pair in reported_pairs}
+        reported_segments = np.asarray(sorted({segment for pair in reported for segment in pair}), dtype=np.int64)
+        left, right, weights = edges
+        if len(left) == 0 or len(reported_segments) == 0:
+            return edges
+        
+        # 先按片段标识向量化筛出两端都出现在已输出结果中的边，只对这些边逐条比对
+        doc_ids, chunk_ids = store.doc_ids[:len(store)], store.chunk_ids[:len(store)]
+        encoded = (doc_ids.astype(np.int64) << 32) | chunk_ids.astype(np.int64)
+        reported_keys = (reported_segments[:, 0] << 32) | reported_segments[:, 1]
+        keep = np.ones(len(left), dtype=bool)
+        for idx in np.flatnonzero(np.isin(encoded[left], reported_keys) & np.isin(encoded[right], reported_keys)):
+            i, j = left[idx], right[idx]
+            pair = frozenset(((int(doc_ids[i]), int(chunk_ids[i])), (int(doc_ids[j]), int(chunk_ids[j]))))
+            keep[idx] = pair not in reported
+        if not keep.all():
+            logger.info(f"去掉 {int((~keep).sum())} 条已由逐字复制阶段输出的候选边")
+        return left[keep], right[keep], weights[keep]
+    
+    def ann_similarity_search(self, segments: Union[List[TextSegment], SegmentStore]) -> Dict[int, List[SegmentView]]:
+        """
+        基于ANN的相似性搜索
+        为每个文档片段找到最相似的候选片段，候选边按相似图的连通分量分组
+        """
+        if segments is None or len(segments) == 0:
+            raise ValueError("文档片段列表为空")
+        
+        store = self._as_store(segments)
+        logger.info(f"开始ANN相似性搜索，处理 {len(store.embedded_rows())} 个片段")
         start_time = time.time()
         
-        # 构建嵌入矩阵
-        embeddings = np.array([seg.embedding for seg in segments_with_embeddings])
+        clusters = self._clusters_from_edges(store, self._candidate_edges(store))
+        
+        elapsed = time.time() - start_time
+        logger.info(f"ANN搜索完成，耗时 {elapsed:.2f}秒，发现 {len(clusters)} 个候选聚类")
+        return clusters
+    
+    def _historical_edges(self, store: SegmentStore) -> CandidateEdges:
+        """
+        在历史语料索引中为每个片段召回相似的历史片段，返回候选边 (请求片段行, 历史片段行, 相似度)
+        
+        命中的历史片段作为不带向量的行追加到store末尾，与请求内候选同样交给reranker和LLM检测；
+        与本次请求中同一文档ID的历史片段不参与比对
+        """
+        rows = store.embedded_rows()
+        if self.corpus_index is None or len(rows) == 0:
+            return _empty_edges()
         
-        # 计算相似度矩阵
-        similarity_matrix = cosine_similarity(embeddings)
+        start_time = time.time()
+        try:
+            embeddings = store.normalized_embeddings(rows)
+            scores, hits = self.corpus_index.search(embeddings, self.top_k * 2)
+            records = self.corpus_index.segments(hits[hits >= 0].tolist())
+        except Exception as e:
+            logger.error(f"历史语料检索失败，跳过历史比对: {e}")
+            return _empty_edges()
         
-        # 为每个片段找到相似的候选片段
-        candidate_pairs = {}
+        request_doc_ids = set(store.doc_ids[rows].tolist())
+        appended_rows: Dict[int, int] = {}
+        left, right, similarities = [], [], []
         
-        for i, segment in enumerate(segments_with_embeddings):
-            # 获取与当前片段最相似的top_k个片段
-            similarities = similarity_matrix[i]
+        for i, (row_scores, row_hits) in enumerate(zip(scores, hits)):
+            matched = [
+                (int(hit), float(score)) for score, hit in zip(row_scores, row_hits)
+                if hit >= 0 and score >= self.similarity_threshold and int(hit) in records
+                and records[int(hit)]["document_id"] not in request_doc_ids
+            ][:self.top_k]
             
-            # 排除自己，并按相似度排序
-            candidate_indices = []
-            for j, sim in enumerate(similarities):
-                if i != j and sim >= self.similarity_threshold:
-                    # 只考虑来自不同文档的片段
-                    if segments_with_embeddings[j].document_id != segment.document_id:
-                        candidate_indices.append((j, sim))
-            
-            # 按相似度排序并取top_k
-            candidate_indices.sort(key=lambda x: x[1], reverse=True)
-            top_candidates = candidate_indices[:self.top_k]
-            
-            if top_candidates:
-                candidates = [segments_with_embeddings[idx] for idx, _ in top_candidates]
-                # 使用元组作为键以避免重复
-                pair_key = (min(segment.document_id, candidates[0].document_id),
-                          max(segment.document_id, candidates[0].document_id))
-                
-                if pair_key not in candidate_pairs:
-                    candidate_pairs[pair_key] = []
-                
-                candidate_pairs[pair_key].extend([segment] + candidates)
-        
-        # 转换为聚类格式（为了兼容现有接口）
-        clusters = {}
-        cluster_id = 1
-        
-        for pair_key, pair_segments in candidate_pairs.items():
-            # 去重
-            unique_segments = []
-            seen_ids = set()
-            for seg in pair_segments:
-                seg_id = (seg.document_id, seg.page, seg.chunk_id)
-                if seg_id not in seen_ids:
-                    seen_ids.add(seg_id)
-                    unique_segments.append(seg)
-            
-            if len(unique_segments) >= 2:
-                clusters[cluster_id] = unique_segments
-                cluster_id += 1
+            for hit, score in matched:
+                if hit not in appended_rows:
+                    record = records[hit]
+                    appended_rows[hit] = store.append(
+                        segment_id=record["segment_id"],
+                        content=record["content"],
+                        document_id=record["document_id"],
+                        page=record["page"],
+                        chunk_id=record["chunk_id"],
+                        content_hash=record["content_hash"],
+                        char_start=record["char_start"],
+                        char_end=record["char_end"]
+                    )
+                left.append(int(rows[i]))
+                right.append(appended_rows[hit])
+                similarities.append(score)
         
         elapsed = time.time() - start_time
-        logger.info(f"ANN搜索完成，耗时 {elapsed:.2f}秒，发现 {len(clusters)} 个候选聚类")
+        logger.info(f"📚 历史语料检索完成，耗时 {elapsed:.3f}秒，命中 {len(appended_rows)} 个历史片段，"
+                    f"形成 {len(left)} 条候选边")
+        return (np.asarray(left, dtype=np.int64), np.asarray(right, dtype=np.int64),
+                np.asarray(similarities, dtype=np.float32))
+    
+    def historical_similarity_search(self, store: SegmentStore) -> Dict[int, List[SegmentView]]:
+        """在历史语料索引中为每个片段召回相似的历史片段，按相似图分组为候选聚类"""
+        return self._clusters_from_edges(store, self._historical_edges(store))
+    
+    def _fallback_edges(self, store: SegmentStore) -> CandidateEdges:
+        """全量分块计算跨文档相似对，返回候选边 (行, 行, 相似度)"""
+        rows = store.embedded_rows()
+        if len(rows) == 0:
+            return _empty_edges()
         
-        return clusters
+        # 分块计算相似度（量化或前缀粗排时为粗排结果），只保留上三角的跨文档相似对
+        embeddings = store.normalized_embeddings(rows)
+        doc_ids = store.doc_ids[rows]
+        dup_keys = duplicate_keys([store.content_hashes[row] for row in rows])
+        coarse, recall_threshold, needs_rescore = self._coarse_matrix(embeddings, doc_ids)
+        block_rows = block_rows_for_budget(len(rows), self.block_mb)
+        pairs = None
+        if self._use_similarity_pool(len(rows)):
+            # 当前线程的回退计算使用相同的行块，结果与进程池一致
+            block_rows = self.similarity_pool.block_rows(len(rows), block_rows)
+            try:
+                pairs = self.similarity_pool.pairs(coarse, doc_ids, dup_keys, recall_threshold, block_rows)
+            except Exception as e:
+                logger.warning(f"多进程相似度计算失败，改为当前线程计算: {e}")
+        if pairs is None:
+            pairs = blockwise_pairs(coarse, doc_ids, dup_keys, recall_threshold, block_rows=block_rows)
+        left, right, similarities = pairs
+        
+        # 粗排通过的相似对以全精度复核
+        if needs_rescore:
+            similarities = rescore_pairs(embeddings, left, right)
+        keep = similarities >= self.similarity_threshold
+        return rows[left[keep]], rows[right[keep]], np.asarray(similarities[keep], dtype=np.float32)
     
-    def full_similarity_matrix_fallback(self, segments: List[TextSegment]) -> Dict[int, List[TextSegment]]:
+    def full_similarity_matrix_fallback(self, segments: Union[List[TextSegment], SegmentStore],
+                                        extra_edges: Optional[CandidateEdges] = None,
+                                        reported_pairs: Optional[Iterable[SegmentPair]] = None) -> Dict[int, List[SegmentView]]:
         """
         全量相似度矩阵计算作为fallback
         """
-        if not segments:
+        if segments is None or len(segments) == 0:
             return {}
         
         logger.info("使用全量相似度矩阵fallback策略")
         start_time = time.time()
         
-        segments_with_embeddings = [seg for seg in segments if seg.embedding is not None]
-        if not segments_with_embeddings:
-            return {}
-        
-        # 计算全量相似度矩阵
-        embeddings = np.array([seg.embedding for seg in segments_with_embeddings])
-        similarity_matrix = cosine_similarity(embeddings)
-        
-        # 找到所有超过阈值的相似对
-        clusters = {}
-        cluster_id = 1
-        processed_pairs = set()
-        
-        for i in range(len(segments_with_embeddings)):
-            for j in range(i + 1, len(segments_with_embeddings)):
-                seg1 = segments_with_embeddings[i]
-                seg2 = segments_with_embeddings[j]
-                
-                # 只比较不同文档的片段
-                if seg1.document_id != seg2.document_id:
-                    similarity = similarity_matrix[i][j]
-                    
-                    if similarity >= self.similarity_threshold:
-                        pair_key = tuple(sorted([
-                            (seg1.document_id, seg1.page, seg1.chunk_id),
-                            (seg2.document_id, seg2.page, seg2.chunk_id)
-                        ]))
-                        
-                        if pair_key not in processed_pairs:
-                            processed_pairs.add(pair_key)
-                            clusters[cluster_id] = [seg1, seg2]
-                            cluster_id += 1
+        store = self._as_store(segments)
+        edges = self._fallback_edges(store)
+        clusters = self._clusters_from_edges(store, edges, extra_edges, reported_pairs)
         
         elapsed = time.time() - start_time
-        logger.info(f"全量相似度计算完成，耗时 {elapsed:.2f}秒，发现 {len(clusters)} 个相似对")
+        logger.info(f"全量相似度计算完成，耗时 {elapsed:.2f}秒，发现 {len(edges[0])} 个相似对，"
+                    f"分为 {len(clusters)} 个候选聚类")
         
         return clusters
     
-    def rerank_candidates(self, query_segment: TextSegment, candidate_segments: List[TextSegment]) -> List[Tuple[TextSegment, float]]:
+    def rerank_candidates(self, query_segment: SegmentView, candidate_segments: List[SegmentView]) -> List[Tuple[SegmentView, float]]:
         """
-        使用Qwen reranker对候选片段进行精确排序
+        对候选片段进行精确排序，未启用reranker时按与查询的余弦相似度排序
         """
-        if not self.use_reranker or not candidate_segments or not DASHSCOPE_AVAILABLE:
-            # 如果不使用reranker，返回基于余弦相似度的排序
-            return [(seg, 0.5) for seg in candidate_segments]
-        
-        try:
-            # 准备文档列表
-            documents = [seg.content for seg in candidate_segments]
-            
-            # 限制候选数量以避免API限制
-            if len(documents) > self.max_candidates_for_rerank:
-                documents = documents[:self.max_candidates_for_rerank]
-                candidate_segments = candidate_segments[:self.max_candidates_for_rerank]
-            
-            # 调用reranker API
-            resp = dashscope.TextReRank.call(
-                model="gte-rerank-v2",
-                query=query_segment.content,
-                documents=documents,
-                top_n=len(documents),
-                return_documents=True
-            )
-            
-            if resp.status_code == HTTPStatus.OK:
-                results = resp.output.results
-                
-                # 构建排序结果
-                reranked_results = []
-                for result in results:
-                    index = result.index
-                    score = result.relevance_score
-                    segment = candidate_segments[index]
-                    reranked_results.append((segment, score))
-                
-                logger.debug(f"Reranker成功处理 {len(reranked_results)} 个候选片段")
-                return reranked_results
-            else:
-                logger.warning(f"Reranker调用失败: {resp.message}")
-                return [(seg, 0.5) for seg in candidate_segments]
-                
-        except Exception as e:
-            logger.error(f"Reranker调用异常: {e}")
-            return [(seg, 0.5) for seg in candidate_segments]
+        if not candidate_segments:
+            return []
+        if self.rerank_engine is None:
+            query = np.asarray(query_segment.embedding, dtype=np.float32)
+            candidates = np.asarray([seg.embedding for seg in candidate_segments], dtype=np.float32)
+            norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(query)
+            scores = (candidates @ query / np.maximum(norms, 1e-12)).tolist()
+            return sorted(zip(candidate_segments, scores), key=lambda item: -item[1])
+        texts = [query_segment.content] + [seg.content for seg in candidate_segments]
+        scorer = self.reranker.for_request(texts)
+        return self.rerank_engine.rerank({0: [query_segment] + list(candidate_segments)}, scorer)[0]
     
-    def enhanced_similarity_search(self, segments: List[TextSegment]) -> Dict[int, List[TextSegment]]:
+    def enhanced_similarity_search(self, segments: Union[List[TextSegment], SegmentStore],
+                                   extra_edges: Optional[CandidateEdges] = None,
+                                   reported_pairs: Optional[Iterable[SegmentPair]] = None) -> Dict[int, List[SegmentView]]:
         """
         增强版相似性搜索：ANN + Reranker + Fallback
+        
+        各召回来源产生的候选边合并为一张稀疏相似图，reranker按查询重排并过滤候选边，
+        再以并查集划分连通分量，超大分量沿最强的边切分为不超过 max_group_size 个片段的组
+        
+        Args:
+            segments: 片段列表或列式存储
+            extra_edges: 嵌入召回之外的候选边（行号为存储行号），不经reranker过滤，与其余候选边一起分组
+            reported_pairs: 已直接输出的片段对，不再交给大模型判断
         """
-        if not segments:
+        if segments is None or len(segments) == 0:
             raise ValueError("文档片段列表为空")
         
+        segments = self._as_store(segments)
         logger.info(f"开始增强版相似性搜索，处理 {len(segments)} 个片段")
+        start_time = time.time()
         
         try:
             # 优先使用ANN搜索
-            clusters = self.ann_similarity_search(segments)
+            edges = self._candidate_edges(segments)
             
             # 如果ANN搜索结果太少，使用fallback
-            if len(clusters) == 0:
+            if len(edges[0]) == 0:
                 logger.info("ANN搜索无结果，启用全量相似度矩阵fallback")
-                clusters = self.full_similarity_matrix_fallback(segments)
+                edges = self._fallback_edges(segments)
             
-            # 使用reranker优化结果
-            if self.use_reranker and clusters:
-                clusters = self._apply_reranker_to_clusters(clusters)
+            # 历史语料作为额外的候选来源
+            if self.corpus_index is not None:
+                historical = self._historical_edges(segments)
+                edges = tuple(np.concatenate([current, extra]) for current, extra in zip(edges, historical))
             
+            # 使用reranker优化候选边
+            if self.rerank_engine is not None and len(edges[0]):
+                edges = self._rerank_edges(edges, segments)
+            
+            clusters = self._clusters_from_edges(segments, edges, extra_edges, reported_pairs)
+            elapsed = time.time() - start_time
+            logger.info(f"🕸️ 候选图分组完成，耗时 {elapsed:.2f}秒: {len(edges[0])} 条候选边, "
+                        f"{len(clusters)} 个片段组（每组最多 {self.max_group_size} 个片段）")
             return clusters
             
         except Exception as e:
             logger.error(f"增强版搜索失败，使用fallback: {e}")
-            return self.full_similarity_matrix_fallback(segments)
+            return self.full_similarity_matrix_fallback(segments, extra_edges, reported_pairs)
     
-    def _apply_reranker_to_clusters(self, clusters: Dict[int, List[TextSegment]]) -> Dict[int, List[TextSegment]]:
+    def _rerank_edges(self, edges: CandidateEdges, store: SegmentStore) -> CandidateEdges:
         """
-        对聚类结果应用reranker优化
+        对候选边应用reranker优化
+        
+        以每条边的查询片段为query、其候选片段为候选统一打分，边的权重替换为重排得分，低分边丢弃
         """
-        logger.info("对聚类结果应用reranker优化")
-        optimized_clusters = {}
+        logger.info("对候选边应用reranker优化")
+        left, right, similarities = edges
         
-        for cluster_id, segments in clusters.items():
-            if len(segments) < 2:
-                continue
-            
-            # 将第一个片段作为query，其余作为候选
-            query_segment = segments[0]
-            candidate_segments = segments[1:]
-            
-            # 使用reranker排序
-            reranked_results = self.rerank_candidates(query_segment, candidate_segments)
-            
-            # 过滤低分结果（可以根据需要调整阈值）
-            rerank_threshold = 0.3
-            filtered_results = [
-                (seg, score) for seg, score in reranked_results 
-                if score >= rerank_threshold
-            ]
-            
-            if filtered_results:
-                # 重构聚类，包含query和高分候选
-                optimized_segments = [query_segment] + [seg for seg, _ in filtered_results]
-                optimized_clusters[cluster_id] = optimized_segments
+        # 需要请求级统计的reranker在本次请求的全部片段上建立一次索引
+        scorer = self.reranker.for_request(store.contents[:len(store)])
+        
+        # 按查询分组，候选按相似度降序，所有查询一起打分
+        order = np.lexsort((-similarities, left))
+        left, right = left[order], right[order]
+        boundaries = np.flatnonzero(left[1:] != left[:-1]) + 1
+        queries = {}
+        for query_rows, candidate_rows in zip(np.split(left, boundaries), np.split(right, boundaries)):
+            queries[int(query_rows[0])] = store.views([int(query_rows[0])] + candidate_rows.tolist())
+        reranked = self.rerank_engine.rerank(queries, scorer)
+        
+        # 过滤低分结果，阈值与reranker的得分尺度对应
+        kept = [
+            (query_row, candidate.row, score)
+            for query_row, results in reranked.items()
+            for candidate, score in results if score >= scorer.threshold
+        ]
         
-        logger.info(f"Reranker优化完成，优化后聚类数量: {len(optimized_clusters)}")
-        return optimized_clusters
+        logger.info(f"Reranker优化完成，保留 {len(kept)}/{len(left)} 条候选边")
+        if not kept:
+            return _empty_edges()
+        query_rows, candidate_rows, scores = zip(*kept)
+        return (np.asarray(query_rows, dtype=np.int64), np.asarray(candidate_rows, dtype=np.int64),
+                np.asarray(scores, dtype=np.float32))
     
-    def filter_multi_document_clusters(self, clusters: Dict[int, List[TextSegment]]) -> Dict[int, List[TextSegment]]:
+    def filter_multi_document_clusters(self, clusters: Dict[int, List[SegmentView]]) -> Dict[int, List[SegmentView]]:
         """
         过滤出包含多个文档的聚类（保持与原接口兼容）
         """
@@ -316,9 +602,11 @@ class ClusteringManager:
         return multi_doc_clusters
     
     # 为了保持兼容性，提供原有接口
-    def initial_clustering(self, segments: List[TextSegment]) -> Dict[int, List[TextSegment]]:
+    def initial_clustering(self, segments: Union[List[TextSegment], SegmentStore],
+                           extra_edges: Optional[CandidateEdges] = None,
+                           reported_pairs: Optional[Iterable[SegmentPair]] = None) -> Dict[int, List[SegmentView]]:
         """
         初始聚类（兼容接口）
         现在使用增强版相似性搜索
         """
-        return self.enhanced_similarity_search(segments)
\ No newline at end of file
+        return self.enhanced_similarity_search(segments, extra_edges, reported_pairs)
\ No newline at end of file
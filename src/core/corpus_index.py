@@ -0,0 +1,476 @@
+"""
+历史语料向量索引
+跨请求持久化已分析文档的片段向量，使新提交的文档可以与历史标书比对：
+向量按行号顺序写入磁盘文件并以内存映射读取，片段与文档元数据保存在SQLite旁路库中；
+新增文档只追加行，不需要重建，FAISS HNSW图定期落盘，加载时只补齐落盘之后新增的行；
+每个片段同时保存64位SimHash指纹，内存中的置换表索引支持不经嵌入的逐字复制查找
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..models.data_models import DocumentData
+from ..models.segment_store import SegmentStore
+from .ann_index import FAISS_AVAILABLE
+from .similarity_kernels import merge_topk
+from .simhash_index import SimHashIndex, simhash_fingerprints
+from ..utils.unified_logger import UnifiedLogger
+
+if FAISS_AVAILABLE:
+    import faiss
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# SQLite单条语句的参数数量有上限，批量查询时分块处理
+_SQLITE_BATCH_SIZE = 500
+
+# 无faiss时精确扫描的列块行数
+_SCAN_BLOCK_ROWS = 65536
+
+# 旧版本行占比较高时HNSW检索队列按 总行数/有效行数 放大，放大倍数的上限
+_MAX_STALE_EF_FACTOR = 4
+
+# 进程内按目录复用索引实例
+_index_instances: Dict[str, "CorpusIndex"] = {}
+_index_lock = threading.Lock()
+
+
+class CorpusIndex:
+    """可增量追加的历史片段向量索引（向量已L2归一化，内积即余弦相似度）"""
+
+    def __init__(self, directory: str, dimensions: int, model_name: str,
+                 hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 128,
+                 save_every: int = 5000, simhash_distance: int = 3, simhash_shingle_size: int = 3):
+        """
+        打开或创建索引
+
+        Args:
+            directory: 索引目录，包含向量文件、元数据库与HNSW图文件
+            dimensions: 向量维度
+            model_name: 嵌入模型名，与已有索引不一致时拒绝使用，避免混入不可比的向量
+            hnsw_m: HNSW每个节点的邻居数
+            ef_construction: HNSW建图时的候选队列长度
+            ef_search: HNSW检索时的候选队列长度
+            save_every: HNSW图累计新增多少行后落盘一次
+            simhash_distance: 指纹查找的最大汉明距离
+            simhash_shingle_size: 计算指纹的字符n-gram长度，与已有索引不一致时拒绝使用
+        """
+        self.directory = directory
+        self.dimensions = dimensions
+        self.model_name = model_name
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.save_every = save_every
+        self.simhash_distance = simhash_distance
+        self.simhash_shingle_size = simhash_shingle_size
+
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.metadata_path = os.path.join(directory, "metadata.db")
+        self.graph_path = os.path.join(directory, "hnsw.faiss")
+
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.memmap] = None
+        self._graph = None
+        self._unsaved_rows = 0
+        self._fingerprints = SimHashIndex(simhash_distance)
+        self._fingerprint_rows = 0
+        # 文档重新提交后旧版本的行仍留在向量文件与HNSW图中，检索时排除
+        self._stale_rows = np.empty(0, dtype=np.int64)
+        self._stale_checked_rows = 0
+        self._stale_batch = None
+        self._stale_selector = None
+
+        conn = self._connection()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "document_id INTEGER PRIMARY KEY, doc_hash TEXT NOT NULL, content TEXT NOT NULL, "
+            "pages TEXT NOT NULL, added_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "row INTEGER PRIMARY KEY, document_id INTEGER NOT NULL, doc_hash TEXT NOT NULL, "
+            "segment_id TEXT NOT NULL, page INTEGER NOT NULL, chunk_id INTEGER NOT NULL, "
+            "content TEXT NOT NULL, content_hash TEXT, char_start INTEGER, char_end INTEGER, simhash INTEGER);"
+            "CREATE INDEX IF NOT EXISTS idx_segments_document ON segments(document_id);"
+        )
+        self._check_meta(conn)
+        self._migrate_fingerprints(conn)
+        conn.commit()
+
+        if FAISS_AVAILABLE:
+            self._load_graph()
+        logger.info(f"📚 历史语料索引已打开: {directory}, {self.size()} 个片段")
+
+    def _connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（SQLite连接不能跨线程共享）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.metadata_path, timeout=30)
+            # WAL模式允许多进程并发读，写操作互不阻塞读
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _check_meta(self, conn: sqlite3.Connection):
+        """首次创建时记录维度、模型与指纹参数，已有索引与当前配置不一致时报错"""
+        expected = {"dimensions": str(self.dimensions), "model": self.model_name,
+                    "simhash_shingle_size": str(self.simhash_shingle_size)}
+        stored = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        missing = [(key, value) for key, value in expected.items() if key not in stored]
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", missing)
+        for key, value in expected.items():
+            if key in stored and stored[key] != value:
+                raise ValueError(f"历史语料索引的{key}为 {stored[key]}，与当前配置 {value} 不一致")
+
+    def _migrate_fingerprints(self, conn: sqlite3.Connection):
+        """旧版索引没有指纹列：补建列，并为缺少指纹的已有片段计算指纹"""
+        columns = {record[1] for record in conn.execute("PRAGMA table_info(segments)")}
+        if "simhash" not in columns:
+            conn.execute("ALTER TABLE segments ADD COLUMN simhash INTEGER")
+
+        pending = conn.execute("SELECT row, content FROM segments WHERE simhash IS NULL").fetchall()
+        if not pending:
+            return
+        fingerprints, valid = simhash_fingerprints([content for _, content in pending], self.simhash_shingle_size)
+        conn.executemany(
+            "UPDATE segments SET simhash = ? WHERE row = ?",
+            [(fingerprint, row) for (row, _), fingerprint, is_valid
+             in zip(pending, fingerprints.view(np.int64).tolist(), valid) if is_valid]
+        )
+        logger.info(f"🔖 历史语料索引补算 {int(valid.sum())} 个片段的SimHash指纹")
+
+    def size(self) -> int:
+        """已提交的片段行数（以元数据库为准，向量文件中未提交的尾部行不计入）"""
+        (count,) = self._connection().execute("SELECT COALESCE(MAX(row) + 1, 0) FROM segments").fetchone()
+        return int(count)
+
+    def _vector_rows(self, count: int) -> Optional[np.ndarray]:
+        """以内存映射方式读取前count行向量，文件增长后重新映射"""
+        if count == 0:
+            return None
+        if self._vectors is None or self._vectors.shape[0] < count:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                      shape=(count, self.dimensions))
+        return self._vectors[:count]
+
+    def _load_graph(self):
+        """加载落盘的HNSW图，并补齐落盘之后由本进程或其他进程追加的行"""
+        with self._lock:
+            if self._graph is None:
+                if os.path.exists(self.graph_path):
+                    try:
+                        self._graph = faiss.read_index(self.graph_path)
+                    except Exception as e:
+                        logger.warning(f"HNSW图文件损坏，从向量文件重新构建: {e}")
+                if self._graph is None or self._graph.d != self.dimensions:
+                    self._graph = faiss.IndexHNSWFlat(self.dimensions, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                    self._graph.hnsw.efConstruction = self.ef_construction
+            self._catch_up()
+
+    def _catch_up(self):
+        """将元数据库中已提交、但尚未加入HNSW图的行追加进图"""
+        count = self.size()
+        indexed = self._graph.ntotal
+        if count <= indexed:
+            return
+        vectors = self._vector_rows(count)
+        for start in range(indexed, count, _SCAN_BLOCK_ROWS):
+            stop = min(start + _SCAN_BLOCK_ROWS, count)
+            self._graph.add(np.ascontiguousarray(vectors[start:stop]))
+        self._unsaved_rows += count - indexed
+        if self._unsaved_rows >= self.save_every:
+            self._save_graph()
+
+    def _save_graph(self):
+        """原子地落盘HNSW图（先写临时文件再替换）"""
+        temp_path = f"{self.graph_path}.{os.getpid()}.tmp"
+        faiss.write_index(self._graph, temp_path)
+        os.replace(temp_path, self.graph_path)
+        self._unsaved_rows = 0
+        logger.info(f"💾 历史语料HNSW图已落盘: {self._graph.ntotal} 个片段")
+
+    @staticmethod
+    def document_hash(content: str) -> str:
+        """文档内容哈希，同一文档ID的内容变化时视为新版本"""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def add_documents(self, documents: List[DocumentData], store: SegmentStore,
+                      request_rows: Optional[int] = None) -> int:
+        """
+        将一次请求中的文档与片段向量追加到索引
+
+        已收录且内容未变的文档跳过；同一文档ID内容变化时登记新版本，旧版本的行在检索时被过滤。
+        行号在数据库写事务内分配，向量按行号写入文件后再提交元数据，多进程并发追加也不会错位
+
+        Args:
+            documents: 本次请求的完整文档，用于历史结果的验证
+            store: 本次请求的片段存储
+            request_rows: 只收录前request_rows行（之后的行是检索时追加的历史片段），缺省为全部
+
+        Returns:
+            新追加的片段数
+        """
+        request_rows = len(store) if request_rows is None else request_rows
+        rows = [row for row in store.embedded_rows() if row < request_rows]
+        if not rows:
+            return 0
+
+        conn = self._connection()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._document_hashes(conn, [doc.document_id for doc in documents])
+                new_documents = {}
+                for doc in documents:
+                    doc_hash = self.document_hash(doc.content)
+                    if existing.get(doc.document_id) != doc_hash:
+                        new_documents[doc.document_id] = (doc, doc_hash)
+
+                new_rows = [row for row in rows if int(store.doc_ids[row]) in new_documents]
+                if not new_rows:
+                    conn.rollback()
+                    return 0
+
+                (start,) = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM segments").fetchone()
+                vectors = store.normalized_embeddings(np.asarray(new_rows))
+                views = store.views(new_rows)
+                fingerprints, valid = simhash_fingerprints([view.content for view in views],
+                                                           self.simhash_shingle_size)
+                # SQLite整数为有符号64位，指纹按位重解释为int64存储
+                fingerprints = [fingerprint if is_valid else None
+                                for fingerprint, is_valid in zip(fingerprints.view(np.int64).tolist(), valid)]
+                with open(self.vectors_path, "ab") as vector_file:
+                    vector_file.truncate(start * self.dimensions * 4)
+                    vector_file.write(vectors.tobytes())
+
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO documents (document_id, doc_hash, content, pages, added_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(doc_id, doc_hash, doc.content, json.dumps(doc.pages, ensure_ascii=False), now)
+                     for doc_id, (doc, doc_hash) in new_documents.items()]
+                )
+                conn.executemany(
+                    "INSERT INTO segments (row, document_id, doc_hash, segment_id, page, chunk_id, "
+                    "content, content_hash, char_start, char_end, simhash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (start + offset, view.document_id, new_documents[view.document_id][1], view.id,
+                         view.page, view.chunk_id, view.content, view.content_hash,
+                         view.char_start, view.char_end, fingerprints[offset])
+                        for offset, view in enumerate(views)
+                    ]
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            if self._graph is not None:
+                self._catch_up()
+
+        logger.info(f"📚 历史语料索引追加 {len(new_documents)} 个文档、{len(new_rows)} 个片段，"
+                    f"共 {start + len(new_rows)} 个片段")
+        return len(new_rows)
+
+    @staticmethod
+    def _document_hashes(conn: sqlite3.Connection, document_ids: List[int]) -> Dict[int, str]:
+        """批量查询文档的当前版本哈希"""
+        found = {}
+        for i in range(0, len(document_ids), _SQLITE_BATCH_SIZE):
+            batch = document_ids[i:i + _SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            found.update(conn.execute(
+                f"SELECT document_id, doc_hash FROM documents WHERE document_id IN ({placeholders})", batch
+            ).fetchall())
+        return found
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索每个查询向量的前k个历史片段
+
+        有faiss时使用HNSW图，否则分块精确扫描内存映射的向量文件；
+        文档旧版本的行在检索过程中即被排除（HNSW以ID过滤器跳过），不会占用前k个名额
+
+        Returns:
+            (相似度, 行号)，形状均为 (查询数, k)，不足k个时行号为-1
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        with self._lock:
+            stale_rows = self._catch_up_stale_rows()
+            if self._graph is not None:
+                self._catch_up()
+                live = self._graph.ntotal - len(stale_rows)
+                if live <= 0:
+                    return self._empty_result(len(queries), k)
+                ef_search = max(self.ef_search, k)
+                if len(stale_rows) == 0:
+                    self._graph.hnsw.efSearch = ef_search
+                    scores, rows = self._graph.search(queries, min(k, live))
+                else:
+                    # 旧版本行仍参与图的遍历，按其占比放大检索队列以保持召回
+                    stale_factor = min(self._graph.ntotal / live, _MAX_STALE_EF_FACTOR)
+                    params = faiss.SearchParametersHNSW(sel=self._stale_selector,
+                                                        efSearch=int(ef_search * stale_factor))
+                    scores, rows = self._graph.search(queries, min(k, live), params=params)
+                return scores, rows.astype(np.int64)
+
+            vectors = self._vector_rows(self.size())
+        if vectors is None:
+            return self._empty_result(len(queries), k)
+
+        scores, rows = self._empty_result(len(queries), k)
+        for start in range(0, vectors.shape[0], _SCAN_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + _SCAN_BLOCK_ROWS])
+            similarities = queries @ block.T
+            block_stale = stale_rows[(stale_rows >= start) & (stale_rows < start + block.shape[0])]
+            similarities[:, block_stale - start] = -np.inf
+            block_k = min(k, block.shape[0])
+            top = np.argpartition(-similarities, block_k - 1, axis=1)[:, :block_k]
+            block_scores = np.take_along_axis(similarities, top, axis=1)
+            scores, rows = merge_topk(scores, rows, block_scores,
+                                      np.where(np.isfinite(block_scores), top + start, -1), k)
+        return scores, rows
+
+    def _catch_up_stale_rows(self) -> np.ndarray:
+        """
+        更新旧版本行的集合并返回（升序行号）
+
+        只有新提交的行所属文档才可能产生新的旧版本行，只需按这些文档查询
+        """
+        count = self.size()
+        if count <= self._stale_checked_rows:
+            return self._stale_rows
+        records = self._connection().execute(
+            "SELECT s.row FROM segments s JOIN documents d "
+            "ON s.document_id = d.document_id AND s.doc_hash != d.doc_hash "
+            "WHERE s.document_id IN (SELECT DISTINCT document_id FROM segments WHERE row >= ? AND row < ?)",
+            (self._stale_checked_rows, count)
+        ).fetchall()
+        self._stale_checked_rows = count
+        if records:
+            self._stale_rows = np.union1d(self._stale_rows, np.asarray([row for (row,) in records], dtype=np.int64))
+            if FAISS_AVAILABLE:
+                # IDSelectorNot不持有内层选择器的引用，两者都需保留
+                self._stale_batch = faiss.IDSelectorBatch(self._stale_rows)
+                self._stale_selector = faiss.IDSelectorNot(self._stale_batch)
+            logger.info(f"📚 历史语料索引中 {len(self._stale_rows)}/{count} 行属于文档旧版本，检索时排除")
+        return self._stale_rows
+
+    def fingerprint_search(self, fingerprints: np.ndarray, max_distance: Optional[int] = None
+                           ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        查找与给定SimHash指纹汉明距离不超过max_distance的历史片段
+
+        指纹索引在首次查找时从元数据库加载，之后只补齐新提交的行；结果可能包含文档旧版本的行，
+        读取片段时由 segments 过滤
+
+        Returns:
+            (查询下标, 行号, 汉明距离)
+        """
+        with self._lock:
+            self._catch_up_fingerprints()
+            return self._fingerprints.query(fingerprints, max_distance)
+
+    def _catch_up_fingerprints(self):
+        """将元数据库中已提交、但尚未加入指纹索引的行追加进索引"""
+        count = self.size()
+        if count <= self._fingerprint_rows:
+            return
+        records = self._connection().execute(
+            "SELECT row, simhash FROM segments WHERE row >= ? AND row < ? AND simhash IS NOT NULL ORDER BY row",
+            (self._fingerprint_rows, count)
+        ).fetchall()
+        if records:
+            rows, fingerprints = zip(*records)
+            self._fingerprints.add(np.asarray(fingerprints, dtype=np.int64).view(np.uint64), np.asarray(rows))
+        self._fingerprint_rows = count
+
+    @staticmethod
+    def _empty_result(count: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return (np.full((count, k), -np.inf, dtype=np.float32),
+                np.full((count, k), -1, dtype=np.int64))
+
+    def segments(self, rows: List[int]) -> Dict[int, Dict]:
+        """按行号读取历史片段元数据，只返回所属文档当前版本的行"""
+        found = {}
+        conn = self._connection()
+        rows = [int(row) for row in dict.fromkeys(rows)]
+        for i in range(0, len(rows), _SQLITE_BATCH_SIZE):
+            batch = rows[i:i + _SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            for record in conn.execute(
+                "SELECT s.row, s.document_id, s.segment_id, s.page, s.chunk_id, s.content, s.content_hash, "
+                "s.char_start, s.char_end FROM segments s JOIN documents d "
+                "ON s.document_id = d.document_id AND s.doc_hash = d.doc_hash "
+                f"WHERE s.row IN ({placeholders})", batch
+            ):
+                row, document_id, segment_id, page, chunk_id, content, content_hash, char_start, char_end = record
+                found[row] = {
+                    "document_id": document_id, "segment_id": segment_id, "page": page,
+                    "chunk_id": chunk_id, "content": content, "content_hash": content_hash,
+                    "char_start": char_start, "char_end": char_end,
+                }
+        return found
+
+    def documents(self, document_ids: List[int]) -> List[DocumentData]:
+        """读取历史文档的完整内容，供验证阶段在原文中定位片段"""
+        documents = []
+        conn = self._connection()
+        document_ids = list(dict.fromkeys(document_ids))
+        for i in range(0, len(document_ids), _SQLITE_BATCH_SIZE):
+            batch = document_ids[i:i + _SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            for document_id, content, pages in conn.execute(
+                f"SELECT document_id, content, pages FROM documents WHERE document_id IN ({placeholders})", batch
+            ):
+                documents.append(DocumentData(
+                    document_id=document_id,
+                    content=content,
+                    pages={int(page): text for page, text in json.loads(pages).items()}
+                ))
+        return documents
+
+    def stats(self) -> Dict[str, int]:
+        """索引规模统计"""
+        (document_count,) = self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()
+        return {"documents": int(document_count), "segments": self.size()}
+
+
+def get_corpus_index(config, model_name: str, dimensions: int = 1024) -> Optional[CorpusIndex]:
+    """根据配置获取进程内共享的历史语料索引实例，未启用时返回None"""
+    if not config.corpus_index_enable:
+        return None
+
+    directory = config.corpus_index_path
+    if not os.path.isabs(directory):
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        directory = os.path.join(project_root, directory)
+
+    with _index_lock:
+        if directory not in _index_instances:
+            try:
+                _index_instances[directory] = CorpusIndex(
+                    directory=directory,
+                    dimensions=dimensions,
+                    model_name=model_name,
+                    hnsw_m=config.ann_hnsw_m,
+                    ef_construction=config.ann_hnsw_ef_construction,
+                    ef_search=config.ann_hnsw_ef_search,
+                    save_every=config.corpus_index_save_every,
+                    simhash_distance=config.simhash_max_distance,
+                    simhash_shingle_size=config.simhash_shingle_size
+                )
+            except Exception as e:
+                logger.warning(f"历史语料索引初始化失败，将不进行历史比对: {e}")
+                return None
+        return _index_instances[directory]
@@ -3,92 +3,99 @@
 负责文档的分割、向量化等预处理工作
 """
 
-import os
 import time
-from typing import List, Tuple, Dict
-from openai import OpenAI
-from langchain_experimental.text_splitter import SemanticChunker
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+import numpy as np
+from typing import List, Tuple, Dict, Optional, Iterator
 from langchain_core.embeddings import Embeddings
 from langchain.schema import Document
 
 from ..models.api_models import DocumentInput
 from ..models.data_models import TextSegment, DocumentData
+from ..models.segment_store import SegmentStore
+from ..embeddings.cache import get_embedding_cache
+from ..embeddings.engine import EmbeddingError
+from ..embeddings.providers import EmbeddingProvider, get_embedding_provider
+from .rule_chunker import RuleBasedChunker
+from .semantic_chunker import SemanticChunker
+from .segment_cache import get_segmentation_cache
+from ..config.config import Config
+from ..utils.text_utils import content_hash, split_with_spans, trim_span
 from ..utils.unified_logger import UnifiedLogger
 
 logger = UnifiedLogger.get_logger(__name__)
 
+# 请求中method字段可用的取值
+CHUNK_METHOD_ALIASES = {
+    "semantic": "semantic",
+    "rule": "rule",
+    "fast": "rule",
+}
+
 
 class CustomEmbeddings(Embeddings):
-    """自定义嵌入类，兼容阿里云DashScope API"""
+    """自定义嵌入类，将配置选定的嵌入提供方适配为LangChain接口"""
     
-    def __init__(self, client: OpenAI, model: str, dimensions: int = 1024):
-        self.client = client
-        self.model = model
-        self.dimensions = dimensions
+    def __init__(self, provider: EmbeddingProvider):
+        self.provider = provider
+        self.model = provider.model_name
+        self.dimensions = provider.dimensions
     
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """嵌入多个文档"""
-        all_embeddings = []
-        batch_size = 10
+    def embed_texts(self, texts: List[str], raise_on_error: bool = False) -> List[Optional[np.ndarray]]:
+        """
+        嵌入多个文本，返回float32向量
         
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            try:
-                response = self.client.embeddings.create(
-                    model=self.model,
-                    input=batch_texts,
-                    dimensions=self.dimensions,
-                    encoding_format="float"
-                )
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
-            except Exception as e:
-                logger.error(f"嵌入生成失败: {e}")
-                # 返回零向量作为回退
-                for _ in batch_texts:
-                    all_embeddings.append([0.0] * self.dimensions)
+        Args:
+            texts: 待嵌入文本
+            raise_on_error: 存在失败文本时是否抛出EmbeddingError，否则失败位置为None
+        """
+        if not texts:
+            return []
         
-        return all_embeddings
+        embeddings = self.provider.embed(texts)
+        
+        failed_count = sum(1 for embedding in embeddings if embedding is None)
+        if failed_count and raise_on_error:
+            raise EmbeddingError(f"嵌入生成失败: {failed_count}/{len(texts)} 条文本未能获取向量")
+        
+        # 不以零向量填充失败位置，零向量会在相似度计算和分块断点中造成虚假结果
+        return embeddings
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """嵌入多个文档，任一文本失败时抛出异常（由分块流程回退处理）"""
+        return [embedding.tolist() for embedding in self.embed_texts(texts, raise_on_error=True)]
     
     def embed_query(self, text: str) -> List[float]:
         """嵌入单个查询"""
-        try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=[text],
-                dimensions=self.dimensions,
-                encoding_format="float"
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logger.error(f"查询嵌入生成失败: {e}")
-            # 返回零向量作为回退
-            return [0.0] * self.dimensions
+        return self.embed_texts([text], raise_on_error=True)[0].tolist()
 
 
 class DocumentProcessor:
     """文档处理器"""
     
     def __init__(self):
-        self.client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-            base_url=os.environ.get("OPENAI_BASE_URL")
-        )
-        # 使用自定义嵌入类，兼容阿里云DashScope API
-        embeddings = CustomEmbeddings(
-            client=self.client,
-            model=os.environ.get("EMBEDDING_MODEL_NAME", "text-embedding-v4"),
-            dimensions=1024
-        )
+        self.config = Config()
+        # 使用自定义嵌入类适配配置选定的嵌入提供方；分块与片段嵌入共享同一提供方和缓存
+        self.embeddings = CustomEmbeddings(get_embedding_provider(self.config, dimensions=1024))
+        self.embedding_cache = get_embedding_cache(self.config)
+        self.segmentation_cache = get_segmentation_cache(self.config)
         self.text_splitter = SemanticChunker(
-            embeddings=embeddings,
+            embeddings=self.embeddings,
             breakpoint_threshold_type="percentile",  # 使用百分位数阈值
             breakpoint_threshold_amount=95,  # 95%百分位数作为阈值
             buffer_size=1,  # 缓冲区大小
             sentence_split_regex=r'(?<=[。！？；])\s*',  # 中文句子分割正则
         )
-        # 从环境变量获取模型名
-        self.embedding_model_name = os.environ.get("EMBEDDING_MODEL_NAME", "text-embedding-v4")
+        self.rule_chunker = RuleBasedChunker(
+            sentence_split_regex=self.text_splitter.sentence_split_regex,
+            max_chunk_chars=self.config.rule_chunk_max_chars,
+            overlap_sentences=self.config.rule_chunk_overlap_sentences
+        )
+        self.embedding_model_name = self.embeddings.model
+        # 片段向量模式：pooled复用分块时的句子向量，exact对片段重新嵌入
+        self.chunk_embedding_mode = self.config.chunk_embedding_mode
     
     def process_json_documents(self, json_data: List[Dict]) -> Tuple[List[DocumentData], List[DocumentInput]]:
         """处理JSON格式的文档数据，返回按doc为单位的数据和原始输入"""
@@ -138,186 +145,600 @@ class DocumentProcessor:
         
         return document_data_list, original_inputs
     
-    def segment_documents(self, document_inputs: List[DocumentInput]) -> List[TextSegment]:
-        """基于语义相似性分割文档，支持跨页面的智能分块"""
-        start_time = time.time()
-        logger.info(f"🔍 开始语义分割文档，输入页面数: {len(document_inputs)}")
+    def resolve_chunk_method(self, method: Optional[str] = None) -> str:
+        """
+        确定分块方式：semantic（语义分块，需要嵌入）或 rule（规则分块，不调用嵌入）
         
-        all_segments = []
+        method为空时使用配置 CHUNK_METHOD，无法识别时回退到配置值
+        """
+        default_method = self.config.chunk_method
+        if not method:
+            return default_method
         
-        # 按文档ID分组
-        docs_by_id = {}
+        method = method.lower()
+        if method in CHUNK_METHOD_ALIASES:
+            return CHUNK_METHOD_ALIASES[method]
+        logger.warning(f"⚠️ 未知的分块方式 {method}，使用默认方式 {default_method}")
+        return default_method
+    
+    @staticmethod
+    def _group_by_document(document_inputs: List[DocumentInput]) -> Dict[int, List[DocumentInput]]:
+        """按文档ID分组页面，保持文档首次出现的顺序"""
+        docs_by_id: Dict[int, List[DocumentInput]] = {}
         for doc_input in document_inputs:
             if doc_input.documentId not in docs_by_id:
                 docs_by_id[doc_input.documentId] = []
             docs_by_id[doc_input.documentId].append(doc_input)
+        return docs_by_id
+    
+    def segment_documents(self, document_inputs: List[DocumentInput], method: Optional[str] = None) -> List[TextSegment]:
+        """
+        分割文档，支持跨页面的智能分块
+        
+        Args:
+            document_inputs: 各页面输入
+            method: 分块方式，semantic（默认）或 rule，为空时使用配置
+        """
+        start_time = time.time()
+        method = self.resolve_chunk_method(method)
+        logger.info(f"🔍 开始分割文档，分块方式: {method}，输入页面数: {len(document_inputs)}")
+        
+        all_segments = []
+        
+        # 按文档ID分组
+        docs_by_id = self._group_by_document(document_inputs)
         
         logger.info(f"📊 分组结果: {len(docs_by_id)} 个不同文档")
         
-        # 对每个文档进行语义分割
-        for doc_idx, (doc_id, doc_pages) in enumerate(docs_by_id.items(), 1):
-            doc_start_time = time.time()
-            logger.info(f"📄 处理文档 {doc_idx}/{len(docs_by_id)}: {doc_id}, 页面数: {len(doc_pages)}")
-            
-            # 按页码排序
-            doc_pages.sort(key=lambda x: x.page)
-            
-            # 合并所有页面内容，记录页面边界
-            combined_content = ""
-            page_boundaries = []  # [(start_pos, end_pos, page_num), ...]
-            current_pos = 0
-            
-            for doc_page in doc_pages:
-                if doc_page.content:
-                    start_pos = current_pos
-                    end_pos = current_pos + len(doc_page.content)
-                    page_boundaries.append((start_pos, end_pos, doc_page.page))
-                    combined_content += doc_page.content + "\n\n"
-                    current_pos = len(combined_content)
-                    logger.info(f"  📑 页面 {doc_page.page}: {len(doc_page.content)} 字符, 位置 {start_pos}-{end_pos}")
-            
-            if not combined_content.strip():
-                logger.warning(f"⚠️ 文档 {doc_id} 内容为空，跳过分割")
-                continue
+        # 各文档并发分割：分块的嵌入请求经由共享引擎与微批合并器并发下发，
+        # 总耗时取决于最大的文档而不是所有文档之和；executor.map保证结果顺序与输入一致
+        total_docs = len(docs_by_id)
+        max_workers = max(1, min(self.config.segmentation_max_workers, total_docs))
+        segment_args = (range(1, total_docs + 1), repeat(total_docs), docs_by_id.keys(), docs_by_id.values(),
+                        repeat(method))
+        if max_workers > 1:
+            logger.info(f"⚙️ 并发分割 {total_docs} 个文档，工作线程数: {max_workers}")
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="segment") as executor:
+                doc_results = list(executor.map(self._segment_document, *segment_args))
+        else:
+            doc_results = list(map(self._segment_document, *segment_args))
+        
+        doc_timings = []
+        for (doc_id, _), (doc_segments, doc_time) in zip(docs_by_id.items(), doc_results):
+            all_segments.extend(doc_segments)
+            doc_timings.append((doc_id, doc_time))
+        
+        total_time = time.time() - start_time
+        if doc_timings:
+            slowest_doc, slowest_time = max(doc_timings, key=lambda item: item[1])
+            serial_time = sum(doc_time for _, doc_time in doc_timings)
+            logger.info(f"⏱️ 各文档分割耗时合计 {serial_time:.2f}秒，最慢文档 {slowest_doc}: {slowest_time:.2f}秒")
+        logger.info(f"🎉 文档分割全部完成，总耗时: {total_time:.2f}秒，共生成 {len(all_segments)} 个文本片段")
+        return all_segments
+    
+    def _segment_document(self, doc_idx: int, total_docs: int, doc_id: int,
+                          doc_pages: List[DocumentInput], method: str = "semantic") -> Tuple[List[TextSegment], float]:
+        """
+        对单个文档进行分割（可在工作线程中并发执行）
+        
+        Returns:
+            (该文档的片段列表, 耗时秒数)
+        """
+        doc_start_time = time.time()
+        logger.info(f"📄 处理文档 {doc_idx}/{total_docs}: {doc_id}, 页面数: {len(doc_pages)}")
+        
+        segments: List[TextSegment] = []
+        
+        # 按页码排序
+        doc_pages = sorted(doc_pages, key=lambda x: x.page)
+        
+        # 合并所有页面内容，记录每页在合并文本中的起始偏移（单调递增，用于二分查找所属页面）
+        content_parts = []
+        page_starts = []
+        page_numbers = []
+        current_pos = 0
+        
+        for doc_page in doc_pages:
+            if doc_page.content:
+                page_starts.append(current_pos)
+                page_numbers.append(doc_page.page)
+                content_parts.append(doc_page.content)
+                content_parts.append("\n\n")
+                logger.info(f"  📑 页面 {doc_page.page}: {len(doc_page.content)} 字符, "
+                            f"位置 {current_pos}-{current_pos + len(doc_page.content)}")
+                current_pos += len(doc_page.content) + 2
+        
+        combined_content = "".join(content_parts)
+        
+        if not combined_content.strip():
+            logger.warning(f"⚠️ 文档 {doc_id} 内容为空，跳过分割")
+            return segments, time.time() - doc_start_time
+        
+        logger.info(f"📝 文档 {doc_id} 合并后总长度: {len(combined_content)} 字符")
+        
+        # 相同内容、相同分块配置的文档直接还原缓存的分割结果
+        cache_key = None
+        if self.segmentation_cache is not None:
+            cache_key = self.segmentation_cache.make_key(
+                combined_content, page_numbers, page_starts, self._chunker_fingerprint(method)
+            )
+            cached_chunks = self.segmentation_cache.get(cache_key, self.embeddings.dimensions)
+            if cached_chunks is not None:
+                # 条目中仍有片段缺少向量时（上次嵌入失败），嵌入阶段补齐后再写回
+                write_back_key = cache_key if any(
+                    embedding is None and combined_content[start:end].strip()
+                    for _, _, start, end, embedding in cached_chunks
+                ) else None
+                for chunk_id, page_num, chunk_start, chunk_end, chunk_embedding in cached_chunks:
+                    segments.append(TextSegment(
+                        id=f"doc_{doc_id}_page_{page_num}_{method}_chunk_{chunk_id}",
+                        content=combined_content[chunk_start:chunk_end],
+                        document_id=doc_id,
+                        page=page_num,
+                        chunk_id=chunk_id,
+                        embedding=chunk_embedding,
+                        char_start=chunk_start,
+                        char_end=chunk_end,
+                        segment_cache_key=write_back_key
+                    ))
+                doc_time = time.time() - doc_start_time
+                logger.info(f"🗂️ 文档 {doc_id} 命中分割缓存，还原 {len(segments)} 个片段，耗时: {doc_time:.3f}秒")
+                return segments, doc_time
+        
+        # 使用语义分块器或规则分块器进行分割
+        chunked = False
+        try:
+            chunk_start_time = time.time()
+            if method == "rule":
+                chunk_spans = [(start, end, None) for start, end in self.rule_chunker.split_spans(combined_content)]
+            else:
+                chunk_spans = self.text_splitter.split_with_spans(
+                    combined_content, pooled=self.chunk_embedding_mode == "pooled"
+                )
+            chunk_time = time.time() - chunk_start_time
             
-            logger.info(f"📝 文档 {doc_id} 合并后总长度: {len(combined_content)} 字符")
+            logger.info(f"🧠 文档 {doc_id} 分割完成（{method}），耗时: {chunk_time:.2f}秒，生成 {len(chunk_spans)} 个片段")
             
-            # 使用语义分块器进行分割
-            try:
-                chunk_start_time = time.time()
-                chunks = self.text_splitter.split_text(combined_content)
-                chunk_time = time.time() - chunk_start_time
+            # 转换为TextSegment对象，片段内容直接取自合并文本中的区间，按起始偏移二分确定所属页面
+            for chunk_id, (chunk_start, chunk_end, chunk_embedding) in enumerate(chunk_spans, 1):
+                chunk_content = combined_content[chunk_start:chunk_end]
+                if not chunk_content:
+                    continue
                 
-                logger.info(f"🧠 文档 {doc_id} 语义分割完成，耗时: {chunk_time:.2f}秒，生成 {len(chunks)} 个片段")
+                page_num = page_numbers[bisect_right(page_starts, chunk_start) - 1]
+                segment_id = f"doc_{doc_id}_page_{page_num}_{method}_chunk_{chunk_id}"
                 
-                # 转换为TextSegment对象，确定每个片段所属的页面
-                for chunk_id, chunk_content in enumerate(chunks, 1):
-                    chunk_content = chunk_content.strip()
-                    if not chunk_content:
-                        continue
-                    
-                    # 找到片段在合并内容中的位置
-                    chunk_start = combined_content.find(chunk_content)
-                    if chunk_start == -1:
-                        # 如果找不到精确匹配，使用第一个页面
-                        page_num = doc_pages[0].page
-                        logger.warning(f"⚠️ 片段 {chunk_id} 位置匹配失败，使用第一页")
-                    else:
-                        # 根据位置确定所属页面（使用片段开始位置所在的页面）
-                        page_num = doc_pages[0].page  # 默认值
-                        for start_pos, end_pos, page in page_boundaries:
-                            if start_pos <= chunk_start < end_pos:
-                                page_num = page
-                                break
-                    
-                    segment_id = f"doc_{doc_id}_page_{page_num}_semantic_chunk_{chunk_id}"
-                    
+                segment = TextSegment(
+                    id=segment_id,
+                    content=chunk_content,
+                    document_id=doc_id,
+                    page=page_num,
+                    chunk_id=chunk_id,
+                    embedding=chunk_embedding,
+                    char_start=chunk_start,
+                    char_end=chunk_end
+                )
+                
+                segments.append(segment)
+                logger.info(f"  ✅ 片段 {chunk_id}: 长度 {len(chunk_content)} 字符, "
+                            f"区间 {chunk_start}-{chunk_end}, 归属页面 {page_num}")
+            
+            chunked = True
+            
+        except Exception as e:
+            logger.error(f"❌ 对文档 {doc_id} 进行分割时出错: {e}")
+            # 回退到简单的按句子分割，丢弃出错前已生成的部分片段
+            segments = []
+            logger.info(f"🔄 文档 {doc_id} 回退到句子分割模式")
+            sentence_spans = split_with_spans(combined_content, '。')
+            for chunk_id, (_, sentence_start, sentence_end) in enumerate(sentence_spans, 1):
+                sentence_start, sentence_end = trim_span(combined_content, sentence_start, sentence_end)
+                if sentence_start < sentence_end:
+                    page_num = page_numbers[bisect_right(page_starts, sentence_start) - 1]
+                    # 区间包含句末的句号（若存在）
+                    span_end = sentence_end + 1 if combined_content.startswith('。', sentence_end) else sentence_end
+                    segment_id = f"doc_{doc_id}_fallback_chunk_{chunk_id}"
                     segment = TextSegment(
                         id=segment_id,
-                        content=chunk_content,
+                        content=combined_content[sentence_start:sentence_end] + '。',
                         document_id=doc_id,
                         page=page_num,
-                        chunk_id=chunk_id
+                        chunk_id=chunk_id,
+                        char_start=sentence_start,
+                        char_end=span_end
                     )
-                    
-                    all_segments.append(segment)
-                    logger.info(f"  ✅ 片段 {chunk_id}: 长度 {len(chunk_content)} 字符, 归属页面 {page_num}")
-                    
+                    segments.append(segment)
+            
+            logger.info(f"📋 文档 {doc_id} 回退分割完成，生成 {len(sentence_spans)} 个句子片段")
+        
+        # 只缓存正常分块的结果，回退分割的结果不写入缓存；
+        # exact/rule模式下片段此时还没有向量，由嵌入阶段（_embed_into_store）生成后写回同一条目
+        if chunked and cache_key is not None:
+            try:
+                self.segmentation_cache.put(cache_key, [
+                    (seg.chunk_id, seg.page, seg.char_start, seg.char_end, seg.embedding) for seg in segments
+                ])
+            except Exception as e:
+                logger.warning(f"写入分割缓存失败: {e}")
+            else:
+                if any(seg.embedding is None and seg.content.strip() for seg in segments):
+                    for seg in segments:
+                        seg.segment_cache_key = cache_key
+        
+        doc_time = time.time() - doc_start_time
+        logger.info(f"✅ 文档 {doc_id} 处理完成，耗时: {doc_time:.2f}秒")
+        return segments, doc_time
+    
+    def iter_document_segments(self, doc_id: int, doc_pages: List[DocumentInput], method: str = "semantic",
+                               window_chars: Optional[int] = None) -> Iterator[TextSegment]:
+        """
+        流式分割单个文档，边分块边产出片段
+        
+        按页累积到window_chars字符后对窗口分块，除最后一个片段外全部产出，最后一个片段
+        （可能在窗口边界被截断）的文本作为上下文带入下一个窗口重新分块，其句向量随之带入，不重复嵌入。
+        窗口只分出一个片段时继续累积，缓冲区长度翻倍后才再次分块（最多累积到4个窗口），
+        避免每追加一页就对整个缓冲区重新分块。
+        不拼接整篇文档，内存占用只与窗口大小相关；片段区间仍是相对整篇文档合并文本的偏移，
+        与segment_documents的约定一致。
+        
+        分割缓存以分页文本增量计算的哈希寻址（与整篇分割的条目互不通用，窗口大小计入指纹）：
+        命中时直接按缓存的区间从各页切出片段；未命中时产出的片段带有条目键，
+        由build_segment_store_streaming在嵌入完成后连同向量写入缓存
+        """
+        window_chars = window_chars or self.config.streaming_window_chars
+        pages = sorted((page for page in doc_pages if page.content), key=lambda x: x.page)
+        
+        page_starts: List[int] = []
+        page_numbers: List[int] = []
+        current_pos = 0
+        for doc_page in pages:
+            page_starts.append(current_pos)
+            page_numbers.append(doc_page.page)
+            current_pos += len(doc_page.content) + 2
+        
+        cache_key = None
+        if self.segmentation_cache is not None and pages:
+            cache_key = self.segmentation_cache.make_key_from_parts(
+                (part for doc_page in pages for part in (doc_page.content, "\n\n")), page_numbers, page_starts,
+                f"stream:{window_chars}:{self._chunker_fingerprint(method)}"
+            )
+            cached_chunks = self.segmentation_cache.get(cache_key, self.embeddings.dimensions)
+            if cached_chunks is not None:
+                logger.info(f"🗂️ 文档 {doc_id} 命中流式分割缓存，还原 {len(cached_chunks)} 个片段")
+                write_back_key = cache_key if any(chunk[4] is None for chunk in cached_chunks) else None
+                for chunk_id, page_num, chunk_start, chunk_end, chunk_embedding in cached_chunks:
+                    yield TextSegment(
+                        id=f"doc_{doc_id}_page_{page_num}_{method}_chunk_{chunk_id}",
+                        content=self._slice_pages(pages, page_starts, chunk_start, chunk_end),
+                        document_id=doc_id,
+                        page=page_num,
+                        chunk_id=chunk_id,
+                        embedding=chunk_embedding,
+                        char_start=chunk_start,
+                        char_end=chunk_end,
+                        segment_cache_key=write_back_key
+                    )
+                return
+        
+        buffer_parts: List[str] = []
+        buffer_len = 0
+        buffer_offset = 0  # 缓冲区首字符在文档合并文本中的偏移
+        next_chunk_len = window_chars  # 缓冲区达到该长度时才分块
+        known_vectors: Dict[str, np.ndarray] = {}  # 缓冲区中已嵌入句子的句向量
+        chunk_id = 0
+        
+        for page_idx, doc_page in enumerate(pages):
+            buffer_parts.extend((doc_page.content, "\n\n"))
+            buffer_len += len(doc_page.content) + 2
+            
+            is_last_page = page_idx == len(pages) - 1
+            if buffer_len < next_chunk_len and not is_last_page:
+                continue
+            
+            buffer = "".join(buffer_parts)
+            chunk_spans, sentence_spans, sentence_vectors, semantic_ok = self._chunk_window(
+                doc_id, buffer, method, known_vectors
+            )
+            if not semantic_ok:
+                # 回退分块的结果不写入缓存
+                cache_key = None
+            
+            if is_last_page:
+                emit_spans, carry_from = chunk_spans, len(buffer)
+            elif len(chunk_spans) > 1:
+                emit_spans, carry_from = chunk_spans[:-1], chunk_spans[-1][0]
+            elif buffer_len < window_chars * 4:
+                # 窗口内只有一个片段，继续累积页面，缓冲区翻倍后再分块，已嵌入的句向量留待复用
+                next_chunk_len = buffer_len * 2
+                known_vectors = self._carry_vectors(buffer, sentence_spans, sentence_vectors, 0)
+                continue
+            else:
+                emit_spans, carry_from = chunk_spans, len(buffer)
+            
+            for chunk_start, chunk_end, chunk_embedding in emit_spans:
+                chunk_id += 1
+                doc_start = buffer_offset + chunk_start
+                page_num = page_numbers[bisect_right(page_starts, doc_start) - 1]
+                yield TextSegment(
+                    id=f"doc_{doc_id}_page_{page_num}_{method}_chunk_{chunk_id}",
+                    content=buffer[chunk_start:chunk_end],
+                    document_id=doc_id,
+                    page=page_num,
+                    chunk_id=chunk_id,
+                    embedding=chunk_embedding,
+                    char_start=doc_start,
+                    char_end=buffer_offset + chunk_end,
+                    segment_cache_key=cache_key
+                )
+            
+            carry = buffer[carry_from:]
+            known_vectors = self._carry_vectors(buffer, sentence_spans, sentence_vectors, carry_from)
+            buffer_parts = [carry] if carry else []
+            buffer_len = len(carry)
+            buffer_offset += carry_from
+            next_chunk_len = window_chars
+    
+    @staticmethod
+    def _carry_vectors(buffer: str, sentence_spans: List[Tuple[int, int]], sentence_vectors: Optional[np.ndarray],
+                       carry_from: int) -> Dict[str, np.ndarray]:
+        """带入下一个窗口的句向量：起始于carry_from之后的句子文本 -> 句向量"""
+        if sentence_vectors is None:
+            return {}
+        return {buffer[start:end]: vector for (start, end), vector in zip(sentence_spans, sentence_vectors)
+                if start >= carry_from}
+    
+    @staticmethod
+    def _slice_pages(pages: List[DocumentInput], page_starts: List[int], start: int, end: int) -> str:
+        """从分页文本中取出合并文本 [start, end) 区间的内容（页间以两个换行分隔），不拼接整篇文档"""
+        parts = []
+        page_idx = bisect_right(page_starts, start) - 1
+        while page_idx < len(pages) and page_starts[page_idx] < end:
+            content = pages[page_idx].content
+            lo, hi = max(start - page_starts[page_idx], 0), end - page_starts[page_idx]
+            if lo < len(content):
+                parts.append(content[lo:hi])
+            if hi > len(content):
+                parts.append("\n\n"[max(lo - len(content), 0):hi - len(content)])
+            page_idx += 1
+        return "".join(parts)
+    
+    def _chunk_window(self, doc_id: int, text: str, method: str, known_vectors: Dict[str, np.ndarray]):
+        """
+        对流式分割的一个窗口分块，语义分块失败时该窗口回退到规则分块
+        
+        Returns:
+            (片段区间列表, 句子区间列表, 句向量矩阵或None, 是否按指定方式正常分块)
+        """
+        if method != "rule":
+            try:
+                chunk_spans, sentence_spans, sentence_vectors = self.text_splitter.split_with_sentences(
+                    text, pooled=self.chunk_embedding_mode == "pooled", known_vectors=known_vectors
+                )
+                return chunk_spans, sentence_spans, sentence_vectors, True
             except Exception as e:
-                logger.error(f"❌ 对文档 {doc_id} 进行语义分割时出错: {e}")
-                # 回退到简单的按句子分割
-                logger.info(f"🔄 文档 {doc_id} 回退到句子分割模式")
-                sentences = combined_content.split('。')
-                for chunk_id, sentence in enumerate(sentences, 1):
-                    sentence = sentence.strip()
-                    if sentence:
-                        segment_id = f"doc_{doc_id}_fallback_chunk_{chunk_id}"
-                        segment = TextSegment(
-                            id=segment_id,
-                            content=sentence + '。',
-                            document_id=doc_id,
-                            page=doc_pages[0].page,
-                            chunk_id=chunk_id
-                        )
-                        all_segments.append(segment)
+                logger.error(f"❌ 文档 {doc_id} 窗口语义分割出错，该窗口回退到规则分块: {e}")
+                chunk_spans = [(start, end, None) for start, end in self.rule_chunker.split_spans(text)]
+                return chunk_spans, [], None, False
+        return [(start, end, None) for start, end in self.rule_chunker.split_spans(text)], [], None, True
+    
+    def build_segment_store_streaming(self, document_inputs: List[DocumentInput],
+                                      method: Optional[str] = None) -> SegmentStore:
+        """
+        流式分割并嵌入，直接构建列式片段存储
+        
+        片段一经产出即写入存储，凑满一批后交给后台线程嵌入，同时继续分割后续页面；
+        适合超大文档：不持有整篇文档的合并文本和完整片段列表，首批嵌入无需等待分割全部完成。
+        片段写入时即计算内容哈希，与此前片段完全相同的文本不再送去嵌入，最后直接复制首个相同片段的向量；
+        哈希只在启用精确匹配时记入存储，否则后续阶段会把完全相同的跨文档片段对当作已由精确匹配输出而跳过；
+        未命中分割缓存的文档在嵌入完成后连同向量写入缓存
+        """
+        start_time = time.time()
+        method = self.resolve_chunk_method(method)
+        batch_size = self.config.streaming_embed_batch_size
+        docs_by_id = self._group_by_document(document_inputs)
+        logger.info(f"🌊 开始流式分割与嵌入，分块方式: {method}，文档数: {len(docs_by_id)}，"
+                    f"窗口 {self.config.streaming_window_chars} 字符，嵌入批次 {batch_size}")
+        
+        store = SegmentStore(dimensions=self.embeddings.dimensions)
+        pending_rows: List[int] = []
+        pending_texts: List[str] = []
+        in_flight = None
+        first_embedding_time = None
+        failed_count = 0
+        first_rows: Dict[str, int] = {}  # 内容哈希 -> 首个该内容片段的行号
+        duplicate_rows: List[Tuple[int, int]] = []  # (行号, 首个相同内容片段的行号)
+        cache_rows: Dict[str, List[int]] = {}  # 待写入分割缓存的条目键 -> 该文档的全部行号
+        keep_hashes = self.config.exact_duplicate_enable
+        
+        def collect(job) -> int:
+            """等待一批嵌入完成并写入存储（只在当前线程写存储，避免与扩容并发）"""
+            rows, future = job
+            vectors = future.result()
+            store.set_embeddings(rows, vectors)
+            return sum(1 for vector in vectors if vector is None)
+        
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-embed") as executor:
+            for doc_id, doc_pages in docs_by_id.items():
+                doc_rows: List[int] = []
+                doc_keys = set()
+                for segment in self.iter_document_segments(doc_id, doc_pages, method):
+                    digest = content_hash(segment.content)
+                    if keep_hashes:
+                        segment.content_hash = digest
+                    row = store.append_segment(segment)
+                    doc_rows.append(row)
+                    doc_keys.add(segment.segment_cache_key)
+                    if segment.embedding is not None:
+                        first_rows.setdefault(digest, row)
+                        continue
+                    if digest in first_rows:
+                        duplicate_rows.append((row, first_rows[digest]))
+                        continue
+                    first_rows[digest] = row
+                    pending_rows.append(row)
+                    pending_texts.append(segment.content)
+                    
+                    if len(pending_texts) >= batch_size:
+                        if in_flight is not None:
+                            failed_count += collect(in_flight)
+                        elif first_embedding_time is None:
+                            first_embedding_time = time.time() - start_time
+                        in_flight = (pending_rows, executor.submit(self.embeddings.embed_texts, pending_texts))
+                        pending_rows, pending_texts = [], []
                 
-                logger.info(f"📋 文档 {doc_id} 回退分割完成，生成 {len(sentences)} 个句子片段")
+                # 文档的全部片段都带有同一条目键（未回退分块）时才写入缓存
+                if len(doc_keys) == 1 and None not in doc_keys:
+                    cache_rows[doc_keys.pop()] = doc_rows
             
-            doc_time = time.time() - doc_start_time
-            logger.info(f"✅ 文档 {doc_id} 处理完成，耗时: {doc_time:.2f}秒")
+            if in_flight is not None:
+                failed_count += collect(in_flight)
+            if pending_texts:
+                if first_embedding_time is None:
+                    first_embedding_time = time.time() - start_time
+                failed_count += collect((pending_rows, executor.submit(self.embeddings.embed_texts, pending_texts)))
+        
+        if duplicate_rows:
+            store.set_embeddings([row for row, _ in duplicate_rows],
+                                 [store[source].embedding for _, source in duplicate_rows])
+            failed_count += sum(1 for _, source in duplicate_rows if not store.has_embedding[source])
+            logger.info(f"🔁 {len(duplicate_rows)} 个片段与此前片段内容完全相同，复用其向量")
+        self._write_back_streaming_cache(store, cache_rows)
         
         total_time = time.time() - start_time
-        logger.info(f"🎉 语义分割全部完成，总耗时: {total_time:.2f}秒，共生成 {len(all_segments)} 个文本片段")
-        return all_segments
+        if failed_count:
+            logger.warning(f"⚠️ {failed_count} 个片段嵌入失败，已标记为无向量并在相似度计算中跳过")
+        first_embedding = f"{first_embedding_time:.2f}秒" if first_embedding_time is not None else "无需嵌入"
+        logger.info(f"🌊 流式分割与嵌入完成，总耗时: {total_time:.2f}秒，共 {len(store)} 个片段，"
+                    f"首批嵌入开始于 {first_embedding}")
+        return store
+    
+    def _write_back_streaming_cache(self, store: SegmentStore, cache_rows: Dict[str, List[int]]):
+        """将流式分割的结果连同向量写入分割缓存"""
+        if self.segmentation_cache is None:
+            return
+        for key, rows in cache_rows.items():
+            try:
+                self.segmentation_cache.put(key, [
+                    (int(store.chunk_ids[row]), int(store.pages[row]), int(store.char_starts[row]),
+                     int(store.char_ends[row]), store[row].embedding)
+                    for row in rows
+                ])
+            except Exception as e:
+                logger.warning(f"写入分割缓存失败: {e}")
+    
+    def _chunker_fingerprint(self, method: str) -> str:
+        """分块配置指纹，任一影响分割结果的参数变化都会得到不同的指纹"""
+        if method == "rule":
+            return (f"rule:{self.rule_chunker.sentence_split_regex}:"
+                    f"{self.rule_chunker.max_chunk_chars}:{self.rule_chunker.overlap_sentences}")
+        splitter = self.text_splitter
+        return (f"semantic:{self.embedding_model_name}:{self.embeddings.dimensions}:"
+                f"{splitter.sentence_split_regex}:{splitter.breakpoint_threshold_type}:"
+                f"{splitter.breakpoint_threshold_amount}:{splitter.buffer_size}:{self.chunk_embedding_mode}")
     
     def generate_embeddings(self, segments: List[TextSegment]) -> List[TextSegment]:
-        """生成文本嵌入"""
+        """生成文本嵌入（列表接口），片段的embedding指向列式存储矩阵中的行，嵌入失败的片段为None"""
+        store, source_indices = self._embed_into_store(segments)
+        for row, seg_idx in enumerate(source_indices):
+            segments[seg_idx].embedding = store[row].embedding
+        return segments
+    
+    def build_segment_store(self, segments: List[TextSegment]) -> SegmentStore:
+        """生成嵌入并构建列式片段存储，后续阶段通过行号访问片段"""
+        store, _ = self._embed_into_store(segments)
+        return store
+    
+    def _embed_into_store(self, segments: List[TextSegment]) -> Tuple[SegmentStore, List[int]]:
+        """
+        将有效片段写入列式存储并生成嵌入，向量直接写入连续的float32矩阵
+        
+        已持有向量的片段（pooled模式的池化向量，或从分割缓存还原的向量）不再重新嵌入；
+        新生成的向量写回分割缓存中尚缺向量的条目。个别片段嵌入失败时该行不持有向量，
+        后续相似度计算自动跳过，只有全部片段都失败时才抛出EmbeddingError
+        
+        Returns:
+            (片段存储, 每一行对应的输入片段下标)
+        """
         start_time = time.time()
         logger.info(f"🧠 开始生成嵌入向量，输入片段数: {len(segments)}")
         
-        valid_segments = []
+        store = SegmentStore(dimensions=self.embeddings.dimensions, capacity=len(segments))
+        source_indices = []
+        pending_rows = []
         contents = []
+        reused_count = 0
         
         # 验证和准备内容
         for seg_idx, seg in enumerate(segments):
-            if seg.content and isinstance(seg.content, str) and seg.content.strip():
-                valid_segments.append(seg)
-                contents.append(str(seg.content).strip())
-            else:
+            if not (seg.content and isinstance(seg.content, str) and seg.content.strip()):
                 logger.warning(f"⚠️ 跳过无效片段 {seg_idx}: 内容为空或格式错误")
+                continue
+            
+            # 分割缓存按分块配置（含片段向量模式）寻址，exact模式下片段只会持有此前写回的片段文本嵌入
+            reuse = seg.embedding is not None
+            row = store.append(
+                segment_id=seg.id,
+                content=seg.content,
+                document_id=seg.document_id,
+                page=seg.page,
+                chunk_id=seg.chunk_id,
+                embedding=seg.embedding if reuse else None,
+                content_hash=seg.content_hash,
+                char_start=seg.char_start,
+                char_end=seg.char_end
+            )
+            source_indices.append(seg_idx)
+            if reuse:
+                reused_count += 1
+            else:
+                pending_rows.append(row)
+                contents.append(str(seg.content).strip())
+        
+        if reused_count:
+            logger.info(f"♻️ 复用已有向量（池化或分割缓存）的片段: {reused_count}/{len(segments)}")
         
         if not contents:
-            logger.error("❌ 没有有效的文本内容用于生成嵌入")
-            return segments
+            if reused_count:
+                logger.info("✅ 所有片段均已复用池化向量，无需额外嵌入")
+            else:
+                logger.error("❌ 没有有效的文本内容用于生成嵌入")
+            return store, source_indices
         
-        logger.info(f"📋 有效片段统计: {len(valid_segments)}/{len(segments)}, 模型: {self.embedding_model_name}")
+        logger.info(f"📋 待嵌入片段统计: {len(contents)}/{len(segments)}, 模型: {self.embedding_model_name}")
         
         try:
-            batch_size = 10
-            all_embeddings = []
-            total_batches = (len(contents) + batch_size - 1) // batch_size
+            content_lengths = [len(content) for content in contents]
+            logger.info(f"  📊 内容统计: 平均长度 {sum(content_lengths) / len(content_lengths):.0f} 字符, 范围 {min(content_lengths)}-{max(content_lengths)}")
             
-            for i in range(0, len(contents), batch_size):
-                batch_start_time = time.time()
-                batch_idx = i // batch_size + 1
-                
-                batch_contents = contents[i:i + batch_size]
-                logger.info(f"🔄 处理批次 {batch_idx}/{total_batches}, 片段数: {len(batch_contents)}")
-                
-                # 记录批次内容统计
-                batch_lengths = [len(content) for content in batch_contents]
-                avg_length = sum(batch_lengths) / len(batch_lengths)
-                logger.info(f"  📊 批次统计: 平均长度 {avg_length:.0f} 字符, 范围 {min(batch_lengths)}-{max(batch_lengths)}")
-                
-                response = self.client.embeddings.create(
-                    model=self.embedding_model_name,
-                    input=batch_contents,
-                    dimensions=1024,
-                    encoding_format="float"
-                )
-                
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
-                
-                batch_time = time.time() - batch_start_time
-                logger.info(f"  ✅ 批次 {batch_idx} 完成，耗时: {batch_time:.2f}秒, 向量维度: {len(batch_embeddings[0])}")
+            all_embeddings = self.embeddings.embed_texts(contents)
             
-            # 将嵌入向量分配给片段
+            failed_count = sum(1 for embedding in all_embeddings if embedding is None)
+            if failed_count == len(contents) and not reused_count:
+                raise EmbeddingError(f"所有 {len(contents)} 个片段嵌入均失败")
+            if failed_count:
+                logger.warning(f"⚠️ {failed_count}/{len(contents)} 个片段嵌入失败，已标记为无向量并在相似度计算中跳过")
+            
+            # 将嵌入向量写入存储矩阵，失败的行保持无向量状态
             embedding_assign_time = time.time()
-            for segment, embedding in zip(valid_segments, all_embeddings):
-                segment.embedding = embedding
+            store.set_embeddings(pending_rows, all_embeddings)
             assign_time = time.time() - embedding_assign_time
+            self._write_back_segment_cache(segments, source_indices, store)
                 
             total_time = time.time() - start_time
-            avg_time_per_segment = total_time / len(valid_segments)
+            avg_time_per_segment = total_time / len(contents)
             
             logger.info(f"🎉 嵌入向量生成完成！")
             logger.info(f"  📊 统计信息:")
-            logger.info(f"    - 总片段数: {len(valid_segments)}")
+            logger.info(f"    - 嵌入片段数: {len(contents)} (失败 {failed_count})")
             logger.info(f"    - 总耗时: {total_time:.2f}秒")
             logger.info(f"    - 平均每片段: {avg_time_per_segment:.3f}秒")
-            logger.info(f"    - 向量分配耗时: {assign_time:.3f}秒")
-            logger.info(f"    - 处理速度: {len(valid_segments)/total_time:.1f} 片段/秒")
+            logger.info(f"    - 向量写入耗时: {assign_time:.3f}秒")
+            logger.info(f"    - 处理速度: {len(contents)/total_time:.1f} 片段/秒")
+            logger.info(f"    - 向量矩阵: {store.embeddings.shape}, {store.embeddings.nbytes / 1024 / 1024:.1f}MB")
+            if self.embedding_cache is not None and self.embeddings.provider.cache is not None:
+                cache_stats = self.embedding_cache.stats()
+                logger.info(f"    - 嵌入缓存: 命中 {cache_stats['hits']}, 未命中 {cache_stats['misses']}, "
+                            f"命中率 {cache_stats['hit_rate']:.1%}, 条目 {cache_stats['entries']}")
             
         except Exception as e:
             error_time = time.time() - start_time
@@ -325,4 +746,30 @@ class DocumentProcessor:
             logger.error(f"错误详情: {e}")
             raise e
         
-        return segments
+        return store, source_indices
+    
+    def _write_back_segment_cache(self, segments: List[TextSegment], source_indices: List[int],
+                                  store: SegmentStore):
+        """将嵌入阶段生成的向量写回分割缓存中尚缺向量的条目，下次命中时无需再嵌入"""
+        if self.segmentation_cache is None:
+            return
+        
+        rows_by_index = {seg_idx: row for row, seg_idx in enumerate(source_indices)}
+        entries: Dict[str, List] = {}
+        for seg_idx, seg in enumerate(segments):
+            if seg.segment_cache_key is None:
+                continue
+            row = rows_by_index.get(seg_idx)
+            embedding = store[row].embedding if row is not None else None
+            entries.setdefault(seg.segment_cache_key, []).append(
+                (seg.chunk_id, seg.page, seg.char_start, seg.char_end, embedding)
+            )
+            seg.segment_cache_key = None
+        
+        for key, chunks in entries.items():
+            try:
+                self.segmentation_cache.put(key, chunks)
+            except Exception as e:
+                logger.warning(f"写回分割缓存向量失败: {e}")
+        if entries:
+            logger.info(f"🗂️ 已将片段向量写回 {len(entries)} 个分割缓存条目")
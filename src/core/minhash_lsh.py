@@ -0,0 +1,173 @@
+"""
+MinHash局部敏感哈希
+对片段的字符n-gram集合计算MinHash签名，按带(band)分桶召回估计Jaccard相似度较高的片段对；
+只依赖numpy，不调用嵌入或大模型，总体耗时与片段数近似线性，适合发现少量字符改动的近似逐字复制
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.text_utils import char_shingle_hashes
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+
+def _area(values: np.ndarray, step: float) -> float:
+    """等间距采样点上的梯形积分"""
+    if len(values) < 2:
+        return 0.0
+    return float((values.sum() - (values[0] + values[-1]) / 2) * step)
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    选择带数b与每带行数r（b*r不超过num_perm），使给定Jaccard阈值两侧的误召回与漏召回面积之和最小
+
+    两个片段在至少一个带中落入同一桶的概率为 1-(1-s^r)^b
+    """
+    grid = np.linspace(0.0, 1.0, 201)
+    step = grid[1] - grid[0]
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        probability = 1.0 - (1.0 - grid ** rows) ** bands
+        below, above = grid <= threshold, grid >= threshold
+        false_positive = _area(probability[below], step)
+        false_negative = _area(1.0 - probability[above], step)
+        if false_positive + false_negative < best_error:
+            best, best_error = (bands, rows), false_positive + false_negative
+    return best
+
+
+class MinHashLSH:
+    """字符n-gram MinHash签名与带状LSH候选召回"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, threshold: float = 0.5,
+                 max_bucket_size: int = 200, min_shingles: int = 1, seed: int = 1):
+        """
+        初始化
+
+        Args:
+            num_perm: 签名长度（哈希函数个数），越长Jaccard估计越准
+            shingle_size: 字符n-gram长度（去除空白后），中文文本取3较合适
+            threshold: 召回的估计Jaccard阈值，同时决定分带参数
+            max_bucket_size: 单个桶的片段数上限，超出的桶多为模板化套话，不展开配对
+            min_shingles: 参与召回的最少n-gram数，更短的片段（标题、“联系人：”之类的套话）不计算签名，
+                          避免极少几个n-gram即可得到很高的估计Jaccard
+            seed: 哈希函数随机种子，签名只在相同种子下可比
+        """
+        self.num_perm = num_perm
+        self.shingle_size = max(1, shingle_size)
+        self.threshold = threshold
+        self.max_bucket_size = max_bucket_size
+        self.min_shingles = max(1, min_shingles)
+        self.bands, self.rows_per_band = optimal_bands(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        # 乘移位哈希族 h(x) = (a*x + b) >> 32，a为奇数，结果为32位
+        self._hash_a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._hash_b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._band_multipliers = rng.integers(1, 2 ** 63, size=self.rows_per_band, dtype=np.uint64) | np.uint64(1)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """去除空白后的字符n-gram，以32位哈希值的去重数组表示"""
+        return np.unique(char_shingle_hashes(text, self.shingle_size) >> np.uint64(32))
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """单个文本的MinHash签名，n-gram数少于min_shingles（含空文本）时返回None"""
+        shingles = self.shingles(text)
+        if len(shingles) < self.min_shingles:
+            return None
+        hashed = (self._hash_a[:, None] * shingles[None, :] + self._hash_b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量计算签名
+
+        Returns:
+            (签名矩阵 (n, num_perm) uint32, 是否有有效签名的布尔数组)
+        """
+        matrix = np.zeros((len(texts), self.num_perm), dtype=np.uint32)
+        valid = np.zeros(len(texts), dtype=bool)
+        for idx, text in enumerate(texts):
+            signature = self.signature(text)
+            if signature is not None:
+                matrix[idx] = signature
+                valid[idx] = True
+        return matrix, valid
+
+    @staticmethod
+    def estimate_jaccard(signatures: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        """由签名中相等位置的比例估计 (left[k], right[k]) 的Jaccard相似度"""
+        if len(left) == 0:
+            return np.empty(0, dtype=np.float32)
+        return (signatures[left] == signatures[right]).mean(axis=1).astype(np.float32)
+
+    def candidate_pairs(self, signatures: np.ndarray, valid: np.ndarray,
+                        groups: Optional[np.ndarray] = None,
+                        dup_keys: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        带状分桶召回候选对，并按估计Jaccard过滤
+
+        Args:
+            signatures: 签名矩阵
+            valid: 有效签名标记
+            groups: 每行所属文档ID，同一文档的片段对不召回
+            dup_keys: 规范化文本哈希的整数编码（-1为无），完全相同的片段对不召回
+
+        Returns:
+            (左行号, 右行号, 估计Jaccard)，left < right，按 (left, right) 升序
+        """
+        count = signatures.shape[0]
+        rows = np.flatnonzero(valid)
+        pair_keys = []
+        skipped_buckets = 0
+
+        for band in range(self.bands):
+            columns = slice(band * self.rows_per_band, (band + 1) * self.rows_per_band)
+            band_keys = (signatures[rows, columns].astype(np.uint64) * self._band_multipliers).sum(axis=1)
+            order = np.argsort(band_keys, kind="stable")
+            sorted_keys = band_keys[order]
+            boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+            starts = np.concatenate(([0], boundaries))
+            sizes = np.diff(np.concatenate((starts, [len(sorted_keys)])))
+
+            for start, size in zip(starts[sizes >= 2], sizes[sizes >= 2]):
+                if size > self.max_bucket_size:
+                    skipped_buckets += 1
+                    continue
+                members = np.sort(rows[order[start:start + size]])
+                left, right = np.triu_indices(size, k=1)
+                pair_keys.append(members[left] * count + members[right])
+
+        if not pair_keys:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float32)
+
+        if skipped_buckets:
+            logger.debug(f"MinHash分桶: {skipped_buckets} 个桶超过 {self.max_bucket_size} 个片段，未展开配对")
+        unique_keys = np.unique(np.concatenate(pair_keys))
+        left, right = unique_keys // count, unique_keys % count
+        keep = np.ones(len(left), dtype=bool)
+        if groups is not None:
+            keep &= groups[left] != groups[right]
+        if dup_keys is not None:
+            keep &= ~((dup_keys[left] == dup_keys[right]) & (dup_keys[left] >= 0))
+        left, right = left[keep], right[keep]
+
+        jaccard = self.estimate_jaccard(signatures, left, right)
+        keep = jaccard >= self.threshold
+        return left[keep], right[keep], jaccard[keep]
+
+    def parameters(self) -> Dict[str, float]:
+        """签名与分带参数"""
+        return {
+            "num_perm": self.num_perm,
+            "shingle_size": self.shingle_size,
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows_per_band": self.rows_per_band,
+        }
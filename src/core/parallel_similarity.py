@@ -0,0 +1,255 @@
+"""
+多进程相似度计算
+将粗排向量矩阵、文档ID与重复文本编码放入一块共享内存（multiprocessing.shared_memory），
+常驻进程池中的每个进程按行块映射同一块内存计算分块top-k或相似对，不为每个进程复制矩阵：
+top-k结果由各进程直接写回共享内存中的输出区，相似对按行块返回后拼接。
+进程池在首次使用时以spawn方式启动并在进程生命周期内复用，每个子进程的BLAS限制为单线程，避免线程过度订阅
+"""
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .similarity_kernels import blockwise_pairs, blockwise_topk
+from ..embeddings.quantization import QuantizedMatrix
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# 动态导入threadpoolctl，用于限制子进程的BLAS线程数
+try:
+    from threadpoolctl import threadpool_limits
+    THREADPOOLCTL_AVAILABLE = True
+except ImportError:
+    THREADPOOLCTL_AVAILABLE = False
+
+# 每个进程分到的任务数，行块越多负载越均衡
+_TASKS_PER_PROCESS = 4
+
+# 子进程中生效的BLAS线程限制
+_thread_limits = None
+
+# 进程内共享的进程池实例
+_pool_instance: Optional["SimilarityPool"] = None
+_pool_lock = threading.Lock()
+
+# 共享内存布局: (共享内存名, {数组名: (dtype, 形状, 字节偏移)})
+SharedSpec = Tuple[str, Dict[str, Tuple[str, Tuple[int, ...], int]]]
+
+
+class SharedArrays:
+    """将多个numpy数组打包进同一块共享内存，子进程按布局映射为视图"""
+
+    def __init__(self, arrays: Dict[str, Optional[np.ndarray]]):
+        layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            if array is None:
+                continue
+            offset = (offset + 63) // 64 * 64
+            layout[name] = (array.dtype.str, tuple(array.shape), offset)
+            offset += array.nbytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.spec: SharedSpec = (self.shm.name, layout)
+        self.arrays = _views(self.shm, layout)
+        for name, view in self.arrays.items():
+            view[...] = arrays[name]
+
+    def close(self):
+        """释放视图并删除共享内存"""
+        self.arrays.clear()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _views(shm: shared_memory.SharedMemory, layout) -> Dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+        for name, (dtype, shape, offset) in layout.items()
+    }
+
+
+def _init_worker():
+    """子进程初始化：每个进程只用一个BLAS线程，并行度由进程数决定"""
+    if THREADPOOLCTL_AVAILABLE:
+        global _thread_limits
+        _thread_limits = threadpool_limits(limits=1)
+
+
+def _attach(spec: SharedSpec, mode: str) -> Tuple[shared_memory.SharedMemory, Dict[str, np.ndarray], QuantizedMatrix]:
+    name, layout = spec
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = _views(shm, layout)
+    return shm, arrays, QuantizedMatrix(arrays["codes"], arrays.get("scales"), mode)
+
+
+def _topk_task(spec: SharedSpec, mode: str, k: int, threshold: float, block_rows: int,
+               row_start: int, row_stop: int) -> int:
+    """子进程：计算 [row_start, row_stop) 行的top-k并写入共享内存的输出区"""
+    shm, arrays, coarse = _attach(spec, mode)
+    try:
+        scores, indices = blockwise_topk(coarse, arrays["doc_ids"], arrays["dup_keys"], k, threshold,
+                                         block_rows=block_rows, row_start=row_start, row_stop=row_stop)
+        arrays["scores"][row_start:row_stop] = scores
+        arrays["indices"][row_start:row_stop] = indices
+        return row_stop - row_start
+    finally:
+        # 视图引用着共享内存缓冲区，须先释放才能关闭
+        del coarse
+        arrays.clear()
+        shm.close()
+
+
+def _pairs_task(spec: SharedSpec, mode: str, threshold: float, block_rows: int,
+                row_start: int, row_stop: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """子进程：计算 [row_start, row_stop) 行的上三角相似对"""
+    shm, arrays, coarse = _attach(spec, mode)
+    try:
+        return blockwise_pairs(coarse, arrays["doc_ids"], arrays["dup_keys"], threshold,
+                               block_rows=block_rows, row_start=row_start, row_stop=row_stop)
+    finally:
+        del coarse
+        arrays.clear()
+        shm.close()
+
+
+def row_ranges(n: int, parts: int, triangular: bool = False, align: int = 1) -> List[Tuple[int, int]]:
+    """
+    将 [0, n) 行切分为至多parts段
+
+    triangular为True时按上三角的计算量均分（前面的行列数更多，分段更短）；
+    分段边界取align的整数倍，按行块切分时每段包含的行块与整体分块计算时相同
+    """
+    parts = max(1, min(parts, n))
+    align = max(1, align)
+    fractions = np.linspace(0.0, 1.0, parts + 1)
+    if triangular:
+        bounds = n * (1.0 - np.sqrt(1.0 - fractions))
+    else:
+        bounds = n * fractions
+    bounds = np.minimum(np.round(bounds / align).astype(np.int64) * align, n)
+    bounds[-1] = n
+    bounds = np.unique(bounds)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+class SimilarityPool:
+    """常驻进程池上的共享内存分块相似度计算"""
+
+    def __init__(self, processes: int, min_segments: int = 5000):
+        """
+        初始化（进程在首次计算时启动）
+
+        Args:
+            processes: 进程数
+            min_segments: 片段数达到该值时才使用多进程，以下在当前线程计算
+        """
+        self.processes = max(1, processes)
+        self.min_segments = min_segments
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def should_use(self, rows: int) -> bool:
+        return rows >= self.min_segments
+
+    def block_rows(self, rows: int, block_rows: int) -> int:
+        """任务按整块切分：行块不超过内存预算给出的行数，且足够小使每个进程都能分到行块"""
+        return max(1, min(block_rows, -(-rows // (self.processes * _TASKS_PER_PROCESS))))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+                logger.info(f"🧮 相似度进程池已启动: {self.processes} 个进程")
+            return self._executor
+
+    def _run(self, function, tasks: List[tuple]) -> list:
+        """提交全部任务并按提交顺序取回结果；进程池损坏时丢弃，下次使用时重建"""
+        executor = self._get_executor()
+        try:
+            futures = [executor.submit(function, *task) for task in tasks]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    @staticmethod
+    def _inputs(coarse: QuantizedMatrix, doc_ids: np.ndarray, dup_keys: np.ndarray) -> Dict[str, np.ndarray]:
+        return {
+            "codes": np.ascontiguousarray(coarse.codes),
+            "scales": None if coarse.scales is None else np.ascontiguousarray(coarse.scales),
+            "doc_ids": np.ascontiguousarray(doc_ids, dtype=np.int64),
+            "dup_keys": np.ascontiguousarray(dup_keys, dtype=np.int64),
+        }
+
+    def topk(self, coarse: QuantizedMatrix, doc_ids: np.ndarray, dup_keys: np.ndarray,
+             k: int, threshold: float, block_rows: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """与 blockwise_topk 结果逐位一致的多进程版本，各进程计算不同的整块行段"""
+        n = coarse.shape[0]
+        k = max(1, min(k, n))
+        arrays = self._inputs(coarse, doc_ids, dup_keys)
+        arrays["scores"] = np.full((n, k), -np.inf, dtype=np.float32)
+        arrays["indices"] = np.full((n, k), -1, dtype=np.int64)
+
+        with SharedArrays(arrays) as shared:
+            tasks = [(shared.spec, coarse.mode, k, threshold, block_rows, start, stop)
+                     for start, stop in row_ranges(n, self.processes * _TASKS_PER_PROCESS, align=block_rows)]
+            self._run(_topk_task, tasks)
+            scores, indices = shared.arrays["scores"].copy(), shared.arrays["indices"].copy()
+        return scores, indices
+
+    def pairs(self, coarse: QuantizedMatrix, doc_ids: np.ndarray, dup_keys: np.ndarray,
+              threshold: float, block_rows: int = 1024) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """与 blockwise_pairs 结果逐位一致的多进程版本，整块行段按上三角计算量切分"""
+        n = coarse.shape[0]
+        with SharedArrays(self._inputs(coarse, doc_ids, dup_keys)) as shared:
+            tasks = [(shared.spec, coarse.mode, threshold, block_rows, start, stop)
+                     for start, stop in row_ranges(n, self.processes * _TASKS_PER_PROCESS, triangular=True,
+                                                   align=block_rows)]
+            results = self._run(_pairs_task, tasks)
+        if not results:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        left, right, scores = zip(*results)
+        return np.concatenate(left), np.concatenate(right), np.concatenate(scores)
+
+    def close(self):
+        """关闭进程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def get_similarity_pool(config) -> Optional[SimilarityPool]:
+    """根据配置获取进程内共享的相似度进程池，未启用（进程数不大于1）时返回None"""
+    global _pool_instance
+    processes = config.similarity_processes
+    if processes <= 1:
+        return None
+
+    with _pool_lock:
+        if _pool_instance is None:
+            _pool_instance = SimilarityPool(processes=processes,
+                                            min_segments=config.similarity_parallel_min_segments)
+            atexit.register(_pool_instance.close)
+        return _pool_instance
@@ -0,0 +1,233 @@
+"""
+重排引擎
+对聚类候选批量精排：余弦相似度已足以判定的候选对（很高的直接保留、偏低的直接丢弃）不调用reranker；
+远程reranker已打分的 (查询文本, 候选文本) 对从缓存读取，其余按查询合并后在有并发上限的线程池中同时调用，
+总耗时由最慢的一批调用决定，而不是所有聚类调用耗时之和；本地reranker直接在当前线程打分
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .rerankers import Reranker
+from ..utils.disk_cache import DiskLRUCache
+from ..utils.text_utils import normalize_text
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# reranker调用失败时候选的默认得分
+FALLBACK_SCORE = 0.5
+
+# 余弦相似度足够高、未调用reranker而直接保留的候选的得分（reranker得分的上限，不与余弦值混用）
+ACCEPT_SCORE = 1.0
+
+# 进程内按路径复用缓存实例
+_cache_instances: Dict[str, "RerankCache"] = {}
+_cache_lock = threading.Lock()
+
+
+def text_digest(text: str) -> str:
+    """规范化文本的哈希，作为缓存键的组成部分"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class RerankCache:
+    """以 (模型名, 查询文本哈希, 候选文本哈希) 为键的重排得分缓存"""
+
+    def __init__(self, path: str, max_entries: int = 1000000):
+        """
+        初始化重排缓存
+
+        Args:
+            path: 缓存数据库文件路径
+            max_entries: 最大缓存得分数
+        """
+        # 每个得分只占4字节，总大小按条目数上限估算
+        self.store = DiskLRUCache(path=path, max_entries=max_entries, max_bytes=max_entries * 256,
+                                  table="rerank")
+        logger.info(f"📦 重排缓存已启用: {path}, 上限 {max_entries} 条")
+
+    @staticmethod
+    def make_key(model: str, query_digest: str, candidate_digest: str) -> str:
+        return f"{model}:{query_digest}:{candidate_digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, float]:
+        """批量读取命中的得分"""
+        return {key: struct.unpack("<f", value)[0]
+                for key, value in self.store.get_many(keys).items() if len(value) == 4}
+
+    def put_many(self, scores: Dict[str, float]):
+        """批量写入得分"""
+        self.store.set_many({key: struct.pack("<f", score) for key, score in scores.items()})
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计"""
+        return self.store.stats()
+
+
+def get_rerank_cache(config) -> Optional[RerankCache]:
+    """根据配置获取进程内共享的重排缓存实例，未启用时返回None"""
+    if not config.rerank_cache_enable:
+        return None
+
+    path = config.rerank_cache_path
+    if not os.path.isabs(path):
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        path = os.path.join(project_root, path)
+
+    with _cache_lock:
+        if path not in _cache_instances:
+            try:
+                _cache_instances[path] = RerankCache(path=path, max_entries=config.rerank_cache_max_entries)
+            except Exception as e:
+                logger.warning(f"重排缓存初始化失败，将不使用缓存: {e}")
+                return None
+        return _cache_instances[path]
+
+
+class RerankEngine:
+    """聚类候选的批量并发重排"""
+
+    def __init__(self, reranker: Reranker, max_candidates: int = 20,
+                 max_concurrency: int = 8, skip_similarity: float = 0.95,
+                 drop_similarity: float = 0.0, cache: Optional[RerankCache] = None):
+        """
+        初始化引擎
+
+        Args:
+            reranker: 打分后端
+            max_candidates: 每个聚类送入reranker的最大候选数，也是单次调用的候选数上限
+            max_concurrency: 同时进行的reranker调用数上限
+            skip_similarity: 与查询的余弦相似度不低于该值的候选直接保留，得分记为ACCEPT_SCORE，不调用reranker
+            drop_similarity: 与查询的余弦相似度低于该值的候选直接丢弃，不调用reranker
+            cache: 重排得分缓存，只用于远程reranker，为None时不缓存
+        """
+        self.reranker = reranker
+        self.max_candidates = max(1, max_candidates)
+        self.max_concurrency = max(1, max_concurrency)
+        self.skip_similarity = skip_similarity
+        self.drop_similarity = drop_similarity
+        self.cache = cache if reranker.remote else None
+
+    @staticmethod
+    def _cosine(query, candidate) -> Optional[float]:
+        """两个片段嵌入向量的余弦相似度，任一方没有向量时返回None"""
+        if query.embedding is None or candidate.embedding is None:
+            return None
+        a = np.asarray(query.embedding, dtype=np.float32)
+        b = np.asarray(candidate.embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+        return float(a @ b) / norm if norm > 0 else None
+
+    def rerank(self, clusters: Dict[int, Sequence],
+               scorer: Optional[Reranker] = None) -> Dict[int, List[Tuple[object, float]]]:
+        """
+        对每个聚类以首个片段为查询、其余片段为候选打分
+
+        Args:
+            clusters: 聚类ID -> 片段列表
+            scorer: 本次请求的打分器（reranker.for_request 的结果），缺省为引擎的reranker
+
+        Returns:
+            聚类ID -> [(候选片段, 得分)]，按得分降序；每个聚类最多考察 max_candidates 个候选，
+            余弦相似度低于 drop_similarity 的候选不出现在结果中
+        """
+        scorer = scorer or self.reranker
+        scores: Dict[Tuple[int, int], float] = {}
+        pending: Dict[Tuple[int, int], str] = {}
+        query_digests: Dict[int, str] = {}
+        candidate_digests: Dict[Tuple[int, int], str] = {}
+        accepted = 0
+        dropped = 0
+
+        for cluster_id, segments in clusters.items():
+            query = segments[0]
+            for position, candidate in enumerate(segments[1:self.max_candidates + 1]):
+                cosine = self._cosine(query, candidate)
+                if cosine is not None and cosine >= self.skip_similarity:
+                    scores[(cluster_id, position)] = ACCEPT_SCORE
+                    accepted += 1
+                    continue
+                if cosine is not None and cosine < self.drop_similarity:
+                    dropped += 1
+                    continue
+                if cluster_id not in query_digests:
+                    query_digests[cluster_id] = text_digest(query.content)
+                candidate_digests[(cluster_id, position)] = text_digest(candidate.content)
+                pending[(cluster_id, position)] = RerankCache.make_key(
+                    scorer.model_name, query_digests[cluster_id], candidate_digests[(cluster_id, position)]
+                )
+
+        cached = self.cache.get_many(list(pending.values())) if self.cache is not None and pending else {}
+        for pair, key in list(pending.items()):
+            if key in cached:
+                scores[pair] = cached[key]
+                del pending[pair]
+
+        # 按查询文本合并待打分的候选，相同候选文本只打分一次
+        queries: Dict[str, str] = {}
+        documents: Dict[str, Dict[str, str]] = {}
+        for cluster_id, position in pending:
+            query_digest = query_digests[cluster_id]
+            queries[query_digest] = clusters[cluster_id][0].content
+            documents.setdefault(query_digest, {}).setdefault(
+                candidate_digests[(cluster_id, position)], clusters[cluster_id][position + 1].content
+            )
+        calls = [
+            (query_digest, queries[query_digest], list(batch.items())[start:start + self.max_candidates])
+            for query_digest, batch in documents.items()
+            for start in range(0, len(batch), self.max_candidates)
+        ]
+        fresh = self._score_calls(scorer, calls)
+
+        for pair, key in pending.items():
+            scores[pair] = fresh.get(key, FALLBACK_SCORE)
+        if self.cache is not None and fresh:
+            self.cache.put_many(fresh)
+
+        logger.info(f"🔀 重排完成 ({scorer.model_name}): {len(scores)} 个候选, 余弦直接保留 {accepted}, "
+                    f"余弦直接丢弃 {dropped}, "
+                    f"缓存命中 {len(cached)}, 调用 {len(calls)} 次")
+
+        results = {}
+        for cluster_id, segments in clusters.items():
+            ranked = [(candidate, scores[(cluster_id, position)])
+                      for position, candidate in enumerate(segments[1:self.max_candidates + 1])
+                      if (cluster_id, position) in scores]
+            results[cluster_id] = sorted(ranked, key=lambda item: -item[1])
+        return results
+
+    def _score_calls(self, scorer: Reranker,
+                     calls: List[Tuple[str, str, List[Tuple[str, str]]]]) -> Dict[str, float]:
+        """执行reranker调用（远程reranker并发执行），返回成功打分的缓存键 -> 得分"""
+        if not calls:
+            return {}
+
+        def run(call):
+            query_digest, query, documents = call
+            try:
+                result = scorer.score(query, [content for _, content in documents])
+            except Exception as e:
+                logger.error(f"Reranker调用异常: {e}")
+                return {}
+            if result is None or len(result) != len(documents):
+                return {}
+            return {RerankCache.make_key(scorer.model_name, query_digest, candidate_digest): float(score)
+                    for (candidate_digest, _), score in zip(documents, result)}
+
+        fresh: Dict[str, float] = {}
+        if not scorer.remote:
+            for call in calls:
+                fresh.update(run(call))
+            return fresh
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(calls)),
+                                thread_name_prefix="rerank") as executor:
+            for result in executor.map(run, calls):
+                fresh.update(result)
+        return fresh
@@ -0,0 +1,258 @@
+"""
+Reranker后端
+定义统一的重排接口，支持远程DashScope模型与本地CPU词法打分（字符n-gram BM25 + n-gram重合度），
+通过配置 RERANKER_PROVIDER 选择；DashScope不可用时禁用reranker，本地实现只在显式配置时使用
+"""
+
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from ..utils.text_utils import char_shingle_hashes
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# 动态导入dashscope以避免依赖问题
+try:
+    import dashscope
+    from http import HTTPStatus
+    DASHSCOPE_AVAILABLE = True
+except ImportError:
+    logger.warning("dashscope未安装，将禁用DashScope reranker")
+    DASHSCOPE_AVAILABLE = False
+
+RERANKER_PROVIDERS = ("dashscope", "lexical")
+
+
+class Reranker(ABC):
+    """重排接口"""
+
+    model_name: str
+    # 远程调用值得缓存得分并并发执行，本地打分直接计算
+    remote: bool = False
+    # 保留候选边的最低得分，与各后端的得分尺度对应（0.3按gte-rerank的得分标定）
+    threshold: float = 0.3
+
+    def for_request(self, texts: List[str]) -> "Reranker":
+        """返回用于一次请求的打分器，texts为该请求的全部片段文本；需要请求级统计的实现在此建立索引"""
+        return self
+
+    @abstractmethod
+    def score(self, query: str, documents: List[str]) -> Optional[List[float]]:
+        """
+        为候选文本打分
+
+        Returns:
+            与documents对齐的相关性得分（0~1），失败时返回None
+        """
+
+
+class DashScopeReranker(Reranker):
+    """远程DashScope重排模型"""
+
+    remote = True
+
+    def __init__(self, model_name: str = "gte-rerank-v2"):
+        if not DASHSCOPE_AVAILABLE:
+            raise RuntimeError("dashscope未安装")
+        api_key = os.environ.get("DASHSCOPE_API_KEY")
+        if not api_key:
+            raise RuntimeError("未找到DASHSCOPE_API_KEY")
+        dashscope.api_key = api_key
+        self.model_name = model_name
+
+    def score(self, query: str, documents: List[str]) -> Optional[List[float]]:
+        resp = dashscope.TextReRank.call(
+            model=self.model_name,
+            query=query,
+            documents=documents,
+            top_n=len(documents),
+            return_documents=False
+        )
+        if resp.status_code != HTTPStatus.OK:
+            logger.warning(f"Reranker调用失败: {resp.message}")
+            return None
+
+        scores = [0.0] * len(documents)
+        for result in resp.output.results:
+            scores[result.index] = result.relevance_score
+        logger.debug(f"Reranker成功处理 {len(documents)} 个候选片段")
+        return scores
+
+
+class LexicalReranker(Reranker):
+    """
+    本地词法重排
+
+    以去除空白后的字符n-gram为词项：BM25得分按查询与自身的BM25得分归一化，
+    与n-gram重合度（交集占较短一方的比例）加权求和，得分在0~1之间。
+    词项统计（IDF、平均长度）在 for_request 时对请求内全部片段建立一次，打分为稀疏矩阵乘法
+    """
+
+    def __init__(self, ngram_size: int = 2, bm25_weight: float = 0.5, threshold: float = 0.05,
+                 k1: float = 1.2, b: float = 0.75):
+        """
+        初始化
+
+        Args:
+            ngram_size: 字符n-gram长度，中文取2较合适
+            bm25_weight: BM25得分的权重，其余为n-gram重合度的权重
+            threshold: 保留候选边的最低得分；改写过的相似段落词项重合很少，得分通常只有0.1左右，
+                       逐字复制接近1，无关文本接近0
+            k1, b: BM25参数
+        """
+        self.ngram_size = max(1, ngram_size)
+        self.bm25_weight = min(max(bm25_weight, 0.0), 1.0)
+        self.threshold = threshold
+        self.k1 = k1
+        self.b = b
+        self.model_name = f"local-lexical-bm25-{self.ngram_size}"
+
+    def for_request(self, texts: List[str]) -> "LexicalIndex":
+        return LexicalIndex(self, texts)
+
+    def score(self, query: str, documents: List[str]) -> Optional[List[float]]:
+        """未建立请求级索引时，以查询与候选本身作为统计语料"""
+        return LexicalIndex(self, [query] + documents).score(query, documents)
+
+
+class LexicalIndex(Reranker):
+    """LexicalReranker在一次请求的片段集合上建立的词项索引"""
+
+    def __init__(self, reranker: LexicalReranker, texts: List[str]):
+        self.reranker = reranker
+        self.model_name = reranker.model_name
+        self.threshold = reranker.threshold
+
+        unique_texts = list(dict.fromkeys(texts))
+        self._rows: Dict[str, int] = {text: row for row, text in enumerate(unique_texts)}
+        term_lists = [char_shingle_hashes(text, reranker.ngram_size, unique=False) for text in unique_texts]
+        terms = np.concatenate(term_lists) if term_lists else np.empty(0, dtype=np.uint64)
+
+        # 一次排序同时得到有序词表与每个词项的列号
+        order = np.argsort(terms, kind="stable")
+        sorted_terms = terms[order]
+        first = np.ones(len(sorted_terms), dtype=bool)
+        first[1:] = sorted_terms[1:] != sorted_terms[:-1]
+        self._vocabulary = sorted_terms[first]
+        cols = np.empty(len(terms), dtype=np.int64)
+        cols[order] = np.cumsum(first) - 1
+        rows = np.repeat(np.arange(len(term_lists)), [len(term_list) for term_list in term_lists])
+
+        counts = self._counts(rows, cols, len(term_lists))
+        document_count = max(counts.shape[0], 1)
+        document_frequency = np.bincount(counts.indices, minlength=len(self._vocabulary))
+        self._idf = np.log1p((document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        self._average_length = float(lengths.mean()) if len(lengths) else 1.0
+
+        self._weights = self._bm25_weights(counts, lengths)
+        self._presence = (counts > 0).astype(np.float32).tocsr()
+        logger.debug(f"词法reranker索引: {len(unique_texts)} 个片段, {len(self._vocabulary)} 个词项")
+
+    def _count_matrix(self, term_lists: List[np.ndarray]) -> sparse.csr_matrix:
+        """词频矩阵 (文本数, 词项数)，不在词表中的词项忽略"""
+        terms = np.concatenate(term_lists) if term_lists else np.empty(0, dtype=np.uint64)
+        if len(terms) == 0 or len(self._vocabulary) == 0:
+            return sparse.csr_matrix((len(term_lists), len(self._vocabulary)), dtype=np.float32)
+        rows = np.repeat(np.arange(len(term_lists)), [len(term_list) for term_list in term_lists])
+        cols = np.minimum(np.searchsorted(self._vocabulary, terms), len(self._vocabulary) - 1)
+        known = self._vocabulary[cols] == terms
+        return self._counts(rows[known], cols[known], len(term_lists))
+
+    def _counts(self, rows: np.ndarray, cols: np.ndarray, count: int) -> sparse.csr_matrix:
+        matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                   shape=(count, len(self._vocabulary)))
+        matrix.sum_duplicates()
+        return matrix
+
+    def _bm25_weights(self, counts: sparse.csr_matrix, lengths: np.ndarray) -> sparse.csr_matrix:
+        """每个文本中每个词项的BM25贡献"""
+        k1, b = self.reranker.k1, self.reranker.b
+        weights = counts.copy()
+        length_norm = k1 * (1 - b + b * lengths / max(self._average_length, 1e-9))
+        row_of_entry = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        weights.data = (self._idf[counts.indices] * counts.data * (k1 + 1) /
+                        (counts.data + length_norm[row_of_entry])).astype(np.float32)
+        return weights
+
+    def _matrices(self, texts: List[str]):
+        """取文本的BM25权重与词项存在矩阵，索引中没有的文本临时计算"""
+        missing = [text for text in dict.fromkeys(texts) if text not in self._rows]
+        if not missing:
+            rows = [self._rows[text] for text in texts]
+            return self._weights[rows], self._presence[rows]
+
+        known = [text for text in dict.fromkeys(texts) if text in self._rows]
+        extra = self._count_matrix([char_shingle_hashes(text, self.reranker.ngram_size, unique=False)
+                                    for text in missing])
+        known_rows = [self._rows[text] for text in known]
+        weights = sparse.vstack([self._weights[known_rows],
+                                 self._bm25_weights(extra, np.asarray(extra.sum(axis=1)).ravel())]).tocsr()
+        presence = sparse.vstack([self._presence[known_rows], (extra > 0).astype(np.float32)]).tocsr()
+        positions = {text: position for position, text in enumerate(known + missing)}
+        rows = [positions[text] for text in texts]
+        return weights[rows], presence[rows]
+
+    def score(self, query: str, documents: List[str]) -> Optional[List[float]]:
+        if not documents:
+            return []
+        weights, presence = self._matrices([query] + documents)
+        query_terms = presence[0].toarray().ravel()
+
+        # BM25: 候选中查询词项的贡献之和，按查询自身的得分归一化
+        bm25 = weights[1:] @ query_terms
+        self_score = float((weights[0] @ query_terms)[0])
+        bm25 = np.clip(bm25 / self_score, 0.0, 1.0) if self_score > 0 else np.zeros(len(documents))
+
+        # n-gram重合度：交集占较短一方的比例，对一方包含另一方的复制同样敏感
+        overlap = presence[1:] @ query_terms
+        sizes = np.asarray(presence.sum(axis=1)).ravel()
+        shorter = np.minimum(sizes[0], sizes[1:])
+        overlap = np.divide(overlap, shorter, out=np.zeros(len(documents)), where=shorter > 0)
+
+        weight = self.reranker.bm25_weight
+        return (weight * bm25 + (1 - weight) * overlap).tolist()
+
+
+def create_reranker(provider: str = "dashscope", ngram_size: int = 2, bm25_weight: float = 0.5,
+                    threshold: float = 0.05) -> Optional[Reranker]:
+    """
+    创建reranker，不可用时返回None
+
+    provider:
+        dashscope - 远程gte-rerank-v2模型（默认），dashscope未安装或缺少API密钥时返回None（禁用reranker）
+        lexical   - 本地字符n-gram BM25 + 重合度，ngram_size、bm25_weight、threshold只用于该后端
+    """
+    if provider not in RERANKER_PROVIDERS:
+        logger.warning(f"未知的reranker {provider}，使用dashscope")
+        provider = "dashscope"
+
+    if provider == "dashscope":
+        try:
+            reranker: Reranker = DashScopeReranker()
+            logger.info("已初始化Qwen reranker")
+            return reranker
+        except Exception as e:
+            logger.warning(f"DashScope reranker不可用，将禁用reranker功能: {e}")
+            return None
+
+    reranker = LexicalReranker(ngram_size=ngram_size, bm25_weight=bm25_weight, threshold=threshold)
+    logger.info(f"已初始化本地词法reranker ({reranker.model_name})")
+    return reranker
+
+
+def get_reranker(config) -> Optional[Reranker]:
+    """根据配置创建reranker，未启用时返回None"""
+    if not config.use_reranker:
+        return None
+    return create_reranker(
+        provider=config.reranker_provider,
+        ngram_size=config.lexical_rerank_ngram_size,
+        bm25_weight=config.lexical_rerank_bm25_weight,
+        threshold=config.lexical_rerank_threshold
+    )
@@ -0,0 +1,76 @@
+"""
+规则分块器
+按中文句末标点切句，再以长度受限、相邻窗口重叠若干句的滑动窗口组合成片段；
+不依赖嵌入模型，结果确定，适合对延迟和成本敏感的请求
+"""
+
+from typing import List, Tuple
+
+from ..utils.text_utils import split_with_spans, trim_span
+
+
+class RuleBasedChunker:
+    """基于句子正则与滑动窗口的确定性分块器"""
+
+    def __init__(self, sentence_split_regex: str = r'(?<=[。！？；])\s*',
+                 max_chunk_chars: int = 300, overlap_sentences: int = 1):
+        """
+        初始化分块器
+
+        Args:
+            sentence_split_regex: 句子切分正则（与语义分块器一致）
+            max_chunk_chars: 单个片段的最大字符数，超长的单句按该长度硬切
+            overlap_sentences: 相邻窗口重叠的句子数
+        """
+        self.sentence_split_regex = sentence_split_regex
+        self.max_chunk_chars = max(1, max_chunk_chars)
+        self.overlap_sentences = max(0, overlap_sentences)
+
+    def _sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        """切句并去掉空句，超长句子按最大长度切成若干段"""
+        spans = []
+        for _, start, end in split_with_spans(text, self.sentence_split_regex):
+            start, end = trim_span(text, start, end)
+            while end - start > self.max_chunk_chars:
+                piece_start, piece_end = trim_span(text, start, start + self.max_chunk_chars)
+                if piece_start < piece_end:
+                    spans.append((piece_start, piece_end))
+                start, end = trim_span(text, start + self.max_chunk_chars, end)
+            if start < end:
+                spans.append((start, end))
+        return spans
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        分块并返回每个片段在原文中的 [start, end) 区间
+
+        窗口从当前句开始尽量多地纳入后续句子而不超过最大长度，
+        下一个窗口从当前窗口末尾回退overlap_sentences句开始，且至少前进一句；
+        重叠句与下一句放不进同一窗口时相应减少重叠
+        """
+        sentences = self._sentence_spans(text)
+        chunk_spans = []
+
+        window_start = 0
+        while window_start < len(sentences):
+            window_end = window_start + 1
+            chunk_start = sentences[window_start][0]
+            while (window_end < len(sentences) and
+                   sentences[window_end][1] - chunk_start <= self.max_chunk_chars):
+                window_end += 1
+
+            chunk_spans.append((chunk_start, sentences[window_end - 1][1]))
+            if window_end >= len(sentences):
+                break
+            next_start = max(window_start + 1, window_end - self.overlap_sentences)
+            # 重叠句加上下一句超出长度时减少重叠，避免产生被上一个窗口完全包含的片段
+            while (next_start < window_end and
+                   sentences[window_end][1] - sentences[next_start][0] > self.max_chunk_chars):
+                next_start += 1
+            window_start = next_start
+
+        return chunk_spans
+
+    def split_text(self, text: str) -> List[str]:
+        """分块并返回片段文本"""
+        return [text[start:end] for start, end in self.split_spans(text)]
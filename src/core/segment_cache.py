@@ -0,0 +1,142 @@
+"""
+文档分割结果缓存
+以 (文档内容哈希, 分块配置指纹) 为键，持久化每个文档的片段区间、页码与片段向量；
+pooled模式的池化向量随分割结果一起写入，exact/rule模式的片段向量在嵌入阶段生成后写回同一条目。
+同一文档在不同比对请求中重复提交时直接还原分割结果与向量，分块参数变化时指纹随之变化，旧结果自然失效
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from typing import Iterable, List, Optional, Dict, Tuple
+
+import numpy as np
+
+from ..embeddings.quantization import encode_vector, decode_vector
+from ..utils.disk_cache import DiskLRUCache
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# 分割算法有不兼容变化时递增，使旧缓存失效
+SEGMENTATION_CACHE_VERSION = 2
+
+# 单个片段的缓存内容: (片段编号, 页码, 起始偏移, 结束偏移, 片段向量)
+CachedChunk = Tuple[int, int, int, int, Optional[np.ndarray]]
+
+# 进程内按路径复用缓存实例
+_cache_instances: Dict[str, "SegmentationCache"] = {}
+_cache_lock = threading.Lock()
+
+
+class SegmentationCache:
+    """按文档内容寻址的分割结果缓存"""
+
+    def __init__(self, path: str, max_entries: int = 50000, max_mb: int = 1024,
+                 quantization: str = "none"):
+        """
+        初始化分割缓存
+
+        Args:
+            path: 缓存数据库文件路径
+            max_entries: 最大缓存文档数
+            max_mb: 缓存最大占用空间(MB)
+            quantization: 片段向量的存储格式，none(float32)、float16 或 int8
+        """
+        self.quantization = quantization
+        self.store = DiskLRUCache(
+            path=path,
+            max_entries=max_entries,
+            max_bytes=max_mb * 1024 * 1024,
+            table="segments"
+        )
+        logger.info(f"🗂️ 分割结果缓存已启用: {path}, 上限 {max_entries} 个文档 / {max_mb}MB")
+
+    @staticmethod
+    def make_key(combined_content: str, page_numbers: List[int], page_starts: List[int],
+                 chunker_fingerprint: str) -> str:
+        """由合并文本、页面布局与分块配置指纹生成缓存键（与文档ID无关）"""
+        return SegmentationCache.make_key_from_parts((combined_content,), page_numbers, page_starts,
+                                                     chunker_fingerprint)
+
+    @staticmethod
+    def make_key_from_parts(content_parts: Iterable[str], page_numbers: List[int], page_starts: List[int],
+                            chunker_fingerprint: str) -> str:
+        """同make_key，合并文本以依次拼接的若干部分给出，不需要拼接出整篇文本"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([page_numbers, page_starts]).encode("utf-8"))
+        for part in content_parts:
+            digest.update(part.encode("utf-8"))
+        fingerprint = hashlib.sha256(chunker_fingerprint.encode("utf-8")).hexdigest()[:16]
+        return f"v{SEGMENTATION_CACHE_VERSION}:{fingerprint}:{digest.hexdigest()}"
+
+    def get(self, key: str, dimensions: int) -> Optional[List[CachedChunk]]:
+        """读取文档的分割结果，未命中或内容损坏时返回None"""
+        value = self.store.get(key)
+        if value is None:
+            return None
+        try:
+            return self._decode(value, dimensions)
+        except Exception as e:
+            logger.warning(f"分割缓存内容损坏，按未命中处理: {e}")
+            return None
+
+    def put(self, key: str, chunks: List[CachedChunk]):
+        """写入文档的分割结果"""
+        self.store.set(key, self._encode(chunks))
+
+    def _encode(self, chunks: List[CachedChunk]) -> bytes:
+        """编码为: 4字节头长度 + JSON头(区间与向量字节长度) + 各向量字节串"""
+        vector_blobs = [
+            encode_vector(vector, self.quantization) if vector is not None else b""
+            for _, _, _, _, vector in chunks
+        ]
+        header = json.dumps({
+            "spans": [[chunk_id, page, start, end] for chunk_id, page, start, end, _ in chunks],
+            "sizes": [len(blob) for blob in vector_blobs],
+        }).encode("utf-8")
+        return struct.pack("<I", len(header)) + header + b"".join(vector_blobs)
+
+    @staticmethod
+    def _decode(value: bytes, dimensions: int) -> List[CachedChunk]:
+        (header_size,) = struct.unpack_from("<I", value)
+        header = json.loads(value[4:4 + header_size].decode("utf-8"))
+
+        chunks = []
+        offset = 4 + header_size
+        for (chunk_id, page, start, end), size in zip(header["spans"], header["sizes"]):
+            vector = decode_vector(value[offset:offset + size], dimensions) if size else None
+            offset += size
+            chunks.append((chunk_id, page, start, end, vector))
+        return chunks
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计"""
+        return self.store.stats()
+
+
+def get_segmentation_cache(config) -> Optional[SegmentationCache]:
+    """根据配置获取进程内共享的分割结果缓存实例，未启用时返回None"""
+    if not config.segment_cache_enable:
+        return None
+
+    path = config.segment_cache_path
+    if not os.path.isabs(path):
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        path = os.path.join(project_root, path)
+
+    with _cache_lock:
+        if path not in _cache_instances:
+            try:
+                _cache_instances[path] = SegmentationCache(
+                    path=path,
+                    max_entries=config.segment_cache_max_entries,
+                    max_mb=config.segment_cache_max_mb,
+                    quantization=config.embedding_cache_quantization
+                )
+            except Exception as e:
+                logger.warning(f"分割结果缓存初始化失败，将不使用缓存: {e}")
+                return None
+        return _cache_instances[path]
@@ -0,0 +1,169 @@
+"""
+语义分块器
+按句子切分后计算相邻句子窗口的余弦距离，距离超过阈值处断开；
+每个句子只嵌入一次，缓冲窗口在句向量矩阵上池化得到，距离与阈值全部以numpy向量化计算
+"""
+
+from typing import Dict, List, Tuple, Optional
+
+import numpy as np
+
+from ..utils.text_utils import split_with_spans, trim_span
+
+BREAKPOINT_THRESHOLD_TYPES = ("percentile", "standard_deviation", "interquartile", "gradient")
+
+
+class SemanticChunker:
+    """基于句向量距离断点的语义分块器（参数与langchain_experimental的SemanticChunker一致）"""
+
+    def __init__(self, embeddings, breakpoint_threshold_type: str = "percentile",
+                 breakpoint_threshold_amount: float = 95, buffer_size: int = 1,
+                 sentence_split_regex: str = r'(?<=[。！？；])\s*'):
+        """
+        初始化分块器
+
+        Args:
+            embeddings: 提供 embed_texts(texts, raise_on_error=True) 的嵌入对象（CustomEmbeddings）
+            breakpoint_threshold_type: 断点阈值类型，percentile/standard_deviation/interquartile/gradient
+            breakpoint_threshold_amount: 阈值参数（百分位数或倍数）
+            buffer_size: 计算距离时每个句子前后各纳入的句子数
+            sentence_split_regex: 句子切分正则
+        """
+        if breakpoint_threshold_type not in BREAKPOINT_THRESHOLD_TYPES:
+            raise ValueError(f"不支持的断点阈值类型: {breakpoint_threshold_type}")
+        self.embeddings = embeddings
+        self.breakpoint_threshold_type = breakpoint_threshold_type
+        self.breakpoint_threshold_amount = breakpoint_threshold_amount
+        self.buffer_size = buffer_size
+        self.sentence_split_regex = sentence_split_regex
+
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        """切句并返回非空句子在原文中的区间（已去除两端空白）"""
+        spans = []
+        for _, start, end in split_with_spans(text, self.sentence_split_regex):
+            start, end = trim_span(text, start, end)
+            if start < end:
+                spans.append((start, end))
+        return spans
+
+    def embed_sentences(self, sentences: List[str],
+                        known_vectors: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """
+        嵌入所有句子，返回 (句子数, 维度) 的float32矩阵，任一句子失败时抛出异常
+
+        known_vectors中已有向量的句子直接取用，只嵌入其余句子
+        """
+        if not known_vectors:
+            vectors = self.embeddings.embed_texts(sentences, raise_on_error=True)
+            return np.vstack(vectors).astype(np.float32, copy=False)
+
+        missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in known_vectors]
+        fresh = dict(zip(missing, self.embeddings.embed_texts(missing, raise_on_error=True))) if missing else {}
+        vectors = [known_vectors[sentence] if sentence in known_vectors else fresh[sentence] for sentence in sentences]
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    def window_embeddings(self, sentence_vectors: np.ndarray) -> np.ndarray:
+        """
+        缓冲窗口池化：第i行为第 i-buffer_size 到 i+buffer_size 个句子的L2归一化向量之和，
+        基于前缀和一次算出所有窗口
+        """
+        norms = np.linalg.norm(sentence_vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        unit_vectors = sentence_vectors / norms
+
+        count = unit_vectors.shape[0]
+        prefix = np.zeros((count + 1, unit_vectors.shape[1]), dtype=np.float32)
+        np.cumsum(unit_vectors, axis=0, out=prefix[1:])
+
+        indices = np.arange(count)
+        window_start = np.maximum(indices - self.buffer_size, 0)
+        window_end = np.minimum(indices + self.buffer_size + 1, count)
+        return prefix[window_end] - prefix[window_start]
+
+    @staticmethod
+    def cosine_distances(window_vectors: np.ndarray) -> np.ndarray:
+        """相邻窗口之间的余弦距离，长度为窗口数-1"""
+        norms = np.linalg.norm(window_vectors, axis=1)
+        norms[norms == 0] = 1.0
+        similarities = np.einsum("ij,ij->i", window_vectors[:-1], window_vectors[1:]) / (norms[:-1] * norms[1:])
+        return 1.0 - similarities
+
+    def calculate_breakpoint_threshold(self, distances: np.ndarray) -> Tuple[float, np.ndarray]:
+        """计算断点阈值，返回 (阈值, 与阈值比较的数组)"""
+        amount = self.breakpoint_threshold_amount
+        if self.breakpoint_threshold_type == "percentile":
+            return float(np.percentile(distances, amount)), distances
+        if self.breakpoint_threshold_type == "standard_deviation":
+            return float(np.mean(distances) + amount * np.std(distances)), distances
+        if self.breakpoint_threshold_type == "interquartile":
+            q1, q3 = np.percentile(distances, [25, 75])
+            return float(np.mean(distances) + amount * (q3 - q1)), distances
+        # gradient：按距离梯度的分布确定阈值
+        if len(distances) < 2:
+            return float("inf"), distances
+        gradient = np.gradient(distances)
+        return float(np.percentile(gradient, amount)), gradient
+
+    def split_with_spans(self, text: str, pooled: bool = True) -> List[Tuple[int, int, Optional[np.ndarray]]]:
+        """
+        语义分割并返回每个片段在原文中的精确区间
+
+        Args:
+            text: 待分割文本
+            pooled: 是否按句子长度加权池化句向量，得到每个片段的向量
+
+        Returns:
+            [(起始偏移, 结束偏移, 片段向量), ...]，未池化或只有一个句子时向量为None
+        """
+        chunk_spans, _, _ = self.split_with_sentences(text, pooled=pooled)
+        return chunk_spans
+
+    def split_with_sentences(self, text: str, pooled: bool = True,
+                             known_vectors: Optional[Dict[str, np.ndarray]] = None):
+        """
+        语义分割，同时返回切句结果与句向量，供流式分割把重叠部分的句向量带入下一个窗口
+
+        Args:
+            text: 待分割文本
+            pooled: 是否按句子长度加权池化句向量，得到每个片段的向量
+            known_vectors: 句子文本 -> 已知句向量，命中的句子不再嵌入
+
+        Returns:
+            (片段区间列表（同split_with_spans）, 句子区间列表, 句向量矩阵)；只有一个句子时不嵌入，句向量矩阵为None
+        """
+        spans = self.sentence_spans(text)
+        if not spans:
+            return [], spans, None
+        if len(spans) == 1:
+            return [(spans[0][0], spans[0][1], None)], spans, None
+
+        sentence_vectors = self.embed_sentences([text[start:end] for start, end in spans], known_vectors)
+        distances = self.cosine_distances(self.window_embeddings(sentence_vectors))
+        threshold, breakpoint_array = self.calculate_breakpoint_threshold(distances)
+
+        # 断点i表示第i句与第i+1句之间断开
+        boundaries = np.flatnonzero(breakpoint_array > threshold) + 1
+        group_starts = np.concatenate(([0], boundaries))
+        group_ends = np.concatenate((boundaries, [len(spans)]))
+
+        if pooled:
+            norms = np.linalg.norm(sentence_vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            lengths = np.asarray([end - start for start, end in spans], dtype=np.float32)
+            weighted = np.vstack([np.zeros((1, sentence_vectors.shape[1]), dtype=np.float32),
+                                  np.cumsum(sentence_vectors / norms * lengths[:, None], axis=0)])
+
+        chunk_spans = []
+        for group_start, group_end in zip(group_starts, group_ends):
+            chunk_embedding = None
+            if pooled:
+                pooled_vector = weighted[group_end] - weighted[group_start]
+                norm = np.linalg.norm(pooled_vector)
+                chunk_embedding = (pooled_vector / norm).astype(np.float32) if norm > 0 else None
+            chunk_spans.append((spans[group_start][0], spans[group_end - 1][1], chunk_embedding))
+
+        return chunk_spans, spans, sentence_vectors
+
+    def split_text(self, text: str) -> List[str]:
+        """语义分割并返回片段文本"""
+        return [text[start:end] for start, end, _ in self.split_with_spans(text, pooled=False)]
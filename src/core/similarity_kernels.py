@@ -0,0 +1,151 @@
+"""
+分块相似度内核
+按行块计算归一化向量矩阵与全体片段的相似度，在块内以向量化方式屏蔽同文档与完全相同的片段、
+按阈值过滤并用argpartition选出每行top-k；峰值内存由行块大小决定（块内的临时数组一并计入预算），
+不构造N×N矩阵
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..embeddings.quantization import QuantizedMatrix, quantized_similarity
+
+
+def duplicate_keys(content_hashes: List[Optional[str]]) -> np.ndarray:
+    """将规范化文本哈希编码为整数，哈希相同的片段编码相同，无哈希的片段为-1"""
+    keys = np.full(len(content_hashes), -1, dtype=np.int64)
+    codes = {}
+    for idx, content_hash in enumerate(content_hashes):
+        if content_hash is not None:
+            keys[idx] = codes.setdefault(content_hash, len(codes))
+    return keys
+
+
+# 行块中每个元素的峰值内存(字节)：float32相似度4 + argpartition的int64行号8 + 屏蔽用的布尔矩阵约3，取整为16
+BLOCK_BYTES_PER_ELEMENT = 16
+
+
+def block_rows_for_budget(n_cols: int, block_mb: float) -> int:
+    """在给定内存预算(MB)下，一个相似度行块（含选取top-k时的临时数组）最多容纳的行数"""
+    return max(1, int(block_mb * 1024 * 1024 // (max(n_cols, 1) * BLOCK_BYTES_PER_ELEMENT)))
+
+
+def excluded_pairs(doc_ids: np.ndarray, dup_keys: np.ndarray,
+                   rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    行与列两两之间是否应排除：同一文档，或规范化文本完全相同（已由精确匹配阶段输出）
+
+    rows/cols 为行号数组，返回形状为 (len(rows), len(cols)) 的布尔矩阵
+    """
+    excluded = doc_ids[rows, None] == doc_ids[None, cols]
+    row_keys = dup_keys[rows, None]
+    same_text = row_keys == dup_keys[None, cols]
+    same_text &= row_keys >= 0
+    excluded |= same_text
+    return excluded
+
+
+def blockwise_topk(coarse: QuantizedMatrix, doc_ids: np.ndarray, dup_keys: np.ndarray,
+                   k: int, threshold: float, block_rows: int = 1024,
+                   row_start: int = 0, row_stop: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分块计算每行的跨文档top-k近邻
+
+    Args:
+        coarse: 粗排向量矩阵（可为量化格式）
+        doc_ids: 每行所属文档ID
+        dup_keys: duplicate_keys 给出的重复文本编码
+        k: 每行保留的近邻数
+        threshold: 相似度阈值，低于阈值的近邻不保留
+        block_rows: 每块的行数
+        row_start, row_stop: 只计算 [row_start, row_stop) 行，便于分片并行
+
+    Returns:
+        (相似度, 行号)，形状均为 (行数, k)，每行按相似度降序排列，不足k个时行号为-1
+    """
+    n = coarse.shape[0]
+    row_stop = n if row_stop is None else row_stop
+    k = max(1, min(k, n))
+    all_scores = np.full((row_stop - row_start, k), -np.inf, dtype=np.float32)
+    all_indices = np.full((row_stop - row_start, k), -1, dtype=np.int64)
+    cols = np.arange(n)
+
+    for start in range(row_start, row_stop, block_rows):
+        stop = min(start + block_rows, row_stop)
+        rows = cols[start:stop]
+        similarities = quantized_similarity(coarse.select(slice(start, stop)), coarse)
+        excluded = excluded_pairs(doc_ids, dup_keys, rows, cols)
+        excluded |= similarities < threshold
+        # 原地取负后直接在同一缓冲区上argpartition，不再复制整个相似度块
+        distances = np.negative(similarities, out=similarities)
+        distances[excluded] = np.inf
+        del excluded
+
+        if k < n:
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(cols, distances.shape)
+        top_scores = -np.take_along_axis(distances, top, axis=1)
+        # 按相似度降序、行号升序排列，与稳定排序的结果一致
+        order = np.lexsort((top, -top_scores), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        valid = np.isfinite(top_scores)
+        all_scores[start - row_start:stop - row_start] = top_scores
+        all_indices[start - row_start:stop - row_start] = np.where(valid, top, -1)
+
+    return all_scores, all_indices
+
+
+def blockwise_pairs(coarse: QuantizedMatrix, doc_ids: np.ndarray, dup_keys: np.ndarray,
+                    threshold: float, block_rows: int = 1024,
+                    row_start: int = 0, row_stop: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    分块找出所有 i<j、跨文档且相似度不低于阈值的行对
+
+    每块只计算上三角部分 [start, n) 列
+
+    Returns:
+        (左行号, 右行号, 相似度)，按左行号、右行号升序排列
+    """
+    n = coarse.shape[0]
+    row_stop = n if row_stop is None else row_stop
+    lefts, rights, scores = [], [], []
+
+    for start in range(row_start, row_stop, block_rows):
+        stop = min(start + block_rows, row_stop)
+        rows = np.arange(start, stop)
+        cols = np.arange(start, n)
+        similarities = quantized_similarity(coarse.select(slice(start, stop)), coarse.select(slice(start, n)))
+        keep = excluded_pairs(doc_ids, dup_keys, rows, cols)
+        np.logical_not(keep, out=keep)
+        keep &= similarities >= threshold
+        keep &= cols[None, :] > rows[:, None]
+        block_left, block_right = np.nonzero(keep)
+        lefts.append(block_left + start)
+        rights.append(block_right + start)
+        scores.append(similarities[block_left, block_right])
+
+    if not lefts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(lefts), np.concatenate(rights), np.concatenate(scores)
+
+
+def merge_topk(scores: np.ndarray, indices: np.ndarray, block_scores: np.ndarray,
+               block_indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    合并两组逐行top-k结果（无效位置相似度为-inf、行号为-1），返回合并后每行降序的top-k
+
+    用于按列块或分片计算后归并近邻
+    """
+    merged_scores = np.concatenate([scores, block_scores], axis=1)
+    merged_indices = np.concatenate([indices, block_indices], axis=1)
+    k = min(k, merged_scores.shape[1])
+    if k < merged_scores.shape[1]:
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        merged_scores = np.take_along_axis(merged_scores, top, axis=1)
+        merged_indices = np.take_along_axis(merged_indices, top, axis=1)
+    order = np.lexsort((merged_indices, -merged_scores), axis=1)
+    return np.take_along_axis(merged_scores, order, axis=1), np.take_along_axis(merged_indices, order, axis=1)
@@ -4,7 +4,13 @@
 """
 
 from .llm_duplicate_detector import LLMDuplicateDetector
+from .exact_duplicate_detector import ExactDuplicateDetector
+from .near_duplicate_detector import NearDuplicateDetector
+from .simhash_duplicate_detector import SimHashDuplicateDetector
 
 __all__ = [
-    'LLMDuplicateDetector'
+    'LLMDuplicateDetector',
+    'ExactDuplicateDetector',
+    'NearDuplicateDetector',
+    'SimHashDuplicateDetector'
 ]
@@ -0,0 +1,82 @@
+"""
+精确重复检测器
+对规范化后的片段文本做哈希，跨文档完全相同的片段直接输出为重复结果，无需嵌入和大模型判断
+"""
+
+import time
+from collections import defaultdict
+from typing import List, Dict
+
+from ..models.api_models import DuplicateOutput
+from ..models.data_models import TextSegment
+from ..utils.text_utils import content_hash, extract_prefix_suffix
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+
+class ExactDuplicateDetector:
+    """基于内容哈希的跨文档精确重复检测"""
+
+    def assign_hashes(self, segments: List[TextSegment]) -> Dict[str, List[TextSegment]]:
+        """为片段计算内容哈希，返回 哈希 -> 片段列表 的分组"""
+        groups: Dict[str, List[TextSegment]] = defaultdict(list)
+        for segment in segments:
+            if not segment.content or not segment.content.strip():
+                continue
+            if segment.content_hash is None:
+                segment.content_hash = content_hash(segment.content)
+            groups[segment.content_hash].append(segment)
+        return groups
+
+    def detect(self, segments: List[TextSegment]) -> List[DuplicateOutput]:
+        """
+        检测跨文档完全相同的片段
+
+        同一哈希组内，每两个文档之间按出现顺序一一配对输出，得分1.0、类别1（语义相似）
+        """
+        start_time = time.time()
+        groups = self.assign_hashes(segments)
+
+        results = []
+        duplicate_groups = 0
+        for group in groups.values():
+            by_document: Dict[int, List[TextSegment]] = defaultdict(list)
+            for segment in group:
+                by_document[segment.document_id].append(segment)
+            if len(by_document) < 2:
+                continue
+
+            duplicate_groups += 1
+            doc_ids = sorted(by_document)
+            for i, doc_id1 in enumerate(doc_ids):
+                for doc_id2 in doc_ids[i + 1:]:
+                    for seg1, seg2 in zip(by_document[doc_id1], by_document[doc_id2]):
+                        results.append(self._create_output(seg1, seg2))
+
+        elapsed = time.time() - start_time
+        logger.info(f"🔁 精确重复检测完成，耗时 {elapsed:.3f}秒: {len(segments)} 个片段, "
+                    f"{len(groups)} 种不同内容, {duplicate_groups} 组跨文档相同, 输出 {len(results)} 对")
+        return results
+
+    def _create_output(self, seg1: TextSegment, seg2: TextSegment) -> DuplicateOutput:
+        """构造精确重复结果"""
+        prefix1, suffix1 = extract_prefix_suffix(seg1.content)
+        prefix2, suffix2 = extract_prefix_suffix(seg2.content)
+        return DuplicateOutput(
+            documentId1=seg1.document_id,
+            page1=seg1.page,
+            chunkId1=seg1.chunk_id,
+            content1=seg1.content,
+            prefix1=prefix1,
+            suffix1=suffix1,
+            documentId2=seg2.document_id,
+            page2=seg2.page,
+            chunkId2=seg2.chunk_id,
+            content2=seg2.content,
+            prefix2=prefix2,
+            suffix2=suffix2,
+            reason="两个片段文本完全相同 [精确匹配]",
+            score=1.0,
+            category=1
+        )
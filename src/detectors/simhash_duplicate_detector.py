@@ -0,0 +1,140 @@
+"""
+SimHash逐字复制检测器
+以64位SimHash指纹查找汉明距离很小的片段对，不调用嵌入或大模型：
+请求内的跨文档片段对与历史语料中的片段均可命中，命中结果直接输出为逐字复制
+"""
+
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..core.corpus_index import CorpusIndex
+from ..core.similarity_kernels import duplicate_keys
+from ..core.simhash_index import SimHashIndex, simhash_fingerprints
+from ..models.api_models import DuplicateOutput
+from ..models.data_models import TextSegment
+from ..utils.text_utils import extract_prefix_suffix
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+
+class SimHashDuplicateDetector:
+    """基于SimHash指纹的逐字复制检测（请求内与历史语料）"""
+
+    def __init__(self, max_distance: int = 3, shingle_size: int = 3, min_shingles: int = 1,
+                 corpus_index: Optional[CorpusIndex] = None):
+        """
+        初始化检测器
+
+        Args:
+            max_distance: 判定为逐字复制的最大汉明距离
+            shingle_size: 计算指纹的字符n-gram长度，需与历史语料索引一致
+            min_shingles: 参与检测的最少n-gram数，更短的片段（标题、“联系人：”之类的套话）不查找
+            corpus_index: 历史语料索引，为None时只检测请求内的片段
+        """
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.corpus_index = corpus_index
+
+    def detect(self, segments: List[TextSegment]) -> List[DuplicateOutput]:
+        """检测请求内跨文档、以及与历史文档之间的逐字复制片段"""
+        start_time = time.time()
+        if not segments:
+            return []
+
+        fingerprints, valid = simhash_fingerprints([segment.content for segment in segments],
+                                                  self.shingle_size, self.min_shingles)
+        rows = np.flatnonzero(valid)
+
+        results = [
+            self._create_output(segments[i], segments[j], int(distance))
+            for i, j, distance in zip(*self._request_pairs(segments, fingerprints, rows))
+        ]
+        request_count = len(results)
+
+        if self.corpus_index is not None and len(rows):
+            results.extend(self._historical_matches(segments, fingerprints, rows))
+
+        elapsed = time.time() - start_time
+        logger.info(f"🔖 SimHash指纹检测完成，耗时 {elapsed:.3f}秒: {len(segments)} 个片段, "
+                    f"请求内 {request_count} 对, 历史语料 {len(results) - request_count} 对")
+        return results
+
+    def _request_pairs(self, segments: List[TextSegment], fingerprints: np.ndarray,
+                       rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """请求内跨文档、文本不完全相同的指纹近邻对（完全相同的由精确匹配阶段输出）"""
+        index = SimHashIndex(self.max_distance)
+        index.add(fingerprints[rows], rows)
+        left, right, distances = index.self_pairs()
+
+        groups = np.asarray([segment.document_id for segment in segments], dtype=np.int64)
+        dup_keys = duplicate_keys([segment.content_hash for segment in segments])
+        keep = (groups[left] != groups[right]) & ~((dup_keys[left] == dup_keys[right]) & (dup_keys[left] >= 0))
+        return left[keep], right[keep], distances[keep]
+
+    def _historical_matches(self, segments: List[TextSegment], fingerprints: np.ndarray,
+                            rows: np.ndarray) -> List[DuplicateOutput]:
+        """
+        在历史语料中查找指纹近邻
+
+        排除本次请求中出现的文档ID（同一文档的旧版本），每个片段对同一历史文档只保留距离最小的一个片段
+        """
+        try:
+            query_index, matched_rows, distances = self.corpus_index.fingerprint_search(fingerprints[rows],
+                                                                                        self.max_distance)
+            historical = self.corpus_index.segments(matched_rows.tolist())
+        except Exception as e:
+            logger.error(f"SimHash历史语料查找失败: {e}")
+            return []
+
+        request_ids = {segment.document_id for segment in segments}
+        best = {}
+        for position in np.argsort(distances, kind="stable"):
+            record = historical.get(int(matched_rows[position]))
+            if record is None or record["document_id"] in request_ids:
+                continue
+            key = (int(rows[query_index[position]]), record["document_id"])
+            best.setdefault(key, (record, int(distances[position])))
+
+        return [
+            self._create_output(segments[segment_row], self._historical_segment(record), distance)
+            for (segment_row, _), (record, distance) in best.items()
+        ]
+
+    @staticmethod
+    def _historical_segment(record: dict) -> TextSegment:
+        return TextSegment(
+            id=record["segment_id"],
+            content=record["content"],
+            document_id=record["document_id"],
+            page=record["page"],
+            chunk_id=record["chunk_id"],
+            content_hash=record["content_hash"],
+            char_start=record["char_start"],
+            char_end=record["char_end"]
+        )
+
+    def _create_output(self, seg1: TextSegment, seg2: TextSegment, distance: int) -> DuplicateOutput:
+        """构造逐字复制结果，得分为指纹中相同位的比例"""
+        prefix1, suffix1 = extract_prefix_suffix(seg1.content)
+        prefix2, suffix2 = extract_prefix_suffix(seg2.content)
+        return DuplicateOutput(
+            documentId1=seg1.document_id,
+            page1=seg1.page,
+            chunkId1=seg1.chunk_id,
+            content1=seg1.content,
+            prefix1=prefix1,
+            suffix1=suffix1,
+            documentId2=seg2.document_id,
+            page2=seg2.page,
+            chunkId2=seg2.chunk_id,
+            content2=seg2.content,
+            prefix2=prefix2,
+            suffix2=suffix2,
+            reason=f"两个片段的SimHash指纹仅相差 {distance} 位，文本基本逐字相同 [SimHash指纹匹配]",
+            score=1.0 - distance / 64,
+            category=1
+        )
@@ -0,0 +1,39 @@
+"""
+嵌入向量模块
+包含可插拔的嵌入提供方，以及缓存、异步并发请求、跨请求微批合并、向量量化等基础设施
+"""
+
+from .cache import EmbeddingCache, get_embedding_cache
+from .engine import AsyncEmbeddingEngine, EmbeddingError, get_embedding_engine, estimate_tokens
+from .coalescer import EmbeddingCoalescer, get_embedding_coalescer
+from .quantization import (
+    QuantizedMatrix, quantize, quantized_similarity, rescore_pairs, truncate_embeddings,
+    encode_vector, decode_vector
+)
+from .providers import (
+    EmbeddingProvider, RemoteEmbeddingProvider, HashingEmbeddingProvider,
+    CachingEmbeddingProvider, get_embedding_provider
+)
+
+__all__ = [
+    'EmbeddingCache',
+    'get_embedding_cache',
+    'AsyncEmbeddingEngine',
+    'EmbeddingError',
+    'get_embedding_engine',
+    'estimate_tokens',
+    'EmbeddingCoalescer',
+    'get_embedding_coalescer',
+    'QuantizedMatrix',
+    'quantize',
+    'quantized_similarity',
+    'rescore_pairs',
+    'truncate_embeddings',
+    'encode_vector',
+    'decode_vector',
+    'EmbeddingProvider',
+    'RemoteEmbeddingProvider',
+    'HashingEmbeddingProvider',
+    'CachingEmbeddingProvider',
+    'get_embedding_provider'
+]
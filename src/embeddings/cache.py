@@ -0,0 +1,106 @@
+"""
+嵌入向量缓存
+以 (模型名, 维度, 规范化文本哈希) 为键，将向量持久化到磁盘，供所有工作进程共享；
+向量默认以float32存储，可选float16或int8有损压缩
+"""
+
+import hashlib
+import os
+import threading
+from typing import List, Optional, Dict
+
+import numpy as np
+
+from .quantization import encode_vector, decode_vector
+from ..utils.disk_cache import DiskLRUCache
+from ..utils.text_utils import normalize_text
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# 进程内按路径复用缓存实例
+_cache_instances: Dict[str, "EmbeddingCache"] = {}
+_cache_lock = threading.Lock()
+
+
+class EmbeddingCache:
+    """内容寻址的嵌入向量缓存"""
+
+    def __init__(self, path: str, max_entries: int = 500000, max_mb: int = 2048,
+                 quantization: str = "none"):
+        """
+        初始化嵌入缓存
+
+        Args:
+            path: 缓存数据库文件路径
+            max_entries: 最大缓存向量数
+            max_mb: 缓存最大占用空间(MB)
+            quantization: 向量存储格式，none(float32)、float16 或 int8
+        """
+        self.quantization = quantization
+        self.store = DiskLRUCache(
+            path=path,
+            max_entries=max_entries,
+            max_bytes=max_mb * 1024 * 1024,
+            table="embeddings"
+        )
+        logger.info(f"📦 嵌入缓存已启用: {path}, 上限 {max_entries} 条 / {max_mb}MB, 存储格式 {quantization}")
+
+    @staticmethod
+    def make_key(model: str, dimensions: int, text: str) -> str:
+        """生成缓存键"""
+        text_digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{dimensions}:{text_digest}"
+
+    def get_many(self, model: str, dimensions: int, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """批量查询，返回与texts对齐的结果，未命中的位置为None"""
+        keys = [self.make_key(model, dimensions, text) for text in texts]
+        found = self.store.get_many(keys)
+
+        results = []
+        for key in keys:
+            value = found.get(key)
+            if value is None:
+                results.append(None)
+                continue
+            # 长度与维度不匹配说明缓存内容已损坏，按未命中处理
+            results.append(decode_vector(value, dimensions))
+        return results
+
+    def put_many(self, model: str, dimensions: int, texts: List[str], vectors: List[Optional[np.ndarray]]):
+        """批量写入向量"""
+        items: Dict[str, bytes] = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                continue
+            items[self.make_key(model, dimensions, text)] = encode_vector(vector, self.quantization)
+        self.store.set_many(items)
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计"""
+        return self.store.stats()
+
+
+def get_embedding_cache(config) -> Optional[EmbeddingCache]:
+    """根据配置获取进程内共享的嵌入缓存实例，未启用时返回None"""
+    if not config.embedding_cache_enable:
+        return None
+
+    path = config.embedding_cache_path
+    if not os.path.isabs(path):
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        path = os.path.join(project_root, path)
+
+    with _cache_lock:
+        if path not in _cache_instances:
+            try:
+                _cache_instances[path] = EmbeddingCache(
+                    path=path,
+                    max_entries=config.embedding_cache_max_entries,
+                    max_mb=config.embedding_cache_max_mb,
+                    quantization=config.embedding_cache_quantization
+                )
+            except Exception as e:
+                logger.warning(f"嵌入缓存初始化失败，将不使用缓存: {e}")
+                return None
+        return _cache_instances[path]
@@ -0,0 +1,141 @@
+"""
+跨请求嵌入微批合并器
+收集进程内所有在途分析请求的嵌入需求，凑满N条文本或等待T毫秒后统一下发，再将结果分发回各调用方
+"""
+
+import asyncio
+import threading
+import time
+from typing import List, Optional, Tuple, Dict
+
+from .engine import AsyncEmbeddingEngine
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# 进程内按引擎复用合并器实例
+_coalescer_instances: Dict[int, "EmbeddingCoalescer"] = {}
+_coalescer_lock = threading.Lock()
+
+
+class EmbeddingCoalescer:
+    """运行在嵌入引擎事件循环上的微批合并器"""
+
+    def __init__(self, engine: AsyncEmbeddingEngine, max_batch_texts: int = 64, max_wait_ms: float = 20.0):
+        """
+        初始化合并器
+
+        Args:
+            engine: 实际发送请求的异步嵌入引擎
+            max_batch_texts: 待发送文本数达到该值时立即下发
+            max_wait_ms: 首个请求到达后的最长等待时间(毫秒)
+        """
+        self.engine = engine
+        self.max_batch_texts = max_batch_texts
+        self.max_wait_ms = max_wait_ms
+
+        # 以下状态只在引擎事件循环线程中访问，无需加锁
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_count = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.flush_count = 0
+        self.request_count = 0
+        self.text_count = 0
+        self.unique_text_count = 0
+
+    async def embed_async(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """登记一次嵌入需求，等待所在微批完成后返回与输入对齐的结果"""
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_count += len(texts)
+
+        if self._pending_count >= self.max_batch_texts:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """同步接口：供执行器线程调用"""
+        if not texts:
+            return []
+        return self.engine.run_coroutine(self.embed_async(texts))
+
+    def _flush(self):
+        """取出当前所有待发送请求并异步下发"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending, self._pending_count = self._pending, [], 0
+        if pending:
+            asyncio.ensure_future(self._dispatch(pending))
+
+    async def _dispatch(self, pending: List[Tuple[List[str], asyncio.Future]]):
+        """合并去重后统一请求，再按调用方拆分结果"""
+        start_time = time.time()
+
+        text_positions: Dict[str, int] = {}
+        unique_texts: List[str] = []
+        total_texts = 0
+        for texts, _ in pending:
+            total_texts += len(texts)
+            for text in texts:
+                if text not in text_positions:
+                    text_positions[text] = len(unique_texts)
+                    unique_texts.append(text)
+
+        try:
+            vectors = await self.engine.embed_async(unique_texts)
+        except Exception as e:
+            logger.error(f"合并嵌入批次失败: {e}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for texts, future in pending:
+            if not future.done():
+                future.set_result([vectors[text_positions[text]] for text in texts])
+
+        self.flush_count += 1
+        self.request_count += len(pending)
+        self.text_count += total_texts
+        self.unique_text_count += len(unique_texts)
+        elapsed = time.time() - start_time
+        logger.info(f"🧺 嵌入微批下发: 合并 {len(pending)} 个请求, {total_texts} 条文本 "
+                    f"(去重后 {len(unique_texts)} 条), 耗时 {elapsed:.2f}秒")
+
+    def stats(self) -> Dict[str, float]:
+        """合并效果统计"""
+        return {
+            "flushes": self.flush_count,
+            "requests": self.request_count,
+            "texts": self.text_count,
+            "unique_texts": self.unique_text_count,
+            "avg_requests_per_flush": self.request_count / self.flush_count if self.flush_count else 0.0,
+        }
+
+
+def get_embedding_coalescer(config, engine: AsyncEmbeddingEngine) -> Optional[EmbeddingCoalescer]:
+    """根据配置获取与引擎绑定的进程内合并器实例，未启用时返回None"""
+    if not config.embedding_coalesce_enable:
+        return None
+
+    with _coalescer_lock:
+        key = id(engine)
+        if key not in _coalescer_instances:
+            _coalescer_instances[key] = EmbeddingCoalescer(
+                engine=engine,
+                max_batch_texts=config.embedding_coalesce_max_texts,
+                max_wait_ms=config.embedding_coalesce_max_wait_ms
+            )
+            logger.info(f"🧺 嵌入微批合并器已启用: {config.embedding_coalesce_max_texts} 条 / "
+                        f"{config.embedding_coalesce_max_wait_ms}ms")
+        return _coalescer_instances[key]
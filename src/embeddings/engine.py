@@ -0,0 +1,240 @@
+"""
+异步嵌入引擎
+在独立事件循环上以有界并发调用嵌入API，使用连接池复用HTTP连接；
+瞬时错误按指数退避加抖动重试，输入错误通过二分批次隔离到单条文本
+"""
+
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from typing import List, Optional, Dict, Tuple
+
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+# 进程内按 (base_url, 模型, 维度) 复用引擎实例
+_engine_instances: Dict[Tuple[str, str, int], "AsyncEmbeddingEngine"] = {}
+_engine_lock = threading.Lock()
+
+
+class EmbeddingError(RuntimeError):
+    """嵌入生成失败"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的token数：中文字符按1个token计，其余字符按4个字符1个token计"""
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + math.ceil(other_count / 4)
+
+
+class AsyncEmbeddingEngine:
+    """有界并发的异步嵌入引擎，同步调用方可在任意线程中使用"""
+
+    def __init__(self, api_key: str, base_url: str, model: str, dimensions: int = 1024,
+                 max_concurrency: int = 8, max_batch_size: int = 10,
+                 max_batch_tokens: int = 8192, timeout: float = 60.0,
+                 max_retries: int = 3, retry_base_delay: float = 0.5, retry_max_delay: float = 8.0):
+        """
+        初始化引擎
+
+        Args:
+            api_key: API密钥
+            base_url: OpenAI兼容接口地址
+            model: 嵌入模型名
+            dimensions: 向量维度
+            max_concurrency: 同时在途的最大请求数
+            max_batch_size: 单个请求的最大文本数（DashScope限制为10）
+            max_batch_tokens: 单个请求的最大估计token数
+            timeout: 单个请求超时时间(秒)
+            max_retries: 瞬时错误的最大重试次数
+            retry_base_delay: 首次重试的退避基数(秒)
+            retry_max_delay: 单次退避的上限(秒)
+        """
+        self.model = model
+        self.dimensions = dimensions
+        self.max_concurrency = max_concurrency
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        # 重试由引擎统一控制，关闭SDK内置重试
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_concurrency * 2,
+                    max_keepalive_connections=max_concurrency
+                ),
+                timeout=timeout
+            )
+        )
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动引擎专用的后台事件循环线程（连接池与信号量都绑定在该循环上）"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name=f"embedding-engine-{self.model}",
+                    daemon=True
+                )
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """按文本数与估计token数将文本顺序打包成批次，返回每批的原始下标"""
+        batches = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for idx, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.max_batch_size or
+                            current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(idx)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _embed_batch(self, batch_texts: List[str]) -> List[List[float]]:
+        """发送单个批次请求，受并发信号量约束"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            response = await self.client.embeddings.create(
+                model=self.model,
+                input=batch_texts,
+                dimensions=self.dimensions,
+                encoding_format="float"
+            )
+        return [item.embedding for item in response.data]
+
+    @staticmethod
+    def _is_retryable(error: BaseException) -> bool:
+        """限流、超时、连接错误和服务端5xx属于瞬时错误，值得重试"""
+        if isinstance(error, (openai.APIConnectionError, openai.RateLimitError,
+                              openai.InternalServerError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code >= 500
+        return False
+
+    async def _embed_with_retry(self, batch_texts: List[str]) -> List[List[float]]:
+        """发送批次请求，瞬时错误按指数退避加全抖动重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._embed_batch(batch_texts)
+            except Exception as e:
+                if not self._is_retryable(e) or attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+                logger.warning(f"嵌入批次瞬时错误 ({len(batch_texts)} 条文本)，{delay:.2f}秒后第 {attempt + 1} 次重试: {e}")
+                await asyncio.sleep(delay)
+
+    async def _embed_resilient(self, batch_texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        容错地嵌入一个批次
+
+        非瞬时错误（通常是某条输入不合法）时将批次一分为二分别重试，直到定位到单条失败文本；
+        瞬时错误重试耗尽时整批标记为失败。失败位置返回None
+        """
+        try:
+            return await self._embed_with_retry(batch_texts)
+        except Exception as e:
+            if len(batch_texts) == 1 or self._is_retryable(e):
+                logger.error(f"嵌入失败，标记 {len(batch_texts)} 条文本为失败: {e}")
+                return [None] * len(batch_texts)
+
+            mid = len(batch_texts) // 2
+            logger.warning(f"嵌入批次失败 ({len(batch_texts)} 条文本)，二分隔离问题输入: {e}")
+            left, right = await asyncio.gather(
+                self._embed_resilient(batch_texts[:mid]),
+                self._embed_resilient(batch_texts[mid:])
+            )
+            return left + right
+
+    async def embed_async(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        并发嵌入所有文本，结果与输入顺序一致
+
+        最终失败的文本对应位置返回None，作为失败标记交由调用方处理
+        """
+        if not texts:
+            return []
+
+        start_time = time.time()
+        batches = self.pack_batches(texts)
+        batch_results = await asyncio.gather(
+            *[self._embed_resilient([texts[idx] for idx in batch]) for batch in batches]
+        )
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, batch_result in zip(batches, batch_results):
+            for idx, embedding in zip(batch, batch_result):
+                results[idx] = embedding
+
+        failed_count = sum(1 for embedding in results if embedding is None)
+        elapsed = time.time() - start_time
+        logger.info(f"⚡ 异步嵌入完成: {len(texts)} 条文本, {len(batches)} 个批次 "
+                    f"(并发上限 {self.max_concurrency}), 失败 {failed_count} 条, 耗时 {elapsed:.2f}秒")
+        return results
+
+    def run_coroutine(self, coro):
+        """在引擎事件循环上执行协程并阻塞等待结果，供同步线程调用"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """同步接口：在引擎事件循环上执行并等待结果"""
+        if not texts:
+            return []
+        return self.run_coroutine(self.embed_async(texts))
+
+
+def get_embedding_engine(config, dimensions: int = 1024) -> AsyncEmbeddingEngine:
+    """根据配置获取进程内共享的嵌入引擎实例"""
+    key = (config.openai_base_url, config.embedding_model_name, dimensions)
+    with _engine_lock:
+        if key not in _engine_instances:
+            _engine_instances[key] = AsyncEmbeddingEngine(
+                api_key=config.openai_api_key,
+                base_url=config.openai_base_url,
+                model=config.embedding_model_name,
+                dimensions=dimensions,
+                max_concurrency=config.embedding_max_concurrency,
+                max_batch_size=config.embedding_batch_size,
+                max_batch_tokens=config.embedding_batch_max_tokens,
+                timeout=config.embedding_timeout,
+                max_retries=config.embedding_max_retries,
+                retry_base_delay=config.embedding_retry_base_delay,
+                retry_max_delay=config.embedding_retry_max_delay
+            )
+            logger.info(f"🚀 异步嵌入引擎已初始化: 模型 {config.embedding_model_name}, "
+                        f"并发上限 {config.embedding_max_concurrency}")
+        return _engine_instances[key]
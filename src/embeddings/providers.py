@@ -0,0 +1,166 @@
+"""
+嵌入提供方
+定义统一的嵌入接口，支持远程OpenAI兼容接口与本地CPU实现，通过配置 EMBEDDING_PROVIDER 选择
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional, Dict, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from .cache import EmbeddingCache, get_embedding_cache
+from .engine import AsyncEmbeddingEngine, get_embedding_engine
+from .coalescer import EmbeddingCoalescer, get_embedding_coalescer
+from ..utils.text_utils import normalize_text
+from ..utils.unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# 进程内按 (提供方类型, 维度) 复用实例
+_provider_instances: Dict[Tuple[str, int], "EmbeddingProvider"] = {}
+_provider_lock = threading.Lock()
+
+
+class EmbeddingProvider(ABC):
+    """嵌入提供方接口"""
+
+    model_name: str
+    dimensions: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        嵌入文本
+
+        Returns:
+            与输入对齐的float32向量列表，获取失败的位置为None
+        """
+
+
+class RemoteEmbeddingProvider(EmbeddingProvider):
+    """远程OpenAI兼容嵌入接口（DashScope等）"""
+
+    def __init__(self, engine: AsyncEmbeddingEngine, coalescer: Optional[EmbeddingCoalescer] = None):
+        self.engine = engine
+        self.coalescer = coalescer
+        self.model_name = engine.model
+        self.dimensions = engine.dimensions
+
+    def embed(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if not texts:
+            return []
+        if self.coalescer is not None:
+            fetched = self.coalescer.embed(texts)
+        else:
+            fetched = self.engine.embed(texts)
+        return [np.asarray(vector, dtype=np.float32) if vector is not None else None for vector in fetched]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    本地字符n-gram哈希向量化
+
+    纯CPU计算、无需加载模型、无网络开销，输出固定维度的L2归一化float32向量。
+    语义能力弱于远程模型，但对逐字或近似逐字的复制非常敏感，适合离线运行、压测与小请求
+    """
+
+    def __init__(self, dimensions: int = 1024, ngram_range: Tuple[int, int] = (1, 3)):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.model_name = f"local-char-hashing-{ngram_range[0]}-{ngram_range[1]}"
+        # murmurhash与进程无关，不同工作进程得到的向量一致，可共享缓存
+        self.vectorizer = HashingVectorizer(
+            analyzer="char",
+            ngram_range=ngram_range,
+            n_features=dimensions,
+            alternate_sign=True,
+            norm="l2",
+            dtype=np.float32
+        )
+
+    def embed(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if not texts:
+            return []
+        matrix = self.vectorizer.transform([normalize_text(text) for text in texts]).toarray()
+        return list(matrix.astype(np.float32, copy=False))
+
+
+class CachingEmbeddingProvider(EmbeddingProvider):
+    """为任意提供方增加请求内去重与磁盘缓存"""
+
+    def __init__(self, provider: EmbeddingProvider, cache: Optional[EmbeddingCache] = None):
+        self.provider = provider
+        self.cache = cache
+        self.model_name = provider.model_name
+        self.dimensions = provider.dimensions
+
+    def embed(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if not texts:
+            return []
+
+        # 规范化后相同的文本只嵌入一次
+        unique_positions: Dict[str, int] = {}
+        unique_texts: List[str] = []
+        text_slots = []
+        for text in texts:
+            key = normalize_text(text)
+            if key not in unique_positions:
+                unique_positions[key] = len(unique_texts)
+                unique_texts.append(text)
+            text_slots.append(unique_positions[key])
+
+        unique_embeddings = self._embed_unique_texts(unique_texts)
+        return [unique_embeddings[slot] for slot in text_slots]
+
+    def _embed_unique_texts(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """嵌入互不相同的文本，优先读取缓存"""
+        if self.cache is not None:
+            all_embeddings = self.cache.get_many(self.model_name, self.dimensions, texts)
+        else:
+            all_embeddings = [None] * len(texts)
+
+        missing_indices = [i for i, embedding in enumerate(all_embeddings) if embedding is None]
+        if self.cache is not None:
+            logger.info(f"📦 嵌入缓存命中 {len(texts) - len(missing_indices)}/{len(texts)}")
+        if not missing_indices:
+            return all_embeddings
+
+        missing_texts = [texts[idx] for idx in missing_indices]
+        fetched = self.provider.embed(missing_texts)
+        for idx, embedding in zip(missing_indices, fetched):
+            all_embeddings[idx] = embedding
+
+        if self.cache is not None:
+            self.cache.put_many(self.model_name, self.dimensions, missing_texts, fetched)
+
+        return all_embeddings
+
+
+def get_embedding_provider(config, dimensions: int = 1024) -> EmbeddingProvider:
+    """
+    根据配置获取进程内共享的嵌入提供方（已包含去重与缓存）
+
+    EMBEDDING_PROVIDER:
+        openai  - 远程OpenAI兼容接口（默认）
+        hashing - 本地字符n-gram哈希向量化
+    """
+    provider_type = config.embedding_provider
+    key = (provider_type, dimensions)
+
+    with _provider_lock:
+        if key not in _provider_instances:
+            if provider_type == "hashing":
+                base_provider: EmbeddingProvider = HashingEmbeddingProvider(dimensions=dimensions)
+            else:
+                if provider_type != "openai":
+                    logger.warning(f"未知的嵌入提供方 {provider_type}，使用远程openai接口")
+                engine = get_embedding_engine(config, dimensions=dimensions)
+                base_provider = RemoteEmbeddingProvider(engine, get_embedding_coalescer(config, engine))
+
+            # 本地计算比查询磁盘缓存更快，只为远程提供方启用缓存
+            cache = get_embedding_cache(config) if provider_type != "hashing" else None
+            _provider_instances[key] = CachingEmbeddingProvider(base_provider, cache)
+            logger.info(f"🧩 嵌入提供方: {provider_type} ({base_provider.model_name}, {dimensions}维)")
+        return _provider_instances[key]
@@ -0,0 +1,144 @@
+"""
+嵌入向量量化
+支持float16与逐向量缩放的int8两种压缩格式、向量前缀截断，以及在量化矩阵上分块计算相似度，
+用于压缩嵌入缓存与粗排向量矩阵的内存占用；量化矩阵按块还原为float32后交给BLAS，
+计算量与全精度相同，粗排候选再以全精度重新打分
+"""
+
+from typing import Optional
+
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+
+# int8编码：每个向量一个float32缩放系数，码值范围[-127, 127]
+_INT8_MAX = 127.0
+
+
+class QuantizedMatrix:
+    """量化后的向量矩阵"""
+
+    __slots__ = ("codes", "scales", "mode")
+
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray], mode: str):
+        self.codes = codes
+        self.scales = scales
+        self.mode = mode
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def select(self, index) -> "QuantizedMatrix":
+        """按切片或行号数组取出部分行，切片时不复制数据"""
+        scales = self.scales[index] if self.scales is not None else None
+        return QuantizedMatrix(self.codes[index], scales, self.mode)
+    
+    def dequantize(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """将 [start, stop) 行还原为float32矩阵（未量化时直接返回视图，调用方不应原地修改）"""
+        if self.scales is None:
+            return self.codes[start:stop].astype(np.float32, copy=False)
+        block = self.codes[start:stop].astype(np.float32)
+        block *= self.scales[start:stop, None]
+        return block
+
+
+def quantize(matrix: np.ndarray, mode: str) -> QuantizedMatrix:
+    """
+    量化向量矩阵
+
+    Args:
+        matrix: 形状为 (n, d) 的向量矩阵
+        mode: none（保持float32）、float16 或 int8（逐向量按最大绝对值缩放）
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if mode == "float16":
+        return QuantizedMatrix(matrix.astype(np.float16), None, mode)
+    if mode == "int8":
+        scales = np.abs(matrix).max(axis=1) / _INT8_MAX
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return QuantizedMatrix(codes, scales.astype(np.float32), mode)
+    if mode != "none":
+        raise ValueError(f"不支持的量化格式: {mode}")
+    return QuantizedMatrix(matrix, None, mode)
+
+
+def quantized_similarity(left: QuantizedMatrix, right: Optional[QuantizedMatrix] = None,
+                         block_size: int = 2048) -> np.ndarray:
+    """
+    分块计算两个量化矩阵的内积相似度
+
+    每次只将一个行块还原为float32交给BLAS计算，不需要常驻全精度向量矩阵，但计算量与全精度相同；
+    量化模式下结果仅用于粗排，最终得分应由rescore_pairs以全精度给出
+    """
+    if right is None:
+        right = left
+
+    n_left, n_right = left.shape[0], right.shape[0]
+    result = np.empty((n_left, n_right), dtype=np.float32)
+
+    for right_start in range(0, n_right, block_size):
+        right_stop = min(right_start + block_size, n_right)
+        right_block = right.dequantize(right_start, right_stop)
+        for left_start in range(0, n_left, block_size):
+            left_stop = min(left_start + block_size, n_left)
+            left_block = left.dequantize(left_start, left_stop)
+            result[left_start:left_stop, right_start:right_stop] = left_block @ right_block.T
+
+    return result
+
+
+def truncate_embeddings(matrix: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    截取向量前dimensions维并重新L2归一化
+
+    Matryoshka式训练的嵌入模型（如text-embedding-v4）前缀仍保留主要语义，可用于低成本粗排
+    """
+    prefix = np.ascontiguousarray(matrix[:, :dimensions], dtype=np.float32)
+    norms = np.linalg.norm(prefix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return prefix / norms
+
+
+def rescore_pairs(embeddings: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """以全精度重新计算若干 (left[k], right[k]) 行对的内积"""
+    if len(left) == 0:
+        return np.empty(0, dtype=np.float32)
+    return np.einsum("ij,ij->i", embeddings[left], embeddings[right])
+
+
+def encode_vector(vector: np.ndarray, mode: str) -> bytes:
+    """
+    将单个向量编码为字节串
+
+    float32: 4d字节；float16: 2d字节；int8: 4字节缩放系数 + d字节码值
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    if mode == "float16":
+        return vector.astype(np.float16).tobytes()
+    if mode == "int8":
+        quantized = quantize(vector[None, :], "int8")
+        return quantized.scales.tobytes() + quantized.codes.tobytes()
+    return vector.tobytes()
+
+
+def decode_vector(blob: bytes, dimensions: int) -> Optional[np.ndarray]:
+    """
+    按字节长度识别编码格式并还原为float32向量，长度不匹配任何格式时返回None
+
+    维度大于4时三种格式的长度互不相同，旧版本写入的float32缓存可以直接读取
+    """
+    size = len(blob)
+    if size == dimensions * 4:
+        return np.frombuffer(blob, dtype=np.float32).copy()
+    if size == dimensions * 2:
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if size == dimensions + 4:
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    return None
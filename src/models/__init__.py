@@ -5,11 +5,14 @@
 
 from .api_models import DocumentInput, DuplicateOutput, ApiResponse
 from .data_models import TextSegment, DocumentData
+from .segment_store import SegmentStore, SegmentView
 
 __all__ = [
     'DocumentInput',
     'DuplicateOutput', 
     'ApiResponse',
     'TextSegment',
-    'DocumentData'
+    'DocumentData',
+    'SegmentStore',
+    'SegmentView'
 ]
@@ -4,7 +4,7 @@
 """
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 
 
 @dataclass
@@ -15,8 +15,12 @@ class TextSegment:
     document_id: int
     page: int
     chunk_id: int
-    embedding: Optional[List[float]] = None
+    embedding: Optional[Sequence[float]] = None  # float32向量，通常是列式存储矩阵中的一行
     cluster_id: Optional[int] = None
+    content_hash: Optional[str] = None  # 规范化文本的哈希，用于精确重复判断
+    char_start: Optional[int] = None  # 片段在所属文档合并文本中的起始偏移
+    char_end: Optional[int] = None  # 片段在所属文档合并文本中的结束偏移（不含）
+    segment_cache_key: Optional[str] = None  # 所属文档的分割缓存条目尚缺向量时为条目键，嵌入后写回
 
 
 @dataclass
@@ -0,0 +1,234 @@
+"""
+列式片段存储
+以连续的float32矩阵保存所有片段的嵌入向量，文档/页码/片段编号保存在整数数组中，
+各处理阶段之间只传递行号，按需通过轻量视图访问单个片段
+"""
+
+from typing import List, Optional, Iterator, Iterable
+
+import numpy as np
+
+from .data_models import TextSegment
+
+
+class SegmentView:
+    """片段视图，提供与TextSegment一致的属性（仅cluster_id与content_hash可写），不复制任何数据"""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: "SegmentStore", row: int):
+        self.store = store
+        self.row = row
+
+    @property
+    def id(self) -> str:
+        return self.store.ids[self.row]
+
+    @property
+    def content(self) -> str:
+        return self.store.contents[self.row]
+
+    @property
+    def document_id(self) -> int:
+        return int(self.store.doc_ids[self.row])
+
+    @property
+    def page(self) -> int:
+        return int(self.store.pages[self.row])
+
+    @property
+    def chunk_id(self) -> int:
+        return int(self.store.chunk_ids[self.row])
+
+    @property
+    def content_hash(self) -> Optional[str]:
+        return self.store.content_hashes[self.row]
+
+    @content_hash.setter
+    def content_hash(self, value: Optional[str]):
+        self.store.content_hashes[self.row] = value
+
+    @property
+    def char_start(self) -> Optional[int]:
+        char_start = int(self.store.char_starts[self.row])
+        return char_start if char_start >= 0 else None
+
+    @property
+    def char_end(self) -> Optional[int]:
+        char_end = int(self.store.char_ends[self.row])
+        return char_end if char_end >= 0 else None
+
+    @property
+    def embedding(self) -> Optional[np.ndarray]:
+        """嵌入向量（矩阵行的视图），尚未嵌入时为None"""
+        if not self.store.has_embedding[self.row]:
+            return None
+        return self.store.embeddings[self.row]
+
+    @property
+    def cluster_id(self) -> Optional[int]:
+        cluster_id = int(self.store.cluster_ids[self.row])
+        return cluster_id if cluster_id >= 0 else None
+
+    @cluster_id.setter
+    def cluster_id(self, value: Optional[int]):
+        self.store.cluster_ids[self.row] = -1 if value is None else value
+
+    def __repr__(self) -> str:
+        return f"SegmentView(row={self.row}, id={self.id!r})"
+
+
+class SegmentStore:
+    """列式片段存储"""
+
+    def __init__(self, dimensions: int, capacity: int = 64):
+        """
+        初始化存储
+
+        Args:
+            dimensions: 嵌入向量维度
+            capacity: 初始容量，追加超出时按倍数扩容
+        """
+        self.dimensions = dimensions
+        self._size = 0
+
+        self.ids: List[str] = []
+        self.contents: List[str] = []
+        self.content_hashes: List[Optional[str]] = []
+
+        capacity = max(capacity, 1)
+        self.doc_ids = np.zeros(capacity, dtype=np.int64)
+        self.pages = np.zeros(capacity, dtype=np.int32)
+        self.chunk_ids = np.zeros(capacity, dtype=np.int32)
+        self.char_starts = np.full(capacity, -1, dtype=np.int64)
+        self.char_ends = np.full(capacity, -1, dtype=np.int64)
+        self.cluster_ids = np.full(capacity, -1, dtype=np.int32)
+        self.has_embedding = np.zeros(capacity, dtype=bool)
+        self._embeddings = np.zeros((capacity, dimensions), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[SegmentView]:
+        return (SegmentView(self, row) for row in range(self._size))
+
+    def __getitem__(self, row: int) -> SegmentView:
+        if row < 0 or row >= self._size:
+            raise IndexError(f"片段行号越界: {row}")
+        return SegmentView(self, row)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """有效行的嵌入矩阵（视图）"""
+        return self._embeddings[:self._size]
+
+    def _grow(self, required: int):
+        """扩容到至少required行"""
+        capacity = self._embeddings.shape[0]
+        if required <= capacity:
+            return
+        new_capacity = max(required, capacity * 2)
+
+        def grow_array(array: np.ndarray, fill=0) -> np.ndarray:
+            grown = np.full((new_capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:capacity] = array
+            return grown
+
+        self.doc_ids = grow_array(self.doc_ids)
+        self.pages = grow_array(self.pages)
+        self.chunk_ids = grow_array(self.chunk_ids)
+        self.char_starts = grow_array(self.char_starts, fill=-1)
+        self.char_ends = grow_array(self.char_ends, fill=-1)
+        self.cluster_ids = grow_array(self.cluster_ids, fill=-1)
+        self.has_embedding = grow_array(self.has_embedding, fill=False)
+        self._embeddings = grow_array(self._embeddings)
+
+    def append(self, segment_id: str, content: str, document_id: int, page: int, chunk_id: int,
+               embedding: Optional[Iterable[float]] = None, content_hash: Optional[str] = None,
+               char_start: Optional[int] = None, char_end: Optional[int] = None) -> int:
+        """追加一个片段，返回其行号"""
+        row = self._size
+        self._grow(row + 1)
+
+        self.ids.append(segment_id)
+        self.contents.append(content)
+        self.content_hashes.append(content_hash)
+        self.doc_ids[row] = document_id
+        self.pages[row] = page
+        self.chunk_ids[row] = chunk_id
+        self.char_starts[row] = -1 if char_start is None else char_start
+        self.char_ends[row] = -1 if char_end is None else char_end
+        if embedding is not None:
+            self._embeddings[row] = np.asarray(embedding, dtype=np.float32)
+            self.has_embedding[row] = True
+
+        self._size += 1
+        return row
+
+    def append_segment(self, segment: TextSegment) -> int:
+        """追加一个TextSegment"""
+        return self.append(
+            segment_id=segment.id,
+            content=segment.content,
+            document_id=segment.document_id,
+            page=segment.page,
+            chunk_id=segment.chunk_id,
+            embedding=segment.embedding,
+            content_hash=segment.content_hash,
+            char_start=segment.char_start,
+            char_end=segment.char_end
+        )
+
+    @classmethod
+    def from_segments(cls, segments: List[TextSegment], dimensions: Optional[int] = None) -> "SegmentStore":
+        """由TextSegment列表构建存储，维度缺省时取自第一个已有向量"""
+        if dimensions is None:
+            first = next((seg.embedding for seg in segments if seg.embedding is not None), None)
+            dimensions = len(first) if first is not None else 1024
+
+        store = cls(dimensions=dimensions, capacity=len(segments))
+        for segment in segments:
+            store.append_segment(segment)
+        return store
+
+    def set_embeddings(self, rows: Iterable[int], vectors: Iterable[Optional[Iterable[float]]]):
+        """将向量写入指定行，None表示该行没有向量"""
+        for row, vector in zip(rows, vectors):
+            if vector is None:
+                self.has_embedding[row] = False
+                continue
+            self._embeddings[row] = np.asarray(vector, dtype=np.float32)
+            self.has_embedding[row] = True
+
+    def embedded_rows(self) -> np.ndarray:
+        """持有嵌入向量的行号"""
+        return np.flatnonzero(self.has_embedding[:self._size])
+
+    def normalized_embeddings(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """返回L2归一化后的嵌入矩阵（新数组），rows缺省时为全部有效行"""
+        matrix = self.embeddings if rows is None else self._embeddings[rows]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32, copy=False)
+
+    def views(self, rows: Iterable[int]) -> List[SegmentView]:
+        """按行号获取片段视图"""
+        return [SegmentView(self, int(row)) for row in rows]
+
+    def to_segments(self) -> List[TextSegment]:
+        """导出为TextSegment列表"""
+        return [
+            TextSegment(
+                id=view.id,
+                content=view.content,
+                document_id=view.document_id,
+                page=view.page,
+                chunk_id=view.chunk_id,
+                embedding=view.embedding.copy() if view.embedding is not None else None,
+                cluster_id=view.cluster_id,
+                content_hash=view.content_hash,
+                char_start=view.char_start,
+                char_end=view.char_end
+            )
+            for view in self
+        ]
@@ -0,0 +1,208 @@
+"""
+磁盘LRU缓存
+基于SQLite实现，可被同一台机器上的多个uvicorn/gunicorn工作进程共享；
+条目数与总大小由触发器增量维护，淘汰判断不扫描全表；命中时只刷新较久未刷新的访问时间，读路径通常不写库
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .unified_logger import UnifiedLogger
+
+logger = UnifiedLogger.get_logger(__name__)
+
+# SQLite单条语句的参数数量有上限，批量查询时分块处理
+_SQLITE_BATCH_SIZE = 500
+
+# 命中项的访问时间距今超过该秒数才刷新，LRU顺序按此粒度近似
+_ACCESS_REFRESH_SECONDS = 60.0
+
+
+class DiskLRUCache:
+    """基于SQLite的键值缓存，按最近访问时间(LRU)与总大小淘汰"""
+
+    def __init__(self, path: str, max_entries: int = 500000, max_bytes: int = 2 * 1024 ** 3,
+                 table: str = "cache"):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite数据库文件路径
+            max_entries: 最大条目数
+            max_bytes: 值的最大总字节数
+            table: 表名，同一个数据库文件可承载多个缓存
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.table = table
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        # 建表与统计初始化在同一个写事务中完成，多个进程同时启动时只有一个进行初始化
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access ON {self.table}(last_access)")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table}_totals ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        # 已有缓存库首次升级时统计一次全表
+        conn.execute(
+            f"INSERT OR IGNORE INTO {self.table}_totals (id, entries, bytes) "
+            f"SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+        )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {self.table}_totals_insert AFTER INSERT ON {self.table} BEGIN "
+            f"UPDATE {self.table}_totals SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 0; END"
+        )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {self.table}_totals_delete AFTER DELETE ON {self.table} BEGIN "
+            f"UPDATE {self.table}_totals SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 0; END"
+        )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {self.table}_totals_update AFTER UPDATE OF size ON {self.table} BEGIN "
+            f"UPDATE {self.table}_totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（SQLite连接不能跨线程共享）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL模式允许多进程并发读，写操作互不阻塞读
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """批量读取，返回命中的键值；命中项的访问时间超过 _ACCESS_REFRESH_SECONDS 未刷新时才写回"""
+        if not keys:
+            return {}
+
+        found = {}
+        try:
+            conn = self._connection()
+            unique_keys = list(dict.fromkeys(keys))
+            now = time.time()
+            stale = []
+            for i in range(0, len(unique_keys), _SQLITE_BATCH_SIZE):
+                batch = unique_keys[i:i + _SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, value, last_access FROM {self.table} WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, value, last_access in rows:
+                    found[key] = value
+                    if now - last_access > _ACCESS_REFRESH_SECONDS:
+                        stale.append(key)
+
+            if stale:
+                conn.executemany(
+                    f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in stale]
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"磁盘缓存读取失败: {e}")
+            found = {}
+
+        with self._stats_lock:
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+
+        return found
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取单个键"""
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: Dict[str, bytes]):
+        """批量写入，写入后按需淘汰"""
+        if not items:
+            return
+
+        try:
+            conn = self._connection()
+            now = time.time()
+            # 以UPSERT覆盖已有键：REPLACE的隐式删除不触发删除触发器，会使统计失准
+            conn.executemany(
+                f"INSERT INTO {self.table} (key, value, size, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "last_access = excluded.last_access",
+                [(key, value, len(value), now) for key, value in items.items()]
+            )
+            conn.commit()
+            self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"磁盘缓存写入失败: {e}")
+
+    def set(self, key: str, value: bytes):
+        """写入单个键"""
+        self.set_many({key: value})
+
+    def _evict(self, conn: sqlite3.Connection):
+        """超出条目数或总大小限制时，淘汰最久未访问的条目"""
+        count, total_bytes = self._totals(conn)
+
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        # 淘汰到上限的90%，避免每次写入都触发淘汰
+        target_entries = int(self.max_entries * 0.9)
+        target_bytes = int(self.max_bytes * 0.9)
+        excess_entries = max(0, count - target_entries)
+        if total_bytes > target_bytes and count > 0:
+            avg_size = total_bytes / count
+            excess_entries = max(excess_entries, int((total_bytes - target_bytes) / avg_size) + 1)
+
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN "
+            f"(SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?)",
+            (excess_entries,)
+        )
+        conn.commit()
+
+        with self._stats_lock:
+            self.evictions += excess_entries
+        logger.info(f"🧹 磁盘缓存 {self.table} 淘汰 {excess_entries} 条记录 (原有 {count} 条, {total_bytes / 1024 / 1024:.1f}MB)")
+
+    def _totals(self, conn: sqlite3.Connection):
+        """触发器维护的 (条目数, 总字节数)"""
+        return conn.execute(f"SELECT entries, bytes FROM {self.table}_totals WHERE id = 0").fetchone()
+
+    def stats(self) -> Dict[str, float]:
+        """返回当前进程的命中统计以及缓存的总体规模"""
+        entries, total_bytes = 0, 0
+        try:
+            entries, total_bytes = self._totals(self._connection())
+        except sqlite3.Error as e:
+            logger.warning(f"磁盘缓存统计失败: {e}")
+
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_mb": total_bytes / 1024 / 1024,
+            }
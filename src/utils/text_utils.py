@@ -3,7 +3,76 @@
 """
 
 import re
-from typing import Tuple, Optional
+import hashlib
+from typing import Tuple, Optional, List, Union
+
+import numpy as np
+
+# 字符n-gram滚动哈希使用的奇数常数
+_SHINGLE_BASE = np.uint64(0x100000001B3)
+_SHINGLE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_text(content: str) -> str:
+    """
+    规范化文本：去除首尾空白，并将连续空白折叠为单个空格
+    
+    用于内容寻址（缓存键、重复判断），不改变文本的实际字符
+    """
+    if not content:
+        return ""
+    return re.sub(r'\s+', ' ', content).strip()
+
+
+def content_hash(content: str) -> str:
+    """计算规范化文本的SHA-256摘要"""
+    return hashlib.sha256(normalize_text(content).encode('utf-8')).hexdigest()
+
+
+def char_shingle_hashes(content: str, size: int = 3, unique: bool = True) -> np.ndarray:
+    """
+    去除全部空白后的字符n-gram集合，以64位哈希值的去重数组表示
+    
+    文本短于size时整段作为一个n-gram，空文本返回空数组；unique为False时按出现顺序保留重复的n-gram（用于词频）
+    """
+    text = re.sub(r'\s+', '', content or "")
+    if not text:
+        return np.empty(0, dtype=np.uint64)
+    
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    width = min(max(1, size), len(codes))
+    hashes = np.zeros(len(codes) - width + 1, dtype=np.uint64)
+    for offset in range(width):
+        hashes = hashes * _SHINGLE_BASE + codes[offset:len(codes) - width + 1 + offset]
+    # 乘法后再做一次异或移位，使低位也充分混合
+    hashes = hashes * _SHINGLE_MIX
+    hashes ^= hashes >> np.uint64(31)
+    return np.unique(hashes) if unique else hashes
+
+
+def split_with_spans(text: str, pattern: Union[str, "re.Pattern"]) -> List[Tuple[str, int, int]]:
+    """
+    与re.split结果一致地切分文本，同时返回每段在原文中的 [start, end) 偏移
+    
+    Returns:
+        [(片段文本, 起始偏移, 结束偏移), ...]，片段文本等于 text[start:end]
+    """
+    pieces = []
+    previous_end = 0
+    for match in re.finditer(pattern, text):
+        pieces.append((text[previous_end:match.start()], previous_end, match.start()))
+        previous_end = match.end()
+    pieces.append((text[previous_end:], previous_end, len(text)))
+    return pieces
+
+
+def trim_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """收缩 [start, end) 区间，去掉两端的空白字符"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
 
 
 def extract_prefix_suffix(content: str, n: int = 10) -> Tuple[str, str]:
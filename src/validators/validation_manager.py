@@ -31,6 +31,7 @@ from ..models.api_models import DuplicateOutput
 from ..models.data_models import DocumentData
 from ..utils.text_utils import extract_prefix_suffix
 from ..config.config import Config
+from ..embeddings.providers import get_embedding_provider
 from ..utils.unified_logger import UnifiedLogger
 
 logger = UnifiedLogger.get_logger(__name__)
@@ -71,23 +72,14 @@ class ValidationManager:
         self._init_embedding_model()
     
     def _init_embedding_model(self):
-        """初始化embedding模型"""
+        """初始化embedding模型（与document_processor共享配置选定的嵌入提供方和缓存）"""
         try:
-            # 使用与document_processor相同的OpenAI client方式
-            from openai import OpenAI
-            
-            if self.config.openai_api_key:
-                os.environ['OPENAI_API_KEY'] = self.config.openai_api_key
-            
-            self.client = OpenAI(
-                api_key=self.config.openai_api_key,
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-            )
-            self.embedding_model_name = self.config.embedding_model_name
-            logger.info("📊 OpenAI客户端已初始化")
+            self.embedding_provider = get_embedding_provider(self.config, dimensions=1024)
+            self.embedding_model_name = self.embedding_provider.model_name
+            logger.info(f"📊 嵌入提供方已初始化: {self.embedding_model_name}")
         except Exception as e:
-            logger.warning(f"OpenAI客户端初始化失败: {e}")
-            self.client = None
+            logger.warning(f"嵌入提供方初始化失败: {e}")
+            self.embedding_provider = None
             self.embedding_model_name = None
     
     def boyer_moore_search(self, pattern: str, text: str) -> List[int]:
@@ -307,7 +299,7 @@ class ValidationManager:
         Returns:
             Tuple[bool, float]: (是否通过验证, 相似度分数)
         """
-        if not self.client or not self.embedding_model_name:
+        if not self.embedding_provider:
             logger.warning("向量模型未初始化，跳过向量相似度验证")
             return True, 0.0
         
@@ -341,17 +333,11 @@ class ValidationManager:
             texts = [clean_text1, clean_text2]
             logger.debug(f"准备计算向量相似度，文本长度: {len(clean_text1)}, {len(clean_text2)}")
             
-            # 使用OpenAI client直接调用
-            response = self.client.embeddings.create(
-                model=self.embedding_model_name,
-                input=texts,
-                dimensions=1024,
-                encoding_format="float"
-            )
-            
-            embeddings = [item.embedding for item in response.data]
-            vec1 = np.array(embeddings[0])
-            vec2 = np.array(embeddings[1])
+            embeddings = self.embedding_provider.embed(texts)
+            if embeddings[0] is None or embeddings[1] is None:
+                raise RuntimeError("嵌入向量获取失败")
+            vec1 = np.asarray(embeddings[0], dtype=np.float64)
+            vec2 = np.asarray(embeddings[1], dtype=np.float64)
             
             # 计算余弦相似度
             if self.use_gpu and cp is not None:
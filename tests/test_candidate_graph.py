@@ -0,0 +1,109 @@
+"""
+候选图分组测试：组大小不超过上限，小分量与不限大小的连通分量一致，超大分量沿最强边切分
+"""
+
+import numpy as np
+import pytest
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from src.core.candidate_graph import group_candidates
+from src.core.clustering_manager import ClusteringManager
+from src.core.minhash_lsh import MinHashLSH
+from src.detectors.near_duplicate_detector import NearDuplicateDetector
+from src.models.segment_store import SegmentStore
+
+
+def random_edges(nodes: int = 200, edges: int = 400, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    left = rng.integers(0, nodes, edges)
+    right = rng.integers(0, nodes, edges)
+    weights = rng.uniform(0.5, 1.0, edges).astype(np.float32)
+    return left, right, weights
+
+
+def reference_components(left, right):
+    """不限大小的连通分量（节点集合），只含有边的节点"""
+    keep = left != right
+    left, right = left[keep], right[keep]
+    n = int(max(left.max(), right.max())) + 1
+    graph = coo_matrix((np.ones(len(left)), (left, right)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    nodes = np.unique(np.concatenate([left, right]))
+    components = {}
+    for node in nodes.tolist():
+        components.setdefault(labels[node], set()).add(node)
+    return {frozenset(component) for component in components.values()}
+
+
+@pytest.mark.parametrize("max_group_size", [2, 3, 8, 32])
+def test_groups_are_bounded_and_cover_every_edge(max_group_size):
+    left, right, weights = random_edges()
+    groups = group_candidates(left, right, weights, max_group_size=max_group_size)
+
+    assert all(2 <= len(group) <= max_group_size for group in groups)
+    assert all(len(set(group)) == len(group) for group in groups)
+    covered = {frozenset((a, b)) for group in groups for a in group for b in group if a != b}
+    assert all(frozenset((a, b)) in covered for a, b in zip(left.tolist(), right.tolist()) if a != b)
+
+
+def test_small_components_match_connected_components():
+    # 稀疏图的连通分量都很小，上限足够大时分组与连通分量完全一致
+    left, right, weights = random_edges(nodes=300, edges=120, seed=1)
+    components = reference_components(left, right)
+    largest = max(len(component) for component in components)
+
+    groups = group_candidates(left, right, weights, max_group_size=largest)
+    assert {frozenset(group) for group in groups} == components
+    assert len(groups) == len(components)
+
+
+def test_oversized_component_splits_along_strongest_edges():
+    # 两个强连接的三角形由一条弱边相连，上限为3时沿弱边切开，弱边单独成组
+    left = np.array([0, 1, 0, 3, 4, 3, 2])
+    right = np.array([1, 2, 2, 4, 5, 5, 3])
+    weights = np.array([0.95, 0.9, 0.9, 0.92, 0.9, 0.9, 0.6], dtype=np.float32)
+
+    groups = group_candidates(left, right, weights, max_group_size=3)
+    assert [set(group) for group in groups] == [{0, 1, 2}, {3, 4, 5}, {2, 3}]
+    # 组内节点按加权度（含被切断的边）降序
+    assert groups[0][0] == 2 and groups[1][0] == 3
+
+
+def test_groups_ordered_by_strongest_edge():
+    left = np.array([0, 10, 20])
+    right = np.array([1, 11, 21])
+    weights = np.array([0.7, 0.9, 0.8], dtype=np.float32)
+    assert [sorted(group) for group in group_candidates(left, right, weights)] == [[10, 11], [20, 21], [0, 1]]
+
+
+PARAGRAPH = ("本项目采用分层架构设计，数据采集层负责从各业务系统实时汇聚原始数据，经过清洗、校验与标准化处理后"
+             "写入统一的数据仓库；服务层在此基础上提供查询、统计与预警接口，并通过权限中心对调用方进行细粒度授权。")
+
+
+def test_oversized_minhash_component_is_bounded_with_embedding_edges():
+    # 30份文档各自少量改写同一段文字，MinHash候选边构成一个30个片段的分量；另有若干嵌入相似的片段对
+    rng = np.random.default_rng(0)
+    store = SegmentStore(dimensions=16)
+    contents = [PARAGRAPH.replace("实时", f"第{i}类") for i in range(30)]
+    contents += [f"第{i}段互不相关的说明文字。" for i in range(10)]
+    vectors = rng.standard_normal((len(contents), 16)).astype(np.float32)
+    vectors[35:] = vectors[30:35] + 0.01 * rng.standard_normal((5, 16)).astype(np.float32)
+    for row, (content, vector) in enumerate(zip(contents, vectors)):
+        store.append(segment_id=f"segment_{row}", content=content, document_id=row, page=1, chunk_id=1,
+                     embedding=vector)
+
+    detector = NearDuplicateDetector(MinHashLSH(min_shingles=30), direct_threshold=1.01)
+    _, near_edges = detector.detect(list(store))
+    assert len(reference_components(*near_edges[:2])) == 1
+
+    max_group_size = 6
+    manager = ClusteringManager(use_reranker=False, ann_index_type="none", similarity_threshold=0.9,
+                                max_group_size=max_group_size)
+    groups = [[view.row for view in group] for group in manager.initial_clustering(store, near_edges).values()]
+
+    assert all(2 <= len(group) <= max_group_size for group in groups)
+    covered = {frozenset((a, b)) for group in groups for a in group for b in group if a != b}
+    assert all(frozenset((int(a), int(b))) in covered for a, b in zip(*near_edges[:2]))
+    # 嵌入召回的片段对与MinHash候选边在同一次分组中处理
+    assert all(frozenset((row, row + 5)) in covered for row in range(30, 35))
@@ -0,0 +1,55 @@
+"""
+历史语料索引测试：文档重新提交后旧版本的行不占用检索结果
+"""
+
+import numpy as np
+import pytest
+
+from src.core.corpus_index import CorpusIndex
+from src.models.data_models import DocumentData
+from src.models.segment_store import SegmentStore
+
+DIMENSIONS = 16
+
+
+def make_store(document_id: int, vectors: np.ndarray, version: int) -> SegmentStore:
+    store = SegmentStore(dimensions=DIMENSIONS)
+    for chunk_id, vector in enumerate(vectors, 1):
+        store.append(segment_id=f"doc_{document_id}_v{version}_chunk_{chunk_id}",
+                     content=f"文档{document_id}第{version}版第{chunk_id}段内容。", document_id=document_id,
+                     page=1, chunk_id=chunk_id, embedding=vector)
+    return store
+
+
+def add_version(index: CorpusIndex, document_id: int, vectors: np.ndarray, version: int):
+    store = make_store(document_id, vectors, version)
+    document = DocumentData(document_id=document_id, content=f"文档{document_id}第{version}版",
+                            pages={1: f"文档{document_id}第{version}版"})
+    index.add_documents([document], store)
+
+
+@pytest.mark.parametrize("use_graph", [True, False])
+def test_stale_versions_do_not_crowd_out_live_neighbours(tmp_path, use_graph):
+    rng = np.random.default_rng(0)
+    index = CorpusIndex(str(tmp_path / "corpus"), DIMENSIONS, "test-model", hnsw_m=8)
+    if not use_graph:
+        index._graph = None
+
+    query = rng.standard_normal(DIMENSIONS).astype(np.float32)
+    query /= np.linalg.norm(query)
+    # 文档1多次重新提交，每个版本都有与查询几乎相同的片段
+    for version in range(1, 6):
+        near = query + 0.01 * rng.standard_normal((4, DIMENSIONS)).astype(np.float32)
+        add_version(index, 1, near, version)
+    # 文档2只有一个版本，与查询相似度较低
+    add_version(index, 2, query + 0.5 * rng.standard_normal((4, DIMENSIONS)).astype(np.float32), 1)
+
+    k = 8
+    scores, rows = index.search(query[None, :], k)
+    live = index.segments(rows[0][rows[0] >= 0].tolist())
+
+    assert len(live) == k
+    assert {record["document_id"] for record in live.values()} == {1, 2}
+    # 文档1只有最新版本的4行是有效行
+    assert sum(record["document_id"] == 1 for record in live.values()) == 4
+    assert np.all(np.diff(scores[0]) <= 1e-6)
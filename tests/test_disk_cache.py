@@ -0,0 +1,56 @@
+"""
+磁盘LRU缓存测试：增量维护的条目数与总大小与全表统计一致，近期访问过的命中不写库
+"""
+
+import sqlite3
+
+from src.utils.disk_cache import DiskLRUCache
+
+
+def table_totals(cache: DiskLRUCache):
+    with sqlite3.connect(cache.path) as conn:
+        return conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {cache.table}").fetchone()
+
+
+def test_totals_track_inserts_overwrites_and_evictions(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "cache.db"), max_entries=20, max_bytes=10 ** 6)
+    cache.set_many({f"k{i}": b"x" * i for i in range(15)})
+    cache.set_many({f"k{i}": b"y" * (i + 100) for i in range(10)})
+    assert cache._totals(cache._connection()) == table_totals(cache)
+
+    cache.set_many({f"n{i}": b"z" for i in range(10)})
+    entries, total_bytes = cache._totals(cache._connection())
+    assert (entries, total_bytes) == table_totals(cache)
+    assert entries <= 20 and cache.evictions > 0
+
+    # 重新打开已有的缓存库不会重复统计
+    reopened = DiskLRUCache(cache.path, max_entries=20, max_bytes=10 ** 6)
+    assert reopened.stats()["entries"] == entries
+
+
+def test_existing_database_is_counted_once(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                     "last_access REAL NOT NULL)")
+        conn.executemany("INSERT INTO cache VALUES (?, ?, ?, 0)", [(f"k{i}", b"ab", 2) for i in range(5)])
+
+    cache = DiskLRUCache(path)
+    assert cache._totals(cache._connection()) == (5, 10)
+
+
+def test_recent_hits_do_not_write(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "cache.db"))
+    cache.set_many({"a": b"1", "b": b"2"})
+    conn = cache._connection()
+
+    changes = conn.total_changes
+    assert cache.get_many(["a", "b", "c"]) == {"a": b"1", "b": b"2"}
+    assert conn.total_changes == changes
+
+    # 访问时间过旧的命中项才刷新
+    conn.execute("UPDATE cache SET last_access = 0 WHERE key = 'a'")
+    conn.commit()
+    assert cache.get("a") == b"1"
+    assert conn.execute("SELECT last_access FROM cache WHERE key = 'a'").fetchone()[0] > 0
+    assert cache.hits == 3 and cache.misses == 1
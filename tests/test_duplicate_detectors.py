@@ -0,0 +1,125 @@
+"""
+逐字重复检测器测试：短标题与套话不被当作复制段落输出，长段落的近似复制仍被检出
+"""
+
+from typing import List
+
+import numpy as np
+
+from src.core.clustering_manager import ClusteringManager
+from src.core.corpus_index import CorpusIndex
+from src.core.minhash_lsh import MinHashLSH
+from src.detectors.near_duplicate_detector import NearDuplicateDetector
+from src.detectors.simhash_duplicate_detector import SimHashDuplicateDetector
+from src.models.data_models import DocumentData, TextSegment
+from src.models.segment_store import SegmentStore
+from src.utils.text_utils import content_hash
+
+MIN_SHINGLES = 30
+DIMENSIONS = 16
+
+PARAGRAPH = ("本项目采用分层架构设计，数据采集层负责从各业务系统实时汇聚原始数据，经过清洗、校验与标准化处理后"
+             "写入统一的数据仓库；服务层在此基础上提供查询、统计与预警接口，并通过权限中心对调用方进行细粒度授权。")
+
+# 两份文档中措辞略有差异的标题与套话
+BOILERPLATE = [
+    ("目录", "目 录："),
+    ("联系人：", "联系人：王"),
+    ("联系电话：", "联系电话：010"),
+    ("第一章 总则", "第一章 总则。"),
+]
+
+
+def make_segments(texts_by_document: List[List[str]]) -> List[TextSegment]:
+    segments = []
+    for document_id, texts in enumerate(texts_by_document, 1):
+        for chunk_id, text in enumerate(texts, 1):
+            segments.append(TextSegment(id=f"doc_{document_id}_chunk_{chunk_id}", content=text,
+                                        document_id=document_id, page=1, chunk_id=chunk_id,
+                                        content_hash=content_hash(text)))
+    return segments
+
+
+def boilerplate_segments() -> List[TextSegment]:
+    return make_segments([[left for left, _ in BOILERPLATE], [right for _, right in BOILERPLATE]])
+
+
+def test_minhash_ignores_short_boilerplate():
+    segments = boilerplate_segments()
+    # 不设下限时短套话之间的估计Jaccard很高，会被当作复制段落
+    unguarded = NearDuplicateDetector(MinHashLSH(min_shingles=1))
+    results, (left, _, _) = unguarded.detect(segments)
+    assert results or len(left)
+
+    detector = NearDuplicateDetector(MinHashLSH(min_shingles=MIN_SHINGLES))
+    results, (left, _, _) = detector.detect(segments)
+    assert results == [] and len(left) == 0
+
+
+def test_minhash_still_reports_copied_paragraphs():
+    segments = make_segments([["目录", PARAGRAPH], ["目 录：", PARAGRAPH.replace("实时", "定时")]])
+    detector = NearDuplicateDetector(MinHashLSH(min_shingles=MIN_SHINGLES))
+    results, (left, right, _) = detector.detect(segments)
+    reported = {(result.content1, result.content2) for result in results}
+    reported |= {(segments[i].content, segments[j].content) for i, j in zip(left, right)}
+    assert len(reported) == 1
+    assert all(PARAGRAPH[:10] in text for pair in reported for text in pair)
+
+
+def make_corpus(tmp_path, texts: List[str]) -> CorpusIndex:
+    """历史语料中文档99的片段，向量随意取值（SimHash查找只用指纹）"""
+    rng = np.random.default_rng(0)
+    store = SegmentStore(dimensions=DIMENSIONS)
+    for chunk_id, text in enumerate(texts, 1):
+        store.append(segment_id=f"doc_99_chunk_{chunk_id}", content=text, document_id=99, page=1,
+                     chunk_id=chunk_id, embedding=rng.standard_normal(DIMENSIONS).astype(np.float32),
+                     content_hash=content_hash(text))
+    index = CorpusIndex(str(tmp_path / "corpus"), DIMENSIONS, "test-model", hnsw_m=8)
+    index.add_documents([DocumentData(document_id=99, content="".join(texts), pages={1: "".join(texts)})], store)
+    return index
+
+
+def test_simhash_ignores_short_boilerplate(tmp_path):
+    boilerplate = [left for left, _ in BOILERPLATE]
+    corpus = make_corpus(tmp_path, boilerplate)
+    segments = make_segments([boilerplate])
+    # 不设下限时历史语料中同样的标题与套话会被当作逐字复制输出
+    assert SimHashDuplicateDetector(min_shingles=1, corpus_index=corpus).detect(segments)
+    assert SimHashDuplicateDetector(min_shingles=MIN_SHINGLES, corpus_index=corpus).detect(segments) == []
+
+
+def test_simhash_still_reports_copied_paragraphs(tmp_path):
+    corpus = make_corpus(tmp_path, ["目录", PARAGRAPH])
+    segments = make_segments([["联系人：", PARAGRAPH], ["联系人：王", PARAGRAPH + "。"]])
+    results = SimHashDuplicateDetector(min_shingles=MIN_SHINGLES, corpus_index=corpus).detect(segments)
+    pairs = sorted((result.documentId1, result.documentId2) for result in results)
+    assert pairs == [(1, 2), (1, 99), (2, 99)]
+    assert all(result.content1.startswith(PARAGRAPH) for result in results)
+
+
+def test_minhash_candidates_are_edges_not_clusters():
+    # 一段文字被30份文档各自少量改写：候选边两两相连，由聚类管理器按组大小上限分组
+    variants = [PARAGRAPH.replace("实时", f"第{i}类") for i in range(30)]
+    segments = make_segments([[variant] for variant in variants])
+    detector = NearDuplicateDetector(MinHashLSH(min_shingles=MIN_SHINGLES), direct_threshold=1.01)
+
+    results, (left, right, jaccard) = detector.detect(segments)
+    assert results == []
+    assert len(left) > 30 and np.all(left != right)
+    assert np.all((jaccard >= 0) & (jaccard < 1.01))
+
+
+def test_reported_pairs_are_not_sent_to_the_llm():
+    # 向量两两正交，嵌入召回没有候选边；MinHash候选边中已直接输出的一对被去掉
+    store = SegmentStore(dimensions=4)
+    for row, (document_id, chunk_id) in enumerate([(1, 1), (2, 1), (1, 2), (3, 1)]):
+        store.append(segment_id=f"doc_{document_id}_chunk_{chunk_id}", content=f"片段{row}",
+                     document_id=document_id, page=1, chunk_id=chunk_id, embedding=np.eye(4, dtype=np.float32)[row])
+    edges = (np.array([0, 2]), np.array([1, 3]), np.array([0.6, 0.7], dtype=np.float32))
+    manager = ClusteringManager(use_reranker=False, ann_index_type="none")
+
+    clusters = manager.initial_clustering(store, edges)
+    assert sorted(sorted(view.row for view in group) for group in clusters.values()) == [[0, 1], [2, 3]]
+
+    clusters = manager.initial_clustering(store, edges, [((2, 1), (1, 1))])
+    assert [[view.row for view in group] for group in clusters.values()] == [[2, 3]]
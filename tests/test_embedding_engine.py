@@ -0,0 +1,81 @@
+"""
+异步嵌入引擎测试：瞬时错误重试，非法输入通过二分批次隔离到单条文本，失败位置为None而不是零向量
+"""
+
+from types import SimpleNamespace
+from typing import List
+
+import httpx
+import numpy as np
+import openai
+import pytest
+
+from src.core.document_processor import CustomEmbeddings
+from src.embeddings.engine import AsyncEmbeddingEngine, EmbeddingError
+
+POISON = "非法输入"
+
+
+def api_error(error_type, status_code: int):
+    response = httpx.Response(status_code, request=httpx.Request("POST", "http://embedding.test/embeddings"))
+    return error_type(f"HTTP {status_code}", response=response, body=None)
+
+
+def vector(text: str) -> List[float]:
+    return [float(len(text)), 1.0, 2.0]
+
+
+class FakeEmbeddings:
+    """含非法输入的批次返回400；前transient_failures次调用返回429"""
+
+    def __init__(self, transient_failures: int = 0):
+        self.transient_failures = transient_failures
+        self.calls: List[List[str]] = []
+
+    async def create(self, model, input, dimensions, encoding_format):
+        self.calls.append(list(input))
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise api_error(openai.RateLimitError, 429)
+        if any(POISON in text for text in input):
+            raise api_error(openai.BadRequestError, 400)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=vector(text)) for text in input])
+
+
+def make_engine(fake: FakeEmbeddings, max_retries: int = 3) -> AsyncEmbeddingEngine:
+    engine = AsyncEmbeddingEngine(api_key="test", base_url="http://embedding.test", model="fake", dimensions=3,
+                                  max_batch_size=4, max_retries=max_retries, retry_base_delay=0.0)
+    engine.client = SimpleNamespace(embeddings=fake)
+    return engine
+
+
+def test_poisoned_text_is_isolated():
+    texts = [f"第{i}段正文" for i in range(10)]
+    texts[5] = f"第5段{POISON}"
+    fake = FakeEmbeddings(transient_failures=1)
+
+    results = make_engine(fake).embed(texts)
+
+    assert results[5] is None
+    assert [results[i] for i in range(10) if i != 5] == [vector(texts[i]) for i in range(10) if i != 5]
+    assert all(np.any(np.asarray(result)) for result in results if result is not None)
+    # 只有含非法输入的批次被二分，且非法文本最终单独请求
+    assert [texts[5]] in fake.calls
+    assert max(len(call) for call in fake.calls if not any(POISON in text for text in call)) == 4
+
+
+def test_exhausted_transient_errors_fail_the_batch_without_bisecting():
+    fake = FakeEmbeddings(transient_failures=100)
+    results = make_engine(fake, max_retries=2).embed(["甲", "乙", "丙"])
+
+    assert results == [None, None, None]
+    assert fake.calls == [["甲", "乙", "丙"]] * 3
+
+
+def test_custom_embeddings_reports_failures_instead_of_zero_filling():
+    fake = FakeEmbeddings()
+    embeddings = CustomEmbeddings(SimpleNamespace(model_name="fake", dimensions=3, embed=make_engine(fake).embed))
+
+    assert embeddings.embed_texts(["正文", POISON]) == [vector("正文"), None]
+    with pytest.raises(EmbeddingError):
+        embeddings.embed_documents(["正文", POISON])
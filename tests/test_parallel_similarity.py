@@ -0,0 +1,57 @@
+"""
+多进程相似度测试：进程池的分段结果与单进程分块内核逐项一致
+"""
+
+import numpy as np
+import pytest
+
+from src.core.parallel_similarity import SimilarityPool, row_ranges
+from src.core.similarity_kernels import blockwise_pairs, blockwise_topk
+from src.embeddings.quantization import quantize
+from test_similarity_kernels import random_request
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SimilarityPool(processes=2, min_segments=0)
+    yield pool
+    pool.close()
+
+
+# 行数不是行块的整数倍，分段边界若不按行块对齐，同一行会落在形状不同的矩阵乘法里
+@pytest.mark.parametrize("mode", ["none", "float16", "int8"])
+@pytest.mark.parametrize("block_rows", [16, 1000])
+def test_pool_topk_matches_blockwise(pool, mode, block_rows):
+    embeddings, doc_ids, dup_keys = random_request(n=257)
+    coarse = quantize(embeddings, mode)
+    block_rows = pool.block_rows(len(embeddings), block_rows)
+    expected = blockwise_topk(coarse, doc_ids, dup_keys, 6, 0.2, block_rows=block_rows)
+    actual = pool.topk(coarse, doc_ids, dup_keys, 6, 0.2, block_rows=block_rows)
+    np.testing.assert_array_equal(actual[1], expected[1])
+    np.testing.assert_array_equal(actual[0], expected[0])
+
+
+@pytest.mark.parametrize("mode", ["none", "float16", "int8"])
+@pytest.mark.parametrize("block_rows", [16, 1000])
+def test_pool_pairs_matches_blockwise(pool, mode, block_rows):
+    embeddings, doc_ids, dup_keys = random_request(n=257)
+    coarse = quantize(embeddings, mode)
+    block_rows = pool.block_rows(len(embeddings), block_rows)
+    expected = blockwise_pairs(coarse, doc_ids, dup_keys, 0.2, block_rows=block_rows)
+    actual = pool.pairs(coarse, doc_ids, dup_keys, 0.2, block_rows=block_rows)
+    for actual_part, expected_part in zip(actual, expected):
+        np.testing.assert_array_equal(actual_part, expected_part)
+
+
+@pytest.mark.parametrize("triangular", [False, True])
+@pytest.mark.parametrize("align", [1, 16])
+def test_row_ranges_cover_all_rows(triangular, align):
+    ranges = row_ranges(1001, 7, triangular=triangular, align=align)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 1001
+    assert all(stop == start for (_, stop), (start, _) in zip(ranges[:-1], ranges[1:]))
+    assert all(start % align == 0 for start, _ in ranges)
+
+
+def test_block_rows_leave_work_for_every_process(pool):
+    assert pool.block_rows(10000, 5000) == 1250
+    assert pool.block_rows(10000, 64) == 64
@@ -0,0 +1,55 @@
+"""
+重排引擎测试：余弦相似度足以判定的候选不调用reranker，直接保留的候选使用固定得分
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from src.config.config import Config
+from src.core.clustering_manager import ClusteringManager
+from src.core.rerank_engine import ACCEPT_SCORE, RerankEngine
+from src.core.rerankers import Reranker
+from src.models.data_models import TextSegment
+
+
+class RecordingReranker(Reranker):
+    """记录被打分的候选文本，所有候选得分0.4"""
+
+    model_name = "recording"
+
+    def __init__(self):
+        self.scored: List[str] = []
+
+    def score(self, query: str, documents: List[str]) -> Optional[List[float]]:
+        self.scored.extend(documents)
+        return [0.4] * len(documents)
+
+
+def segment(name: str, cosine: float) -> TextSegment:
+    """与查询向量 (1, 0) 的余弦相似度为cosine的片段"""
+    embedding = np.array([cosine, np.sqrt(1 - cosine ** 2)], dtype=np.float32)
+    return TextSegment(id=name, content=name, document_id=2, page=1, chunk_id=1, embedding=embedding)
+
+
+def test_cosine_margins_skip_reranker_calls():
+    reranker = RecordingReranker()
+    engine = RerankEngine(reranker, skip_similarity=0.95, drop_similarity=0.65)
+    query = TextSegment(id="query", content="query", document_id=1, page=1, chunk_id=1,
+                        embedding=np.array([1.0, 0.0], dtype=np.float32))
+    cluster = [query, segment("low", 0.5), segment("middle", 0.8), segment("high", 0.97)]
+
+    ranked = engine.rerank({0: cluster})[0]
+
+    assert reranker.scored == ["middle"]
+    assert [(candidate.id, score) for candidate, score in ranked] == [("high", ACCEPT_SCORE), ("middle", 0.4)]
+
+
+def test_drop_similarity_defaults_to_similarity_threshold(monkeypatch):
+    # 默认不丢弃任何召回的候选：丢弃阈值与召回阈值相同
+    monkeypatch.delenv("RERANK_DROP_SIMILARITY", raising=False)
+    monkeypatch.setenv("SIMILARITY_THRESHOLD", "0.62")
+    assert Config().rerank_drop_similarity == 0.62
+
+    manager = ClusteringManager(similarity_threshold=0.62, reranker=RecordingReranker())
+    assert manager.rerank_engine.drop_similarity == 0.62
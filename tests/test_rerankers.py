@@ -0,0 +1,35 @@
+"""
+本地词法reranker测试：固定改写段落与逐字复制段落的得分范围，保留阈值需与之对应
+"""
+
+import pytest
+
+from src.core import rerankers
+from src.core.rerankers import LexicalReranker, create_reranker
+
+ORIGINAL = "本项目采用分层架构设计，数据采集层负责从各业务系统实时汇聚原始数据，经过清洗、校验与标准化处理后写入统一的数据仓库。"
+PARAPHRASE = "该系统按层次划分结构，其中采集模块实时收集来自不同业务平台的源数据，并在完成清理、核验和规范化之后存入集中式数仓。"
+VERBATIM = ORIGINAL.replace("实时", "定时")
+UNRELATED = "春天来了，公园里的花都开了，孩子们在草地上放风筝，老人们在树荫下下棋聊天。"
+
+
+@pytest.fixture
+def scores():
+    reranker = LexicalReranker()
+    index = reranker.for_request([ORIGINAL, PARAPHRASE, VERBATIM, UNRELATED])
+    paraphrase, verbatim, unrelated = index.score(ORIGINAL, [PARAPHRASE, VERBATIM, UNRELATED])
+    return reranker, paraphrase, verbatim, unrelated
+
+
+def test_lexical_score_ranges(scores):
+    reranker, paraphrase, verbatim, unrelated = scores
+    assert 0.9 <= verbatim <= 1.0
+    # 改写段落的词项重合很少，得分远低于按gte-rerank标定的0.3，但高于词法阈值
+    assert reranker.threshold < paraphrase < 0.3
+    assert unrelated < reranker.threshold
+
+
+def test_dashscope_unavailable_disables_reranking(monkeypatch):
+    monkeypatch.setattr(rerankers, "DASHSCOPE_AVAILABLE", False)
+    assert create_reranker("dashscope") is None
+    assert isinstance(create_reranker("lexical"), LexicalReranker)
@@ -0,0 +1,83 @@
+"""
+分块相似度内核测试：与稠密相似度矩阵的参考结果逐项比对
+"""
+
+import numpy as np
+import pytest
+
+from src.core.similarity_kernels import (
+    BLOCK_BYTES_PER_ELEMENT, block_rows_for_budget, blockwise_pairs, blockwise_topk, duplicate_keys
+)
+from src.embeddings.quantization import quantize
+
+
+def random_request(n: int = 300, dims: int = 32, documents: int = 5, seed: int = 0):
+    """随机归一化向量；部分行为其他行的加噪副本，部分行共享规范化文本哈希"""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dims)).astype(np.float32)
+    copies = rng.choice(n, size=n // 3, replace=False)
+    embeddings[copies] = embeddings[rng.integers(0, n, len(copies))] + 0.3 * rng.standard_normal(
+        (len(copies), dims)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    doc_ids = rng.integers(0, documents, n)
+    hashes = [f"h{rng.integers(0, 20)}" if rng.random() < 0.1 else None for _ in range(n)]
+    return embeddings, doc_ids, duplicate_keys(hashes)
+
+
+def dense_reference(embeddings, doc_ids, dup_keys, threshold):
+    """稠密矩阵上的有效相似度，被排除或低于阈值的位置为-inf"""
+    similarities = embeddings @ embeddings.T
+    same_text = (dup_keys[:, None] == dup_keys[None, :]) & (dup_keys[:, None] >= 0)
+    invalid = (doc_ids[:, None] == doc_ids[None, :]) | same_text | (similarities < threshold)
+    return np.where(invalid, -np.inf, similarities)
+
+
+@pytest.mark.parametrize("block_rows", [1, 7, 64, 1000])
+def test_blockwise_topk_matches_dense_reference(block_rows):
+    embeddings, doc_ids, dup_keys = random_request()
+    k, threshold = 6, 0.2
+    reference = dense_reference(embeddings, doc_ids, dup_keys, threshold)
+
+    scores, indices = blockwise_topk(quantize(embeddings, "none"), doc_ids, dup_keys, k, threshold,
+                                     block_rows=block_rows)
+
+    for row in range(len(embeddings)):
+        valid = np.flatnonzero(np.isfinite(reference[row]))
+        expected = valid[np.lexsort((valid, -reference[row, valid]))][:k]
+        assert indices[row][indices[row] >= 0].tolist() == expected.tolist()
+        np.testing.assert_allclose(scores[row][:len(expected)], reference[row, expected], rtol=1e-5, atol=1e-6)
+        assert np.all(np.isneginf(scores[row][len(expected):]))
+
+
+@pytest.mark.parametrize("block_rows", [1, 7, 64, 1000])
+def test_blockwise_pairs_matches_dense_reference(block_rows):
+    embeddings, doc_ids, dup_keys = random_request()
+    threshold = 0.3
+    reference = dense_reference(embeddings, doc_ids, dup_keys, threshold)
+    expected_left, expected_right = np.nonzero(np.triu(np.isfinite(reference), k=1))
+
+    left, right, scores = blockwise_pairs(quantize(embeddings, "none"), doc_ids, dup_keys, threshold,
+                                          block_rows=block_rows)
+
+    assert left.tolist() == expected_left.tolist()
+    assert right.tolist() == expected_right.tolist()
+    np.testing.assert_allclose(scores, reference[left, right], rtol=1e-5, atol=1e-6)
+
+
+def test_row_ranges_concatenate_to_full_result():
+    embeddings, doc_ids, dup_keys = random_request()
+    coarse = quantize(embeddings, "none")
+    full_scores, full_indices = blockwise_topk(coarse, doc_ids, dup_keys, 5, 0.2, block_rows=16)
+    parts = [blockwise_topk(coarse, doc_ids, dup_keys, 5, 0.2, block_rows=16, row_start=start,
+                            row_stop=min(start + 90, len(embeddings)))
+             for start in range(0, len(embeddings), 90)]
+
+    assert np.array_equal(np.concatenate([indices for _, indices in parts]), full_indices)
+    assert np.array_equal(np.concatenate([scores for scores, _ in parts]), full_scores)
+
+
+def test_block_rows_budget_counts_temporaries():
+    n_cols = 100000
+    block_rows = block_rows_for_budget(n_cols, 256)
+    assert block_rows * n_cols * BLOCK_BYTES_PER_ELEMENT <= 256 * 1024 * 1024
+    assert block_rows_for_budget(10 ** 12, 1) == 1
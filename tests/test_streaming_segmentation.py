@@ -0,0 +1,133 @@
+"""
+流式分割测试：与整篇分割结果一致、页面归属、窗口间句向量复用与分割缓存
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+import pytest
+
+from src.core.document_processor import DocumentProcessor
+from src.core.similarity_kernels import duplicate_keys
+from src.models.api_models import DocumentInput
+
+TOPICS = [
+    "机器学习模型需要大量标注数据进行训练。", "深度神经网络由多层非线性变换组成。",
+    "城市交通拥堵问题日益严重。", "地铁线路的扩建缓解了部分压力。",
+    "今年的小麦产量比去年提高了一成。", "农业机械化水平持续提升。",
+    "公司第三季度营业收入同比增长。", "董事会审议通过了利润分配方案。",
+]
+
+
+def make_pages(doc_id: int, page_count: int = 12):
+    """每页若干句，各页句子互不相同，页末均以句号结尾"""
+    pages = []
+    for page in range(1, page_count + 1):
+        sentences = [f"第{page}页第{i}句：{TOPICS[(page + i) % len(TOPICS)]}" for i in range(6)]
+        pages.append(DocumentInput(documentId=doc_id, page=page, content="".join(sentences)))
+    return pages
+
+
+def combined_text(pages):
+    return "".join(page.content + "\n\n" for page in pages)
+
+
+@pytest.fixture
+def processor(monkeypatch, tmp_path):
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "hashing")
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLE", "false")
+    monkeypatch.setenv("SEGMENT_CACHE_ENABLE", "false")
+    monkeypatch.setenv("SEGMENT_CACHE_PATH", str(tmp_path / "segment_cache.db"))
+    monkeypatch.setenv("SEGMENTATION_MAX_WORKERS", "1")
+    return DocumentProcessor()
+
+
+@pytest.mark.parametrize("method", ["semantic", "rule"])
+def test_streaming_matches_full_segmentation_when_window_covers_document(processor, method):
+    pages = make_pages(1)
+    expected = processor.segment_documents(pages, method)
+    streamed = list(processor.iter_document_segments(1, pages, method, window_chars=10 ** 7))
+
+    assert [(s.char_start, s.char_end, s.page, s.content) for s in streamed] == \
+           [(s.char_start, s.char_end, s.page, s.content) for s in expected]
+
+
+@pytest.mark.parametrize("method", ["semantic", "rule"])
+def test_streaming_spans_and_page_attribution(processor, method):
+    pages = make_pages(1)
+    text = combined_text(pages)
+    page_starts = [text.index(page.content) for page in pages]
+
+    segments = list(processor.iter_document_segments(1, pages, method, window_chars=300))
+
+    assert len(segments) > 1
+    assert [s.chunk_id for s in segments] == list(range(1, len(segments) + 1))
+    covered = np.zeros(len(text), dtype=bool)
+    for segment in segments:
+        assert segment.content == text[segment.char_start:segment.char_end]
+        assert segment.page == pages[bisect_right(page_starts, segment.char_start) - 1].page
+        covered[segment.char_start:segment.char_end] = True
+    # 除空白外的所有字符都落在某个片段中
+    assert all(covered[i] for i, char in enumerate(text) if not char.isspace())
+
+
+def test_streaming_reuses_carried_sentence_vectors(processor, monkeypatch):
+    embedded = []
+    embed_texts = processor.embeddings.embed_texts
+
+    def recording_embed_texts(texts, raise_on_error=False):
+        embedded.extend(texts)
+        return embed_texts(texts, raise_on_error=raise_on_error)
+
+    monkeypatch.setattr(processor.embeddings, "embed_texts", recording_embed_texts)
+    pages = make_pages(1)
+    list(processor.iter_document_segments(1, pages, "semantic", window_chars=300))
+
+    # 各页句子互不相同且不跨页，带入下一个窗口的句子不应再次嵌入
+    assert embedded
+    assert len(embedded) == len(set(embedded))
+
+
+def test_streaming_store_hits_segmentation_cache(processor, monkeypatch):
+    monkeypatch.setenv("SEGMENT_CACHE_ENABLE", "true")
+    processor = DocumentProcessor()
+    pages = make_pages(1) + make_pages(2, page_count=3)
+    monkeypatch.setattr(processor.config.__class__, "streaming_window_chars", property(lambda self: 300))
+
+    first = processor.build_segment_store_streaming(pages, "rule")
+
+    def failing_embed_texts(texts, raise_on_error=False):
+        raise AssertionError("缓存命中时不应再嵌入")
+
+    monkeypatch.setattr(processor.embeddings, "embed_texts", failing_embed_texts)
+    second = processor.build_segment_store_streaming(pages, "rule")
+
+    assert second.contents[:len(second)] == first.contents[:len(first)]
+    assert np.array_equal(second.char_starts[:len(second)], first.char_starts[:len(first)])
+    assert np.array_equal(second.pages[:len(second)], first.pages[:len(first)])
+    assert np.allclose(second.embeddings, first.embeddings)
+
+
+@pytest.mark.parametrize("exact_enabled", [True, False])
+def test_streaming_keeps_hashes_only_with_exact_detection(processor, monkeypatch, exact_enabled):
+    monkeypatch.setenv("EXACT_DUPLICATE_ENABLE", "true" if exact_enabled else "false")
+    # 两份文档内容完全相同
+    pages = make_pages(1, page_count=3) + make_pages(2, page_count=3)
+    embedded = []
+    monkeypatch.setattr(processor.embeddings, "embed_texts",
+                        lambda texts, raise_on_error=False: embedded.extend(texts) or
+                        [np.full(processor.embeddings.dimensions, 1.0, dtype=np.float32) for _ in texts])
+
+    store = processor.build_segment_store_streaming(pages, "rule")
+    segments = list(store)
+    copies = [segment for segment in segments if segment.document_id == 2]
+
+    # 相同文本仍只嵌入一次
+    assert len(embedded) == len(segments) - len(copies)
+    assert all(store.has_embedding[:len(store)])
+    if exact_enabled:
+        assert all(segment.content_hash is not None for segment in segments)
+    else:
+        # 精确匹配未启用时不记入哈希，完全相同的跨文档片段对不会被后续阶段当作已输出而排除
+        assert all(hash_ is None for hash_ in store.content_hashes[:len(store)])
+        assert np.all(duplicate_keys(store.content_hashes[:len(store)]) == -1)